@@ -4,6 +4,7 @@
 from PyInstaller.utils.hooks import (
     collect_all, collect_data_files, collect_submodules, collect_dynamic_libs
 )
+import os
 import sys
 
 block_cipher = None
@@ -18,17 +19,22 @@ datas += collect_data_files('ttkbootstrap')  # ✅ 推奨
 # 参考: themes.json 見つからずで落ちる既知事例
 # https://stackoverflow.com/questions/67850998/ttkbootstrap-not-working-with-pyinstaller
 
-# --- OpenCV 取りこぼし対策（任意だが安定） ---
-# サブモジュールを明示収集
-hiddenimports += collect_submodules('cv2')
-# ネイティブライブラリを必要に応じ追加（PyInstaller 6 以降）
-try:
-    binaries += collect_dynamic_libs('cv2')
-except Exception:
-    pass
-# 参考: cv2 ローダの挙動で PyInstaller が苦戦するケースあり
-# https://github.com/pyinstaller/pyinstaller/issues/6889
-# https://pyinstaller.org/en/stable/hooks.html
+# --- OpenCV は任意（従来経路の色変換のみ）。既定では同梱せず、起動時間とサイズを抑える ---
+# 同梱したい場合は環境変数 PDFQRLINK_WITH_OPENCV=1 を付けてビルドする
+with_opencv = os.environ.get('PDFQRLINK_WITH_OPENCV') == '1'
+excludes = []
+if with_opencv:
+    hiddenimports += collect_submodules('cv2')
+    # ネイティブライブラリを必要に応じ追加（PyInstaller 6 以降）
+    try:
+        binaries += collect_dynamic_libs('cv2')
+    except Exception:
+        pass
+    # 参考: cv2 ローダの挙動で PyInstaller が苦戦するケースあり
+    # https://github.com/pyinstaller/pyinstaller/issues/6889
+    # https://pyinstaller.org/en/stable/hooks.html
+else:
+    excludes.append('cv2')
 
 # --- (任意) PyMuPDF の追加データ ---
 # datas += collect_data_files('fitz')  # 必要時のみ
@@ -40,8 +46,10 @@ a = Analysis(
     pathex=['.'],          # ルートを明示
     binaries=binaries,
     datas=datas,
-    hiddenimports=hiddenimports + ['tkinter', 'fitz'],  # 'fitz' を使っているため残す
+    # GUI 本体は app.py から遅延 import するため明示する
+    hiddenimports=hiddenimports + ['tkinter', 'fitz', 'pdfqrlink.gui'],  # 'fitz' を使っているため残す
     hookspath=[],
+    excludes=excludes,
     noarchive=False,       # そのままでOK（サイズ・起動速度のバランス）
 )
 
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# 注釈付きPDF出力の比較: 従来の注釈モードと、枠・番号をページ内容へ描き込むオーバーレイモード
+#   python benchmarks/bench_annotate.py --pages 20 --per-page 200 [--repeat 3] [--out result.json]
+# 検出は行わず、格子状に並べた合成の検出結果で annotate_document と保存の時間・出力サイズを測る
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+ZOOM = 3.0
+
+
+def make_detections(pages: int, per_page: int, width: float, height: float) -> dict:
+    import numpy as np
+
+    # ページいっぱいに正方形のQRを格子状に並べる（座標は ZOOM 倍で描画した画像の画素）
+    cols = max(1, int(per_page ** 0.5 * width / height + 0.5))
+    rows = -(-per_page // cols)
+    cell = min(width / cols, height / rows)
+    size = cell * 0.7
+    dm = {}
+    for pidx in range(pages):
+        dets = []
+        for i in range(per_page):
+            x0 = (i % cols) * cell + cell * 0.15
+            y0 = (i // cols) * cell + cell * 0.15
+            pts = np.array([[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size]],
+                           dtype=np.float32) * ZOOM
+            dets.append({"text": f"https://example.com/p{pidx + 1}/q{i + 1}", "points": pts})
+        dm[pidx] = dets
+    return dm
+
+
+def _run(src: str, dm: dict, zm: dict, overlay: bool, out_path: str) -> dict:
+    import fitz
+    from pdfqrlink.core import annotate_document, save_document
+
+    doc = fitz.open(src)
+    try:
+        t0 = time.perf_counter()
+        annotate_document(doc, dm, zm, overlay=overlay)
+        t1 = time.perf_counter()
+        save_document(doc, out_path)
+        t2 = time.perf_counter()
+        # 注釈（リンクを除く）とリンクの件数
+        annots = sum(1 for page in doc for _ in page.annots())
+        links = sum(len(page.get_links()) for page in doc)
+    finally:
+        doc.close()
+    return {"annotate_sec": t1 - t0, "save_sec": t2 - t1, "total_sec": t2 - t0,
+            "bytes": os.path.getsize(out_path), "annots": annots, "links": links}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=20)
+    ap.add_argument("--per-page", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    import fitz
+
+    dm = make_detections(args.pages, args.per_page, 595.0, 842.0)
+    zm = {pidx: ZOOM for pidx in dm}
+    result = {"pages": args.pages, "per_page": args.per_page, "qr": args.pages * args.per_page}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src.pdf")
+        doc = fitz.open()
+        for i in range(args.pages):
+            doc.new_page(width=595, height=842).insert_text((72, 72), f"page {i + 1}")
+        doc.save(src)
+        doc.close()
+
+        for mode, overlay in (("annotations", False), ("overlay", True)):
+            runs = [_run(src, dm, zm, overlay, os.path.join(tmp, f"{mode}.pdf")) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["total_sec"])
+            result[mode] = {
+                "annotate_sec": round(best["annotate_sec"], 3),
+                "save_sec": round(best["save_sec"], 3),
+                "total_sec": round(best["total_sec"], 3),
+                "mb": round(best["bytes"] / (1024 * 1024), 2),
+                "annots": best["annots"],
+                "links": best["links"],
+            }
+    a, o = result["annotations"], result["overlay"]
+    result["speedup"] = round(a["total_sec"] / o["total_sec"], 2) if o["total_sec"] else None
+    result["size_ratio"] = round(a["mb"] / o["mb"], 2) if o["mb"] else None
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
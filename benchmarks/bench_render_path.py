@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# 高速グレースケール経路と従来 RGB 経路の比較（ページあたりの遅延とピーク RSS）
+#   python benchmarks/bench_render_path.py --pages 6 --zoom 4.0
+# 各経路は別プロセスで計測し、ピーク RSS が混ざらないようにする
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KB
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _qr_gray(text: str, scale: int = 8):
+    import numpy as np
+    import zxingcpp
+
+    if hasattr(zxingcpp, "create_barcode"):
+        bc = zxingcpp.create_barcode(text, zxingcpp.BarcodeFormat.QRCode)
+        return np.array(zxingcpp.write_barcode_to_image(bc, scale=scale))
+    return np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, text, width=300, height=300))
+
+
+def make_pdf(path: str, pages: int):
+    import fitz
+
+    doc = fitz.open()
+    for pno in range(pages):
+        page = doc.new_page(width=842, height=1191)  # A3
+        page.insert_text((72, 72), f"Page {pno + 1}", fontsize=14)
+        for k in range(3):
+            img = _qr_gray(f"https://example.com/{pno}/{k}")
+            pix = fitz.Pixmap(fitz.csGRAY, img.shape[1], img.shape[0], img.tobytes(), False)
+            x = 72 + k * 240
+            page.insert_image(fitz.Rect(x, 900, x + 160, 1060), stream=pix.tobytes("png"))
+    doc.save(path)
+    doc.close()
+
+
+def run_mode(pdf_path: str, zoom: float, fast: bool) -> dict:
+    import fitz
+    from pdfqrlink.core import detect_page
+
+    doc = fitz.open(pdf_path)
+    latencies = []
+    found = 0
+    for pno in range(len(doc)):
+        t0 = time.perf_counter()
+        found += len(detect_page(doc.load_page(pno), zoom, fast=fast))
+        latencies.append(time.perf_counter() - t0)
+    doc.close()
+    latencies.sort()
+    return {
+        "mode": "gray" if fast else "legacy",
+        "pages": len(latencies),
+        "qr_found": found,
+        "latency_ms_median": round(latencies[len(latencies) // 2] * 1000, 2),
+        "latency_ms_max": round(latencies[-1] * 1000, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=6)
+    ap.add_argument("--zoom", type=float, default=4.0)
+    ap.add_argument("--pdf", default=None, help="既存PDFで計測する場合に指定")
+    ap.add_argument("--worker", choices=["gray", "legacy"], help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_mode(args.pdf, args.zoom, args.worker == "gray")))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = args.pdf or os.path.join(tmp, "bench.pdf")
+        if not args.pdf:
+            make_pdf(pdf, args.pages)
+        rows = []
+        for mode in ("legacy", "gray"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--pdf", pdf, "--zoom", str(args.zoom)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            rows.append(json.loads(out.strip().splitlines()[-1]))
+    legacy, gray = rows
+    report = {"zoom": args.zoom, "results": rows}
+    if legacy["latency_ms_median"]:
+        report["latency_speedup"] = round(legacy["latency_ms_median"] / max(gray["latency_ms_median"], 1e-6), 2)
+    if legacy["peak_rss_mb"] and gray["peak_rss_mb"]:
+        report["peak_rss_saved_mb"] = round(legacy["peak_rss_mb"] - gray["peak_rss_mb"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# 起動時間（import にかかる時間）の計測。`python -X importtime` の出力を集計する
+#   python benchmarks/bench_startup.py [--repeat 5] [--baseline old.json] [--out new.json]
+# 各入口を新しいプロセスで import し、累積 import 時間・重いモジュール上位・
+# 読み込まれてはいけないモジュール（GUI スタック / OpenCV / PIL）の有無を調べる。
+# 禁止モジュールが読み込まれた場合や、--baseline より --tolerance 以上（かつ --min-delta-ms 以上）
+# 遅くなった場合は終了コード 1
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# 入口ごとの import 文と、その入口で読み込まれてはいけないモジュール
+ENTRY_POINTS = {
+    # spawn のワーカーが最初に読むもの（app.py は __mp_main__ として読み込まれる）
+    "worker": ("import runpy; runpy.run_path('app.py', run_name='__mp_main__'); import pdfqrlink.parallel",
+               ["tkinter", "ttkbootstrap", "tkinterdnd2", "cv2", "PIL"]),
+    "cli": ("import pdfqrlink.cli", ["tkinter", "ttkbootstrap", "tkinterdnd2", "cv2", "PIL", "numpy", "fitz"]),
+    "package": ("import pdfqrlink", ["tkinter", "cv2", "PIL", "numpy", "fitz"]),
+    "core": ("import pdfqrlink.core", ["tkinter", "ttkbootstrap", "tkinterdnd2", "cv2", "PIL"]),
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(stmt: str, forbidden: list[str]) -> dict:
+    check = f"; import json, sys; print(json.dumps(sorted(m for m in {forbidden!r} if m in sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt + check],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            modules.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3))))
+    # 最上位（インデントが最小）の累積時間の合計が、その import 文全体の時間
+    top = min((depth for *_, depth in modules), default=0)
+    total_us = sum(cum for _, _, cum, depth in modules if depth == top)
+    heaviest = sorted(modules, key=lambda m: -m[1])[:8]
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "total_ms": round(total_us / 1000, 2),
+        "modules": len(modules),
+        "heaviest_self_ms": {name: round(self_us / 1000, 2) for name, self_us, _, _ in heaviest},
+        "forbidden_loaded": loaded,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5, help="各入口の計測回数（中央値を採る）")
+    ap.add_argument("--out", default=None, help="結果JSONの保存先")
+    ap.add_argument("--baseline", default=None, help="比較対象の結果JSON")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="許容する悪化率（0.25 = 25%%）")
+    ap.add_argument("--min-delta-ms", type=float, default=20.0, help="これ未満の悪化は計測誤差として無視する")
+    args = ap.parse_args()
+
+    report = {"python": sys.version.split()[0], "entries": {}}
+    ok = True
+    for name, (stmt, forbidden) in ENTRY_POINTS.items():
+        runs = [measure(stmt, forbidden) for _ in range(max(1, args.repeat))]
+        row = dict(runs[-1])
+        row["total_ms"] = round(statistics.median(r["total_ms"] for r in runs), 2)
+        report["entries"][name] = row
+        if row["forbidden_loaded"]:
+            ok = False
+            print(f"{name}: 読み込まれてはいけないモジュール: {', '.join(row['forbidden_loaded'])}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        for name, row in report["entries"].items():
+            old = base.get("entries", {}).get(name, {}).get("total_ms")
+            if not old:
+                continue
+            change = (row["total_ms"] - old) / old
+            row["change_pct"] = round(change * 100, 1)
+            if change > args.tolerance and row["total_ms"] - old > args.min_delta_ms:
+                ok = False
+                print(f"{name}: {old}ms -> {row['total_ms']}ms ({change * 100:+.1f}%)", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
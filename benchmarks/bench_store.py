@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# 検出結果の保持に使うメモリの比較: 従来の {pidx: [{"text", "points"}]} と DetectionStore
+#   python benchmarks/bench_store.py --detections 1000000 [--per-page 4] [--unique 0.5] [--out result.json]
+# 同じ内容をそれぞれの形で作り、tracemalloc で確保量を測る。保存サイズと読み込み時間も表示する
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def make_payloads(n: int, unique: float, seed: int = 0) -> list[str]:
+    # unique: 異なる文字列の割合（同じQRが多くのページに刷られている文書ほど小さい）
+    rnd = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    distinct = max(1, int(n * unique))
+    pool = ["https://example.com/item/" + "".join(rnd.choices(alphabet, k=rnd.randint(8, 60))) for _ in range(distinct)]
+    return [pool[i % distinct] for i in range(n)]
+
+
+def _measure(build):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    seconds = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, peak, seconds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--detections", type=int, default=1_000_000)
+    ap.add_argument("--per-page", type=int, default=4)
+    ap.add_argument("--unique", type=float, default=1.0, help="異なる文字列の割合 (0-1)")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    import numpy as np
+    from pdfqrlink.store import DetectionStore
+
+    # 文字列そのものは両方の形で共有されるため、測定の前に作っておく
+    payloads = make_payloads(args.detections, args.unique)
+    base = np.array([[10, 10], [110, 10], [110, 110], [10, 110]], dtype=np.float32)
+
+    def build_dicts():
+        dm, zm = {}, {}
+        for i in range(0, len(payloads), args.per_page):
+            pidx = i // args.per_page
+            dm[pidx] = [{"text": t, "points": base + j} for j, t in enumerate(payloads[i:i + args.per_page])]
+            zm[pidx] = 3.0
+        return dm, zm
+
+    def build_store():
+        # 検出と同じく1ページ分ずつ受け取り、すぐ捨てる
+        store = DetectionStore()
+        for i in range(0, len(payloads), args.per_page):
+            dets = [{"text": t, "points": base + j} for j, t in enumerate(payloads[i:i + args.per_page])]
+            store.add_page(i // args.per_page, dets, 3.0)
+        return store
+
+    (dm, zm), dict_bytes, dict_peak, dict_sec = _measure(build_dicts)
+    del dm, zm
+    store, store_bytes, store_peak, store_sec = _measure(build_store)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store.npz")
+        t0 = time.perf_counter()
+        store.save(path)
+        save_sec = time.perf_counter() - t0
+        file_bytes = os.path.getsize(path)
+        t0 = time.perf_counter()
+        loaded = DetectionStore.load(path)
+        load_sec = time.perf_counter() - t0
+        assert loaded.qr_count == store.qr_count
+
+    mb = 1024 * 1024
+    result = {
+        "detections": args.detections,
+        "per_page": args.per_page,
+        "unique": args.unique,
+        "dict": {"mb": round(dict_bytes / mb, 1), "peak_mb": round(dict_peak / mb, 1),
+                 "bytes_per_qr": round(dict_bytes / args.detections, 1), "build_sec": round(dict_sec, 3)},
+        "store": {"mb": round(store_bytes / mb, 1), "peak_mb": round(store_peak / mb, 1),
+                  "bytes_per_qr": round(store_bytes / args.detections, 1), "build_sec": round(store_sec, 3),
+                  "file_mb": round(file_bytes / mb, 1), "save_sec": round(save_sec, 3), "load_sec": round(load_sec, 3)},
+        "ratio": round(dict_bytes / store_bytes, 2) if store_bytes else None,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# QR一覧（サマリーページ）生成の所要時間
+#   python benchmarks/bench_summary.py --entries 10000
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def make_entries(n: int, seed: int = 0) -> list[tuple[int, str]]:
+    # URL、長いトークン、複数行の vCard を混ぜる
+    rnd = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    entries = []
+    for i in range(1, n + 1):
+        kind = i % 3
+        if kind == 0:
+            txt = "https://example.com/item/" + "".join(rnd.choices(alphabet, k=rnd.randint(8, 60)))
+        elif kind == 1:
+            txt = "".join(rnd.choices(alphabet + "-_.", k=rnd.randint(120, 600)))
+        else:
+            txt = "BEGIN:VCARD\nVERSION:3.0\nFN:Taro Yamada\nORG:Example Co.\nTEL:+81-3-0000-0000\nEND:VCARD"
+        entries.append((i, txt))
+    return entries
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    import fitz
+    from pdfqrlink.core import _append_summary_pages
+
+    entries = make_entries(args.entries)
+    times = []
+    pages = 0
+    for _ in range(args.repeat):
+        doc = fitz.open()
+        doc.new_page()
+        t0 = time.perf_counter()
+        _append_summary_pages(doc, entries)
+        times.append(time.perf_counter() - t0)
+        pages = len(doc) - 1
+        doc.close()
+    best = min(times)
+    print(json.dumps({
+        "entries": args.entries,
+        "summary_pages": pages,
+        "seconds_best": round(best, 4),
+        "entries_per_sec": round(args.entries / best, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# ベンチマーク用の合成QR入りPDFをオフラインで生成する
+#   python benchmarks/corpus.py out_dir [--preset small|full] [--seed 0]
+# 各PDFの正解（ページごとのQR文字列）は out_dir/manifest.json に書き出す
+import argparse
+import json
+import os
+import random
+import string
+import sys
+
+PAGE_SIZES = {
+    "a4": (595, 842),
+    "letter": (612, 792),
+    "a3": (842, 1191),
+    "a1": (1684, 2384),
+}
+
+# ペイロード長の区分（文字数）
+PAYLOAD_LENGTHS = {"short": 12, "medium": 80, "long": 400}
+
+# kind: image = 埋め込み画像のQR / vector = 塗り矩形で描いたQR / scan = ノイズ入りスキャン画像
+PRESETS = {
+    "small": [
+        dict(name="a4_image_sparse", size="a4", pages=6, per_page=1, kind="image", payload="short", qr_pt=90),
+        dict(name="a4_vector_dense", size="a4", pages=4, per_page=6, kind="vector", payload="medium", qr_pt=110),
+        dict(name="letter_scan", size="letter", pages=3, per_page=2, kind="scan", payload="short", qr_pt=120),
+        dict(name="a3_image_long", size="a3", pages=3, per_page=4, kind="image", payload="long", qr_pt=160),
+    ],
+    "full": [
+        dict(name="a4_image_sparse", size="a4", pages=20, per_page=1, kind="image", payload="short", qr_pt=90),
+        dict(name="a4_image_dense", size="a4", pages=10, per_page=12, kind="image", payload="medium", qr_pt=80),
+        dict(name="a4_vector_dense", size="a4", pages=10, per_page=6, kind="vector", payload="medium", qr_pt=110),
+        dict(name="letter_scan", size="letter", pages=10, per_page=2, kind="scan", payload="short", qr_pt=120),
+        dict(name="a4_scan_long", size="a4", pages=6, per_page=1, kind="scan", payload="long", qr_pt=200),
+        dict(name="a3_image_long", size="a3", pages=8, per_page=4, kind="image", payload="long", qr_pt=160),
+        dict(name="a3_vector_small", size="a3", pages=6, per_page=8, kind="vector", payload="short", qr_pt=60),
+        dict(name="a1_image_sparse", size="a1", pages=2, per_page=3, kind="image", payload="medium", qr_pt=150),
+    ],
+}
+
+
+def qr_modules(text: str):
+    # 1モジュール=1画素のQR（0=黒, 255=白、クワイエットゾーンなし）
+    import numpy as np
+    import zxingcpp
+
+    if hasattr(zxingcpp, "create_barcode"):
+        bc = zxingcpp.create_barcode(text, zxingcpp.BarcodeFormat.QRCode)
+        return np.array(zxingcpp.write_barcode_to_image(bc, scale=1, add_quiet_zones=False))
+    # 旧API: width/height=0 で最小サイズ（クワイエットゾーン付き）が返る
+    img = np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.QRCode, text, width=0, height=0, quiet_zone=0))
+    return img
+
+
+def make_payload(rnd: random.Random, length: int, tag: str) -> str:
+    alphabet = string.ascii_letters + string.digits
+    head = f"https://example.com/{tag}/"
+    return head + "".join(rnd.choices(alphabet, k=max(1, length - len(head))))
+
+
+def _slots(width: float, height: float, qr_pt: float, count: int, rnd: random.Random) -> list:
+    # 重ならない配置をグリッドから選ぶ（上部はテキスト用に空ける）
+    gap = qr_pt * 0.4
+    cols = max(1, int((width - 72) // (qr_pt + gap)))
+    rows = max(1, int((height - 144) // (qr_pt + gap)))
+    cells = [(c, r) for r in range(rows) for c in range(cols)]
+    rnd.shuffle(cells)
+    out = []
+    for c, r in cells[:count]:
+        x = 36 + c * (qr_pt + gap) + rnd.uniform(0, gap / 2)
+        y = 108 + r * (qr_pt + gap) + rnd.uniform(0, gap / 2)
+        out.append((x, y))
+    return out
+
+
+def _draw_filler_text(page, rnd: random.Random, pno: int):
+    page.insert_text((36, 48), f"Synthetic page {pno + 1}", fontsize=14)
+    words = ["invoice", "total", "amount", "delivery", "reference", "order", "item", "page", "scan", "code"]
+    for i in range(4):
+        line = " ".join(rnd.choices(words, k=12))
+        page.insert_text((36, 68 + i * 10), line, fontsize=8)
+
+
+def _draw_image_qr(page, rect, mods):
+    import fitz
+
+    scale = 4
+    img = mods.repeat(scale, 0).repeat(scale, 1)
+    pix = fitz.Pixmap(fitz.csGRAY, img.shape[1], img.shape[0], img.tobytes(), False)
+    page.insert_image(rect, stream=pix.tobytes("png"))
+
+
+def _draw_vector_qr(page, rect, mods):
+    import fitz
+
+    n = mods.shape[0]
+    unit = rect.width / n
+    shape = page.new_shape()
+    for r in range(n):
+        for c in range(n):
+            if mods[r, c] < 128:
+                x = rect.x0 + c * unit
+                y = rect.y0 + r * unit
+                shape.draw_rect(fitz.Rect(x, y, x + unit, y + unit))
+    shape.finish(color=None, fill=(0, 0, 0), width=0)
+    shape.commit()
+
+
+def _scanned_copy(src_page, dst_doc, rnd: random.Random, dpi: int = 150):
+    # ページを画像化し、ノイズと小さな傾きを加えて全面画像のページにする
+    import fitz
+    import numpy as np
+    from PIL import Image
+
+    pix = src_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width).astype(np.int16)
+    nrs = np.random.default_rng(rnd.randrange(1 << 30))
+    arr += nrs.normal(0, 18, arr.shape).astype(np.int16)
+    arr = np.clip(arr, 0, 255).astype(np.uint8)
+    img = Image.fromarray(arr, "L").rotate(rnd.uniform(-1.5, 1.5), resample=Image.BILINEAR, fillcolor=255)
+    arr = np.asarray(img)
+    out = fitz.Pixmap(fitz.csGRAY, arr.shape[1], arr.shape[0], arr.tobytes(), False)
+    page = dst_doc.new_page(width=src_page.rect.width, height=src_page.rect.height)
+    page.insert_image(page.rect, stream=out.tobytes("png"))
+
+
+def make_pdf(path: str, spec: dict, seed: int = 0) -> dict:
+    # spec に従ってPDFを作り、{ページ番号: [QR文字列]} を返す
+    import fitz
+
+    rnd = random.Random(f"{seed}:{spec['name']}")
+    width, height = PAGE_SIZES[spec["size"]]
+    length = PAYLOAD_LENGTHS[spec["payload"]]
+    kind = spec["kind"]
+    doc = fitz.open()
+    expected = {}
+    for pno in range(spec["pages"]):
+        page = doc.new_page(width=width, height=height)
+        _draw_filler_text(page, rnd, pno)
+        texts = []
+        for k, (x, y) in enumerate(_slots(width, height, spec["qr_pt"], spec["per_page"], rnd)):
+            text = make_payload(rnd, length, f"{spec['name']}/{pno}/{k}")
+            mods = qr_modules(text)
+            rect = fitz.Rect(x, y, x + spec["qr_pt"], y + spec["qr_pt"])
+            if kind == "vector":
+                _draw_vector_qr(page, rect, mods)
+            else:
+                _draw_image_qr(page, rect, mods)
+            texts.append(text)
+        expected[pno] = texts
+    if kind == "scan":
+        scanned = fitz.open()
+        for page in doc:
+            _scanned_copy(page, scanned, rnd)
+        doc.close()
+        doc = scanned
+    doc.save(path, deflate=True)
+    doc.close()
+    return expected
+
+
+def build_corpus(out_dir: str, preset: str = "small", seed: int = 0) -> dict:
+    # out_dir にPDF一式と manifest.json を作る。既存の同一設定コーパスは再利用する
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("preset") == preset and manifest.get("seed") == seed and all(
+            os.path.exists(os.path.join(out_dir, name)) for name in manifest["files"]
+        ):
+            return manifest
+
+    files = {}
+    for spec in PRESETS[preset]:
+        name = spec["name"] + ".pdf"
+        expected = make_pdf(os.path.join(out_dir, name), spec, seed)
+        files[name] = {
+            "spec": spec,
+            "pages": spec["pages"],
+            # JSON のキーは文字列になるので、読み出し側で int に戻す
+            "expected": {str(p): t for p, t in expected.items()},
+        }
+    manifest = {"preset": preset, "seed": seed, "files": files}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("out_dir")
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    manifest = build_corpus(args.out_dir, args.preset, args.seed)
+    pages = sum(f["pages"] for f in manifest["files"].values())
+    codes = sum(len(t) for f in manifest["files"].values() for t in f["expected"].values())
+    print(f"{len(manifest['files'])} files, {pages} pages, {codes} QR codes -> {args.out_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
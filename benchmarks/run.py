@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# 合成コーパスで検出〜注釈付きPDF出力までを計測し、結果をJSONで保存する
+#   python benchmarks/run.py [--preset small|full] [--zoom 3.0] [--path gray|legacy|vector] [--auto-zoom]
+#   python benchmarks/run.py --coarse-zoom 1.0   # 粗→密の検出。ページ全体の検出に対する再現率も出す
+#   python benchmarks/run.py --baseline benchmarks/results/old.json   # 計測後に比較
+#   python benchmarks/run.py --diff old.json new.json                 # 保存済み結果どうしの比較
+# 段階: render（ページ描画）/ decode（zxing）/ export（export_annotated_pdf）/ summary（QR一覧ページ）
+#       vector（--path vector の塗り図形からの検出。読めなかったページは gray で描画する）
+#       coarse（--coarse-zoom の粗→密の検出。描画・復号を含む）
+import argparse
+import collections
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from corpus import PRESETS, build_corpus  # noqa: E402
+from bench_render_path import _peak_rss_mb  # noqa: E402
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    vs = sorted(values)
+
+    def pick(q):
+        return vs[min(len(vs) - 1, int(round(q * (len(vs) - 1))))]
+
+    return {
+        "count": len(vs),
+        "mean_ms": round(sum(vs) / len(vs) * 1000, 3),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p90_ms": round(pick(0.90) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(vs[-1] * 1000, 3),
+    }
+
+
+def _versions() -> dict:
+    import fitz
+    import numpy
+    import zxingcpp
+
+    return {
+        "python": platform.python_version(),
+        "pymupdf": getattr(fitz, "VersionBind", None) or getattr(fitz, "__version__", None),
+        "mupdf": getattr(fitz, "VersionFitz", None),
+        "zxingcpp": getattr(zxingcpp, "__version__", None),
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _detect(page, zoom: float, path: str, stages: dict, coarse_zoom: float | None = None,
+            coarse_stats: dict | None = None) -> tuple[list, int]:
+    # 戻り値: (検出結果, 描画した画素数)。粗→密では画素数を数えない（0）
+    import fitz
+    from PIL import Image
+    from pdfqrlink.core import detect_and_decode_qr_gray, detect_and_decode_qr_zxing, render_page_gray
+
+    if coarse_zoom:
+        from pdfqrlink.coarse import detect_page_coarse_to_fine
+
+        t0 = time.perf_counter()
+        dets = detect_page_coarse_to_fine(page, zoom, coarse_zoom, coarse_stats)
+        stages["coarse"].append(time.perf_counter() - t0)
+        return dets, 0
+    if path == "vector":
+        from pdfqrlink.vector import detect_vector_qr
+
+        t0 = time.perf_counter()
+        dets = detect_vector_qr(page, zoom)
+        stages["vector"].append(time.perf_counter() - t0)
+        if dets is not None:
+            return dets, 0
+        path = "gray"
+    t0 = time.perf_counter()
+    if path == "gray":
+        pix, gray = render_page_gray(page, zoom)
+        t1 = time.perf_counter()
+        dets = detect_and_decode_qr_gray(gray)
+    else:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        t1 = time.perf_counter()
+        dets = detect_and_decode_qr_zxing(img)
+    t2 = time.perf_counter()
+    stages["render"].append(t1 - t0)
+    stages["decode"].append(t2 - t1)
+    return dets, pix.width * pix.height
+
+
+def _match(expected: list[str], found: list[str]) -> tuple[int, int]:
+    # (一致数, 余分な検出数) を多重集合として数える
+    want = collections.Counter(expected)
+    got = collections.Counter(found)
+    hit = sum((want & got).values())
+    return hit, sum(got.values()) - hit
+
+
+def run_file(pdf_path: str, expected: dict, zoom: float, path: str, stages: dict, auto_zoom: bool = False,
+             coarse_zoom: float | None = None) -> dict:
+    import fitz
+    from pdfqrlink.autozoom import estimate_page_zoom
+    from pdfqrlink.core import _append_summary_pages, detect_page, export_annotated_pdf
+
+    doc = fitz.open(pdf_path)
+    detections_map, zoom_map = {}, {}
+    hits = extras = total = pixels = 0
+    coarse_stats: dict = {}
+    t0 = time.perf_counter()
+    for pidx in range(len(doc)):
+        page = doc.load_page(pidx)
+        # 倍率の見積もりも検出時間に含める
+        page_zoom = estimate_page_zoom(page, zoom)[0] if auto_zoom else zoom
+        dets, rendered = _detect(page, page_zoom, path, stages, coarse_zoom, coarse_stats)
+        pixels += rendered
+        detections_map[pidx] = dets
+        zoom_map[pidx] = page_zoom
+        want = expected.get(str(pidx), [])
+        hit, extra = _match(want, [d["text"] for d in dets])
+        hits += hit
+        extras += extra
+        total += len(want)
+    detect_sec = time.perf_counter() - t0
+    pages = len(doc)  # export で QR 一覧ページが追加される前に数える
+
+    coarse = {}
+    if coarse_zoom:
+        # 同じ倍率のページ全体の検出で読めたQRのうち、粗→密でも読めた数（計測時間には含めない）
+        full = matched = 0
+        for pidx in range(pages):
+            ref = [d["text"] for d in detect_page(doc.load_page(pidx), zoom_map[pidx], True)]
+            full += len(ref)
+            matched += _match(ref, [d["text"] for d in detections_map[pidx]])[0]
+        coarse = {"full_found": full, "coarse_matched_full": matched,
+                  "coarse_fallbacks": coarse_stats.get("coarse_fallbacks", 0)}
+
+    t1 = time.perf_counter()
+    out = export_annotated_pdf(doc, detections_map, zoom_map)
+    stages["export"].append(time.perf_counter() - t1)
+    doc.close()
+
+    entries = [(i + 1, d["text"]) for i, d in enumerate(d for p in sorted(detections_map) for d in detections_map[p])]
+    scratch = fitz.open()
+    scratch.new_page()
+    t2 = time.perf_counter()
+    _append_summary_pages(scratch, entries)
+    stages["summary"].append(time.perf_counter() - t2)
+    scratch.close()
+
+    return {
+        "pages": pages,
+        "expected": total,
+        "found": hits,
+        "false_positives": extras,
+        "recall": round(hits / total, 4) if total else None,
+        "detect_sec": round(detect_sec, 4),
+        "pages_per_sec": round(pages / detect_sec, 2) if detect_sec else None,
+        "pixels": pixels,
+        "output_bytes": len(out),
+        **coarse,
+    }
+
+
+def run(corpus_dir: str, preset: str, seed: int, zoom: float, path: str, repeat: int, auto_zoom: bool = False,
+        coarse_zoom: float | None = None) -> dict:
+    manifest = build_corpus(corpus_dir, preset, seed)
+    stages = collections.defaultdict(list)
+    files = {}
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for name, info in manifest["files"].items():
+            files[name] = run_file(os.path.join(corpus_dir, name), info["expected"], zoom, path, stages, auto_zoom,
+                                   coarse_zoom)
+    elapsed = time.perf_counter() - t0
+
+    pages = sum(f["pages"] for f in files.values()) * repeat
+    expected = sum(f["expected"] for f in files.values())
+    found = sum(f["found"] for f in files.values())
+    detect_sec = sum(f["detect_sec"] for f in files.values())
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "preset": preset,
+            "seed": seed,
+            "zoom": zoom,
+            "auto_zoom": auto_zoom,
+            "coarse_zoom": coarse_zoom,
+            "path": path,
+            "repeat": repeat,
+            "versions": _versions(),
+        },
+        "totals": {
+            "files": len(files),
+            "pages": pages,
+            "elapsed_sec": round(elapsed, 3),
+            "pages_per_sec": round(pages / elapsed, 2) if elapsed else None,
+            # 検出段階のみのページ/秒（最後の繰り返しで計測）
+            "detect_pages_per_sec": round(pages / repeat / detect_sec, 2) if detect_sec else None,
+            "qr_expected": expected,
+            "qr_found": found,
+            "false_positives": sum(f["false_positives"] for f in files.values()),
+            "recall": round(found / expected, 4) if expected else None,
+            # 描画したページ1枚あたりの画素数
+            "pixels_per_page": (sum(f["pixels"] for f in files.values()) * repeat // pages
+                                if pages and not coarse_zoom else None),
+            "peak_rss_mb": round(_peak_rss_mb() or 0, 1) or None,
+        },
+        # 粗→密のとき: ページ全体の検出で読めたQRに対する再現率と、ページ全体へ戻した回数
+        **({"coarse": {
+            "recall_vs_full": (round(sum(f["coarse_matched_full"] for f in files.values())
+                                     / sum(f["full_found"] for f in files.values()), 4)
+                               if sum(f["full_found"] for f in files.values()) else None),
+            "fallbacks": sum(f["coarse_fallbacks"] for f in files.values()),
+        }} if coarse_zoom else {}),
+        "stages": {name: _percentiles(vals) for name, vals in stages.items()},
+        "files": files,
+    }
+
+
+# 比較する指標と「大きいほど良い」か
+_COMPARE_KEYS = [
+    ("totals", "pages_per_sec", True),
+    ("totals", "detect_pages_per_sec", True),
+    ("totals", "recall", True),
+    ("totals", "false_positives", False),
+    ("totals", "pixels_per_page", False),
+    ("coarse", "recall_vs_full", True),
+    ("totals", "peak_rss_mb", False),
+]
+
+
+def compare(base: dict, new: dict) -> list[dict]:
+    rows = []
+    keys = list(_COMPARE_KEYS)
+    for stage in sorted(set(base.get("stages", {})) | set(new.get("stages", {}))):
+        keys += [("stages", f"{stage}.p50_ms", False), ("stages", f"{stage}.p90_ms", False)]
+    for section, key, higher_better in keys:
+        a, b = base.get(section, {}), new.get(section, {})
+        for part in key.split("."):
+            a = a.get(part) if isinstance(a, dict) else None
+            b = b.get(part) if isinstance(b, dict) else None
+        row = {"metric": f"{section}.{key}", "base": a, "new": b}
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a:
+            change = (b - a) / a * 100
+            row["change_pct"] = round(change, 1)
+            row["better"] = change > 0 if higher_better else change < 0
+        rows.append(row)
+    return rows
+
+
+def _print_compare(base: dict, new: dict):
+    for key in ("zoom", "auto_zoom", "coarse_zoom", "path", "preset"):
+        if base["meta"].get(key) != new["meta"].get(key):
+            print(f"注意: {key} が異なります ({base['meta'].get(key)} -> {new['meta'].get(key)})", file=sys.stderr)
+    for row in compare(base, new):
+        change = row.get("change_pct")
+        mark = "" if change is None else (" +" if row["better"] else " -") if abs(change) >= 5 else " ="
+        tail = "" if change is None else f"  {change:+.1f}%{mark}"
+        print(f"{row['metric']:<32} {row['base']!s:>12} -> {row['new']!s:<12}{tail}")
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--zoom", type=float, default=3.0)
+    ap.add_argument("--path", choices=["gray", "legacy", "vector"], default="gray",
+                    help="gray: グレースケール高速経路 / legacy: RGB -> PIL -> OpenCV 経路 / "
+                         "vector: 塗り図形から読み、読めないページだけ gray")
+    ap.add_argument("--auto-zoom", action="store_true",
+                    help="ページごとに倍率を見積もる（--zoom は見積もれないページの倍率）")
+    ap.add_argument("--coarse-zoom", type=float, default=None,
+                    help="粗→密の検出を測る（候補探しの倍率）。ページ全体の検出に対する再現率も出す")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--corpus", default=None, help="コーパスの保存先（省略時は一時ディレクトリ）")
+    ap.add_argument("--out", default=None, help="結果JSONの保存先（既定: benchmarks/results/<日時>.json）")
+    ap.add_argument("--baseline", default=None, help="比較対象の結果JSON")
+    ap.add_argument("--diff", nargs=2, metavar=("BASE", "NEW"), help="保存済み結果JSONどうしを比較して終了")
+    args = ap.parse_args()
+
+    if args.diff:
+        _print_compare(_load(args.diff[0]), _load(args.diff[1]))
+        return
+
+    if args.corpus:
+        result = run(args.corpus, args.preset, args.seed, args.zoom, args.path, args.repeat, args.auto_zoom,
+                     args.coarse_zoom)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run(tmp, args.preset, args.seed, args.zoom, args.path, args.repeat, args.auto_zoom,
+                     args.coarse_zoom)
+
+    out = args.out or os.path.join(HERE, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(json.dumps({k: result[k] for k in ("totals", "coarse", "stages") if k in result}, indent=2))
+    print(f"saved: {out}", file=sys.stderr)
+
+    if args.baseline:
+        _print_compare(_load(args.baseline), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# 公開関数は初回アクセス時に core を読み込む（`import pdfqrlink` だけでは numpy / PyMuPDF を読まない）
+__all__ = [
+    "detect_and_decode_qr_zxing",
+    "detect_page",
+    "export_annotated_pdf",
+    "parse_pages",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import core
+
+        return getattr(core, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# ページごとの描画倍率の自動推定
+# QRの1モジュールが描画後に TARGET_PX_PER_MODULE 画素前後になる最小の倍率を、ページの内容から見積もる
+# 1) ベクターのQR: 塗り図形の小さな正方形（モジュール）の一辺から直接求める
+# 2) QRくらいの大きさの正方形の画像: 画素の白黒の連なりから1モジュールの画素数を測り、モジュール数を求める
+#    （測れない画像は画素数をモジュール数の上限とみなす）
+# 3) それより大きい画像（スキャン・写真）: 画像の解像度のまま描画する
+# 画像から求めた倍率は画像の解像度を上限とする（それ以上に上げても情報は増えない）
+# 候補が複数あれば最も大きい倍率を使い、何も見積もれないページは指定の倍率のままにする
+import fitz  # PyMuPDF
+import numpy as np
+
+from .coarse import QR_MAX_MODULES
+from .core import _pixmap_gray_view
+from .images import MIN_IMAGE_SIDE, _gray_pixmap
+from .prefilter import MIN_MODULE_PT, MIN_QR_SIDE_PT, MIN_VECTOR_ITEMS
+
+# 1モジュールあたりの画素数の目標（合成コーパスでは 2 画素前後から安定して読める。余裕を見て 2.5）
+TARGET_PX_PER_MODULE = 2.5
+# 自動で選ぶ倍率の範囲
+MIN_AUTO_ZOOM = 1.0
+MAX_AUTO_ZOOM = 6.0
+# この一辺（pt）までの正方形に近い画像をQRそのものの画像とみなす
+MAX_QR_IMAGE_PT = 300.0
+# モジュールの画素数を測るときに見る行数の上限
+RUN_SAMPLE_ROWS = 64
+# モジュールとみなす塗り矩形の一辺の上限（pt。下限は prefilter.MIN_MODULE_PT）
+MAX_MODULE_PT = 12.0
+
+
+def _clamp(zoom: float) -> float:
+    return round(min(MAX_AUTO_ZOOM, max(MIN_AUTO_ZOOM, zoom)), 2)
+
+
+def _module_px(doc: fitz.Document, xref: int) -> float | None:
+    # 二値化した行の白黒の連なり（両端の余白を除く）の長さの 10%点を1モジュールの画素数とする
+    # ぼけ・ノイズの細い連なりは小さい側へ寄せる（モジュール数を多めに見積もり、倍率は高い側へ倒れる）
+    try:
+        gray = _pixmap_gray_view(_gray_pixmap(doc, xref))
+    except Exception:
+        return None
+    lo, hi = int(gray.min()), int(gray.max())
+    if hi - lo < 64:
+        return None
+    dark = gray < (lo + hi) // 2
+    runs = []
+    for row in dark[::max(1, len(dark) // RUN_SAMPLE_ROWS)]:
+        edges = np.flatnonzero(row[1:] != row[:-1])
+        if len(edges) >= 2:
+            runs.append(np.diff(edges))
+    if not runs:
+        return None
+    return max(1.0, float(np.percentile(np.concatenate(runs), 10)))
+
+
+def _image_zooms(page: fitz.Page) -> list[float]:
+    zooms = []
+    for info in page.get_image_info(xrefs=True):
+        r = fitz.Rect(info["bbox"])
+        w, h = info.get("width", 0), info.get("height", 0)
+        side = min(r.width, r.height)
+        if side < MIN_QR_SIDE_PT or min(w, h) < MIN_IMAGE_SIDE:
+            continue
+        # 画像の解像度（pt あたりの画素数）
+        native = min(w / r.width, h / r.height)
+        if side <= MAX_QR_IMAGE_PT and max(r.width, r.height) <= side * 1.25:
+            xref = info.get("xref", 0)
+            unit = _module_px(page.parent, xref) if xref > 0 else None
+            modules = min(w, h) / (unit or 1.0)
+            modules = min(QR_MAX_MODULES, max(MIN_IMAGE_SIDE, modules))
+            zooms.append(min(native, TARGET_PX_PER_MODULE * modules / side))
+        else:
+            zooms.append(native)
+    return zooms
+
+
+def _module_sides(page: fitz.Page) -> list[float]:
+    # 塗り図形のうちモジュールになり得る小さな矩形の短辺（pt）
+    get = getattr(page, "get_cdrawings", None) or page.get_drawings
+    sides = []
+    for path in get():
+        if path.get("fill") is None:
+            continue
+        items = path["items"]
+        if all(item[0] == "re" for item in items):
+            rects = [fitz.Rect(item[1]) for item in items]
+        elif all(item[0] == "qu" for item in items):
+            rects = [fitz.Quad(item[1]).rect for item in items]
+        else:
+            # モジュールごとに線分で閉じたパスを描く生成系
+            rects = [fitz.Rect(path["rect"])]
+        for r in rects:
+            s = min(abs(r.width), abs(r.height))
+            if MIN_MODULE_PT <= s <= MAX_MODULE_PT:
+                sides.append(s)
+    return sides
+
+
+def _vector_zoom(page: fitz.Page) -> float | None:
+    sides = _module_sides(page)
+    if len(sides) < MIN_VECTOR_ITEMS:
+        return None
+    sides.sort()
+    # 連続したモジュールをまとめて1つの矩形で描く生成系もあるので、小さい側（10%点）を1モジュールとする
+    return TARGET_PX_PER_MODULE / sides[len(sides) // 10]
+
+
+def estimate_page_zoom(page: fitz.Page, fallback: float) -> tuple[float, str]:
+    # 戻り値: (倍率, 根拠 "vector" / "image" / "fallback")
+    candidates = [(z, "image") for z in _image_zooms(page)]
+    vz = _vector_zoom(page)
+    if vz is not None:
+        candidates.append((vz, "vector"))
+    if not candidates:
+        return fallback, "fallback"
+    zoom, source = max(candidates)
+    return _clamp(zoom), source
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# ヘッドレス一括処理（複数ファイルをプロセスプールへ分配）
+import os
+import shutil
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import trace
+from .checkpoint import CheckpointJournal
+from .core import EncryptedPdfError, annotate_document, open_pdf, parse_pages, save_document
+from .parallel import Cancelled, detect_document
+from .scanner import merge_stats
+
+
+class FileTimeout(Exception):
+    pass
+
+
+class FileCancelled(Exception):
+    pass
+
+
+# プールのワーカーが共有する停止要求（GUI のキュー処理がプールの initializer で渡す）
+_stop_event = None
+
+
+def init_stop_event(event):
+    global _stop_event
+    _stop_event = event
+
+
+def stop_requested() -> bool:
+    # プールへ渡す should_stop（ラムダは spawn のワーカーへ送れないのでモジュール関数にする）
+    return _stop_event is not None and _stop_event.is_set()
+
+
+def collect_pdfs(inputs: list[str]) -> list[tuple[str, str]]:
+    # (入力パス, 出力先で使う相対パス) の組を返す。ディレクトリは再帰的に探索
+    found: list[tuple[str, str]] = []
+    for src in inputs:
+        if os.path.isdir(src):
+            for root, dirs, files in os.walk(src):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        path = os.path.join(root, name)
+                        found.append((path, os.path.relpath(path, src)))
+        elif src.lower().endswith(".pdf") and os.path.isfile(src):
+            found.append((src, os.path.basename(src)))
+    return found
+
+
+def output_path_for(rel_path: str, out_dir: str) -> str:
+    stem = os.path.splitext(rel_path)[0]
+    return os.path.join(out_dir, f"{stem}_annotated.pdf")
+
+
+def _check_deadline(deadline: float | None):
+    if deadline is not None and time.monotonic() > deadline:
+        raise FileTimeout("タイムアウトしました。")
+
+
+def _on_alarm(signum, frame):
+    raise FileTimeout("タイムアウトしました。")
+
+
+def _arm_alarm(timeout: float | None) -> bool:
+    # POSIX のメインスレッドでは SIGALRM で強制中断（ページ間チェックの保険）
+    if not timeout or not hasattr(signal, "setitimer"):
+        return False
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    return True
+
+
+def _disarm_alarm():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
+
+def _part_path(path: str) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path + ".part"
+
+
+def process_file(in_path: str, out_path: str, zoom: float = 3.0, page_sel: str = "all",
+                 timeout: float | None = None, page_jobs: int = 1, scan_opts: dict | None = None,
+                 incremental: bool = False, decode_threads: int = 0, overlay: bool = False,
+                 checkpoint_dir: str | None = None, traced: bool = False, should_stop=None) -> dict:
+    # 1回だけ開いたドキュメントで暗号化チェック・検出・注釈付けを行い、出力先へ直接保存する
+    # incremental=True: 入力を出力先へコピーしてから開き、注釈を追記保存する（全体の書き直しなし）
+    # overlay=True: 枠・番号をページ内容へ描き込み、リンクだけを注釈として残す（annotate_document を参照）
+    # checkpoint_dir: ページごとの検出結果をここへ記録し、中断・タイムアウトしたファイルを次回は続きから処理する
+    #   （保存まで終わったら記録は消す）
+    # traced=True: このプロセスで計測を有効にし、記録を result["trace"] で返す（プールのワーカー用）
+    # should_stop: 真を返したらページの区切りで打ち切り、status "cancelled" で返す（記録は残すので次回は続きから）
+    if traced:
+        trace.enable(fresh=True)
+    t0 = time.perf_counter()
+    deadline = time.monotonic() + timeout if timeout else None
+    result = {
+        "file": in_path,
+        "output": None,
+        "status": "ok",
+        "pages": 0,
+        "qr_count": 0,
+        "seconds": 0.0,
+        "error": None,
+        "stats": {},
+    }
+    armed = _arm_alarm(timeout)
+    part = _part_path(out_path)
+    journal = None
+    with trace.span("file", file=in_path) as file_span:
+        try:
+            if checkpoint_dir:
+                journal = CheckpointJournal.for_document(in_path, zoom, scan_opts or {}, checkpoint_dir)
+            if incremental:
+                shutil.copyfile(in_path, part)
+                src = part
+            else:
+                src = in_path
+            doc = open_pdf(src)
+            try:
+                target_pages = parse_pages(page_sel, len(doc))
+                try:
+                    detections_map, zoom_map = detect_document(
+                        src, target_pages, zoom, workers=page_jobs,
+                        should_stop=lambda: ((deadline is not None and time.monotonic() > deadline)
+                                             or (should_stop is not None and should_stop())),
+                        doc=doc, stats=result["stats"], decode_threads=decode_threads, checkpoint=journal,
+                        **(scan_opts or {}),
+                    )
+                except Cancelled:
+                    if should_stop is not None and should_stop():
+                        raise FileCancelled("停止しました。")
+                    raise FileTimeout("タイムアウトしました。")
+                _check_deadline(deadline)
+                annotate_document(doc, detections_map, zoom_map, overlay=overlay)
+                save_document(doc, part, incremental=incremental)
+            finally:
+                doc.close()
+            os.replace(part, out_path)
+            if journal is not None:
+                journal.discard()
+            result["output"] = out_path
+            result["pages"] = len(target_pages)
+            result["qr_count"] = detections_map.qr_count
+        except EncryptedPdfError as e:
+            result["status"] = "skipped"
+            result["error"] = str(e)
+        except FileTimeout as e:
+            result["status"] = "timeout"
+            result["error"] = str(e)
+        except FileCancelled as e:
+            result["status"] = "cancelled"
+            result["error"] = str(e)
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            if armed:
+                _disarm_alarm()
+            if journal is not None:
+                journal.close()
+            if os.path.exists(part):
+                os.remove(part)
+        file_span.set(status=result["status"])
+    result["seconds"] = round(time.perf_counter() - t0, 4)
+    if traced:
+        result["trace"] = trace.take_events()
+    return result
+
+
+def summarize(results: list[dict], elapsed: float, jobs: int) -> dict:
+    stats: dict = {}
+    for r in results:
+        merge_stats(stats, r["stats"])
+    failures = [
+        {"file": r["file"], "status": r["status"], "error": r["error"]}
+        for r in results if r["status"] in ("error", "timeout")
+    ]
+    return {
+        "files": len(results),
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "timeouts": sum(1 for r in results if r["status"] == "timeout"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "pages": sum(r["pages"] for r in results),
+        "qr_codes": sum(r["qr_count"] for r in results),
+        # 描画したページ1枚あたりの画素数（--auto-zoom の効果の目安）
+        "pixels_per_page": stats.get("raster_pixels", 0) // stats["raster_pages"] if stats.get("raster_pages") else 0,
+        "jobs": jobs,
+        "elapsed_sec": round(elapsed, 4),
+        "files_per_sec": round(len(results) / elapsed, 4) if elapsed > 0 else 0.0,
+        "stats": stats,
+        "failures": failures,
+        "results": results,
+    }
+
+
+def run_batch(inputs: list[str], out_dir: str, jobs: int = 1, zoom: float = 3.0,
+              page_sel: str = "all", timeout: float | None = None, page_jobs: int = 1,
+              scan_opts: dict | None = None, incremental: bool = False, decode_threads: int = 0,
+              overlay: bool = False, checkpoint_dir: str | None = None, on_result=None) -> dict:
+    files = collect_pdfs(inputs)
+    opts = {
+        "zoom": zoom, "page_sel": page_sel, "timeout": timeout,
+        "page_jobs": page_jobs, "scan_opts": scan_opts, "incremental": incremental,
+        "decode_threads": decode_threads, "overlay": overlay, "checkpoint_dir": checkpoint_dir,
+    }
+    t0 = time.perf_counter()
+    results: list[dict] = []
+
+    def _done(res: dict):
+        trace.add_events(res.pop("trace", None))
+        results.append(res)
+        if on_result is not None:
+            on_result(res, len(results), len(files))
+
+    if jobs <= 1:
+        for path, rel in files:
+            _done(process_file(path, output_path_for(rel, out_dir), **opts))
+    elif files:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            # 計測が有効なら各ワーカーでも記録し、結果と一緒に回収する
+            traced = trace.active() is not None
+            futures = {
+                ex.submit(process_file, path, output_path_for(rel, out_dir), **opts, traced=traced): path
+                for path, rel in files
+            }
+            for fut in as_completed(futures):
+                try:
+                    _done(fut.result())
+                except Exception as e:
+                    # ワーカープロセスの異常終了など
+                    _done({
+                        "file": futures[fut], "output": None, "status": "error",
+                        "pages": 0, "qr_count": 0, "seconds": 0.0,
+                        "error": f"{type(e).__name__}: {e}", "stats": {},
+                    })
+
+    results.sort(key=lambda r: r["file"])
+    return summarize(results, time.perf_counter() - t0, jobs)
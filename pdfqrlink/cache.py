@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# ページ内容のハッシュをキーにした検出結果の永続キャッシュ（SQLite, LRU で容量制限）
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import fitz  # PyMuPDF
+import zxingcpp
+
+# 検出結果の形式や座標の意味を変えたら上げる
+CACHE_SCHEMA = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def decoder_version() -> str:
+    return f"pdfqrlink/{CACHE_SCHEMA} zxing-cpp/{getattr(zxingcpp, '__version__', '?')} mupdf/{fitz.VersionBind}"
+
+
+def default_cache_path() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "pdfqrlink", "detections.sqlite")
+
+
+class PageFingerprinter:
+    # ページの内容（コンテンツストリーム、画像・フォーム XObject の生データ、寸法、回転）のハッシュ
+    # 共有される xref のハッシュは文書内で使い回す
+    # decoded=True: 展開後のデータをハッシュする（保存時の deflate で圧縮されても変わらない。再注釈用）
+    def __init__(self, doc: fitz.Document, decoded: bool = False):
+        self.doc = doc
+        self.decoded = decoded
+        self._xref_digest: dict[int, bytes] = {}
+
+    def _digest_xref(self, xref: int) -> bytes:
+        d = self._xref_digest.get(xref)
+        if d is None:
+            try:
+                raw = (self.doc.xref_stream(xref) if self.decoded else self.doc.xref_stream_raw(xref)) or b""
+            except Exception:
+                raw = b""
+            d = hashlib.sha256(raw).digest()
+            self._xref_digest[xref] = d
+        return d
+
+    def page(self, page: fitz.Page) -> str:
+        h = hashlib.sha256()
+        h.update(repr((tuple(page.rect), page.rotation)).encode())
+        h.update(page.read_contents())
+        xrefs = {img[0] for img in page.get_images(full=True)}
+        xrefs.update(x[0] for x in page.get_xobjects())
+        for xref in sorted(xrefs):
+            h.update(xref.to_bytes(8, "little"))
+            h.update(self._digest_xref(xref))
+        return h.hexdigest()
+
+
+class DetectionCache:
+    def __init__(self, path: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS detections ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS detections_lru ON detections(last_access)")
+        self._conn.commit()
+        self._puts_since_check = 0
+        # 前回の実行（ワーカープロセスなど close されずに終わったもの）の超過分をここで回収
+        self.evict()
+
+    @staticmethod
+    def make_key(fingerprint: str, zoom: float, settings: dict) -> str:
+        payload = json.dumps([fingerprint, round(zoom, 4), settings, decoder_version()], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        # 戻り値: (detections, zoom) または None
+        row = self._conn.execute("SELECT value FROM detections WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE detections SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        data = json.loads(row[0])
+        dets = [{"text": d["text"], "points": np.array(d["points"], dtype=np.float32)} for d in data["detections"]]
+        return dets, data["zoom"]
+
+    def put(self, key: str, detections: list, zoom: float):
+        value = json.dumps({
+            "zoom": zoom,
+            "detections": [{"text": d["text"], "points": d["points"].tolist()} for d in detections],
+        }, ensure_ascii=False)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO detections (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, len(value.encode()), time.time()),
+        )
+        self._conn.commit()
+        # 合計サイズの確認は数回に一度（複数プロセスで共有するため毎回 DB から数える）
+        self._puts_since_check += 1
+        if self._puts_since_check >= 32:
+            self._puts_since_check = 0
+            self.evict()
+
+    def evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        removed = 0
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM detections ORDER BY last_access"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        self._conn.executemany("DELETE FROM detections WHERE key = ?", keys)
+        self._conn.commit()
+
+    def close(self):
+        self.evict()
+        self._conn.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# ページごとの検出結果を JSONL に追記するチェックポイント（中断・異常終了した実行の再開用）
+# 1行目に文書（ファイル内容のハッシュ）と結果に影響する設定を書き、以降は完了したページを1行ずつ書く
+# 再開時は同じ文書・設定のときだけ読み込み、途中で切れた最後の行は捨てる
+import hashlib
+import json
+import os
+import time
+
+from .cache import decoder_version, default_cache_path
+
+# 行の形式を変えたら上げる
+CHECKPOINT_SCHEMA = 1
+# この日数より古いチェックポイントは、新しく作るときに削除する
+DEFAULT_MAX_AGE_DAYS = 14
+# 検出結果に影響しない検出オプション（設定のキーに含めない）
+_IGNORED_OPTS = ("cache", "cache_max_bytes", "tile_workers")
+
+
+def default_checkpoint_dir() -> str:
+    return os.path.join(os.path.dirname(default_cache_path()), "checkpoints")
+
+
+def document_key(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def checkpoint_settings(zoom: float, scan_opts: dict) -> dict:
+    settings = {k: v for k, v in sorted(scan_opts.items()) if k not in _IGNORED_OPTS}
+    settings["zoom"] = round(zoom, 4)
+    return settings
+
+
+def prune_checkpoints(directory: str, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+    limit = time.time() - max_age_days * 86400
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < limit:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class CheckpointJournal:
+    def __init__(self, path: str, doc_key: str, settings: dict):
+        self.path = path
+        self._header = {"v": CHECKPOINT_SCHEMA, "doc": doc_key, "settings": settings, "decoder": decoder_version()}
+        self._f = None
+        # 読み込めた完了ページ {pidx: (detections, zoom)}。points は zoom 倍の画素座標（list）
+        self.pages: dict[int, tuple[list, float]] = {}
+        self._clean = self._load()
+
+    @classmethod
+    def for_document(cls, pdf_path: str, zoom: float, scan_opts: dict,
+                     directory: str | None = None) -> "CheckpointJournal":
+        directory = directory or default_checkpoint_dir()
+        os.makedirs(directory, exist_ok=True)
+        prune_checkpoints(directory)
+        doc_key = document_key(pdf_path)
+        settings = checkpoint_settings(zoom, scan_opts)
+        digest = hashlib.sha256(json.dumps([settings, decoder_version()], sort_keys=True).encode()).hexdigest()
+        return cls(os.path.join(directory, f"{doc_key[:32]}-{digest[:16]}.jsonl"), doc_key, settings)
+
+    def _load(self) -> bool:
+        # 戻り値: ファイルがそのまま追記できる状態か（無い・別文書・途中で切れた行がある場合は False）
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except OSError:
+            return False
+        with f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return False
+            if header != json.loads(json.dumps(self._header)):
+                return False
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    self.pages[int(rec["page"])] = (rec["detections"], float(rec["zoom"]))
+                except (ValueError, KeyError, TypeError):
+                    return False
+        return True
+
+    def _open(self):
+        if self._f is not None:
+            return
+        if self._clean:
+            self._f = open(self.path, "a", encoding="utf-8")
+            return
+        # 作り直す（読み込めたページは書き戻す）
+        self._f = open(self.path, "w", encoding="utf-8")
+        self._f.write(json.dumps(self._header, ensure_ascii=False) + "\n")
+        for pidx, (dets, zoom) in sorted(self.pages.items()):
+            self._write(pidx, dets, zoom)
+        self._f.flush()
+        self._clean = True
+
+    def _write(self, pidx: int, dets: list, zoom: float):
+        self._f.write(json.dumps({
+            "page": pidx,
+            "zoom": zoom,
+            "detections": dets,
+        }, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def record(self, pidx: int, detections: list, zoom: float):
+        # ページが終わるたびに1行追記してフラッシュする（プロセスが落ちても完了分は残る）
+        self._open()
+        dets = [{"text": d.get("text") or "",
+                 "points": [[round(float(x), 2), round(float(y), 2)] for x, y in d["points"]]}
+                for d in detections]
+        self.pages[pidx] = (dets, float(zoom))
+        self._write(pidx, dets, float(zoom))
+        self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def discard(self):
+        # 出力を保存し終えたら消す
+        self.close()
+        self.pages.clear()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
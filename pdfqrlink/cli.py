@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+# コマンドライン入口（GUI スタックは import しない）
+# numpy / PyMuPDF などはサブコマンドの実行時に読み込み、--help や引数エラーを速く返す
+import argparse
+import json
+import os
+import sys
+
+
+def _positive_int(val: str) -> int:
+    n = int(val)
+    if n < 1:
+        raise argparse.ArgumentTypeError("1 以上を指定してください。")
+    return n
+
+
+def _add_scan_args(p: argparse.ArgumentParser):
+    p.add_argument("--legacy-render", action="store_true", help="従来の RGB/PIL/OpenCV 経路で検出する")
+    p.add_argument("--coarse-zoom", type=float, default=None,
+                   help="粗→密の2段階検出。指定した低倍率で候補領域を探し、その領域だけ --zoom で描画する")
+    p.add_argument("--embedded-images", action="store_true",
+                   help="埋め込み画像を直接復号し、見つからないページだけ描画する")
+    p.add_argument("--cache", default=None, metavar="PATH",
+                   help="検出キャッシュ (SQLite) の場所 (既定: ユーザーのキャッシュディレクトリ)")
+    p.add_argument("--cache-size", type=float, default=256, metavar="MB", help="検出キャッシュの上限 (MB)")
+    p.add_argument("--no-cache", action="store_true", help="検出キャッシュを使わない")
+    p.add_argument("--max-tile-pixels", type=int, default=None,
+                   help="これを超える画素数のページはタイルに分けて描画する (既定: 4000万, 0 で分割しない)")
+    p.add_argument("--tile-overlap", type=float, default=None, metavar="PT",
+                   help="タイル同士ののりしろ (pt, 既定: 144)。これより小さいQRは境界で欠けない")
+    p.add_argument("--tile-workers", type=_positive_int, default=1, help="タイル復号のスレッド数")
+    p.add_argument("--full-scan", action="store_true",
+                   help="事前判定を行わず全ページを描画する（既定では画像・図形・注釈の無いページを除外する）")
+    p.add_argument("--prefilter-zoom", type=float, default=None, metavar="ZOOM",
+                   help="事前判定で、指定倍率の縮小画像にファインダーパターンが無いページも除外する")
+    p.add_argument("--reuse-positions", action="store_true",
+                   help="前のページで見つけたQRの位置だけを先に読み、その外にQRになり得る画像・図形が無ければ"
+                        "ページ全体は描画しない（毎ページ同じ位置に刷られたQR向け）")
+    p.add_argument("--auto-zoom", action="store_true",
+                   help="ページごとに画像の解像度・図形の大きさから、QRの1モジュールが約2.5画素になる倍率を見積もる"
+                        "（--zoom は見積もれないページの倍率）")
+    p.add_argument("--vector", action="store_true",
+                   help="ベクター（塗り矩形）で描かれたQRをページを描画せずに読む。"
+                        "格子に乗らない・読めない図形があるページだけ描画する")
+
+
+def _add_trace_args(p: argparse.ArgumentParser):
+    p.add_argument("--trace", default=None, metavar="PATH",
+                   help="段階ごとの所要時間・画素数・確保サイズを記録して PATH へ保存する")
+    p.add_argument("--trace-format", choices=["json", "chrome"], default="json",
+                   help="json: 集計＋イベント / chrome: chrome://tracing・Perfetto 用の Trace Event 形式")
+
+
+def _start_trace(args):
+    from . import trace
+
+    return trace.enable() if args.trace else None
+
+
+def _finish_trace(args, tracer):
+    from . import trace
+
+    if tracer is None:
+        return
+    trace.disable()
+    for line in trace.format_summary(tracer):
+        print(line, file=sys.stderr)
+    os.makedirs(os.path.dirname(os.path.abspath(args.trace)), exist_ok=True)
+    tracer.save(args.trace, args.trace_format)
+    print(f"計測結果: {args.trace}", file=sys.stderr)
+
+
+def _scan_opts(args) -> dict:
+    from .cache import default_cache_path
+    from .tiles import DEFAULT_MAX_TILE_PIXELS, DEFAULT_TILE_OVERLAP
+
+    max_tile_pixels = DEFAULT_MAX_TILE_PIXELS if args.max_tile_pixels is None else args.max_tile_pixels
+
+    return {
+        "fast": not args.legacy_render,
+        "coarse_zoom": args.coarse_zoom,
+        "images": args.embedded_images,
+        "cache": None if args.no_cache else (args.cache or default_cache_path()),
+        "cache_max_bytes": int(args.cache_size * 1024 * 1024),
+        "max_tile_pixels": max_tile_pixels or None,
+        "tile_overlap": DEFAULT_TILE_OVERLAP if args.tile_overlap is None else args.tile_overlap,
+        "tile_workers": args.tile_workers,
+        "prefilter": not args.full_scan,
+        "prefilter_zoom": args.prefilter_zoom,
+        "templates": args.reuse_positions,
+        "auto_zoom": args.auto_zoom,
+        "vector": args.vector,
+    }
+
+
+def _cmd_batch(args) -> int:
+    from .batch import run_batch
+
+    def on_result(res, done, total):
+        line = f"[{done}/{total}] {res['status']:7s} {res['file']} (QR {res['qr_count']}件, {res['seconds']:.2f}s)"
+        if res["stats"].get("resumed"):
+            line += f" [チェックポイントから {res['stats']['resumed']}ページ]"
+        if res["error"]:
+            line += f" - {res['error']}"
+        print(line, file=sys.stderr, flush=True)
+
+    tracer = _start_trace(args)
+    summary = run_batch(
+        args.inputs, args.output, jobs=args.jobs, zoom=args.zoom,
+        page_sel=args.pages, timeout=args.timeout, page_jobs=args.page_jobs,
+        scan_opts=_scan_opts(args), incremental=args.incremental,
+        decode_threads=args.decode_threads, overlay=args.overlay, checkpoint_dir=args.checkpoint,
+        on_result=on_result,
+    )
+    _finish_trace(args, tracer)
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary == "-":
+        print(text)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.summary)), exist_ok=True)
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(
+        f"完了: {summary['files']}件 / 失敗 {summary['failed']} / タイムアウト {summary['timeouts']} / "
+        f"QR {summary['qr_codes']}件 / {summary['files_per_sec']:.2f} files/s",
+        file=sys.stderr,
+    )
+    return 0 if summary["failed"] == 0 and summary["timeouts"] == 0 else 1
+
+
+def _cmd_reannotate(args) -> int:
+    from .batch import collect_pdfs
+    from .reannotate import reannotate_file
+
+    tracer = _start_trace(args)
+    failed = 0
+    for path, rel in collect_pdfs(args.inputs):
+        out = os.path.join(args.output, rel) if args.output else None
+        res = reannotate_file(path, out, zoom=args.zoom, decode_threads=args.decode_threads,
+                              scan_opts=_scan_opts(args), in_place=args.in_place)
+        line = f"{res['status']:7s} {res['output'] or res['file']}"
+        if res["status"] == "ok":
+            line += (f" (変更 {res['pages_changed']}ページ / 変更なし {res['pages_unchanged']}ページ, "
+                     f"QR 再利用 {res['qr_reused']}件 / 検出 {res['qr_detected']}件, "
+                     f"{'追記保存' if res['incremental'] else '全体保存'}, {res['seconds']:.2f}s)")
+        else:
+            failed += 1
+            line += f" - {res['error']}"
+        print(line, file=sys.stderr, flush=True)
+    _finish_trace(args, tracer)
+    return 0 if failed == 0 else 1
+
+
+def _cmd_watch(args) -> int:
+    import signal
+
+    from .watch import run_watch
+
+    stop = {"flag": False}
+
+    def _on_signal(signum, frame):
+        stop["flag"] = True
+        print("停止します（処理中のファイルを待っています）…", file=sys.stderr, flush=True)
+
+    signal.signal(signal.SIGINT, _on_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _on_signal)
+
+    def on_result(res):
+        line = f"{res['status']:7s} {res['file']} (QR {res['qr_count']}件, {res['seconds']:.2f}s)"
+        if res["error"]:
+            line += f" - {res['error']}"
+        print(line, file=sys.stderr, flush=True)
+
+    def on_metrics(m):
+        line = (
+            f"処理 {m['processed']}件 (失敗 {m['failed']}) / 直近 {m['recent_files_per_min']:.1f} files/min / "
+            f"待ち {m['queue_depth']}件 / 処理中 {m['in_flight']}件 ({m['in_flight_mb']:.0f}MB) / "
+            f"書き込み待ち {m['waiting_to_settle']}件"
+        )
+        if m["pool_restarts"]:
+            line += f" / ワーカー再起動 {m['pool_restarts']}回"
+        print(line, file=sys.stderr, flush=True)
+
+    tracer = _start_trace(args)
+    final = run_watch(
+        args.inputs, args.output, db_path=args.db, jobs=args.jobs, zoom=args.zoom,
+        page_sel=args.pages, timeout=args.timeout, page_jobs=args.page_jobs,
+        scan_opts=_scan_opts(args), incremental=args.incremental, decode_threads=args.decode_threads,
+        overlay=args.overlay, settle=args.settle, poll=args.poll, max_queue=args.max_queue, memory_budget_mb=args.memory_budget,
+        metrics_path=args.metrics, metrics_every=args.metrics_every,
+        on_result=on_result, on_metrics=on_metrics, should_stop=lambda: stop["flag"], once=args.once,
+    )
+    _finish_trace(args, tracer)
+    print(json.dumps(final, ensure_ascii=False, indent=2))
+    return 0
+
+
+def _cmd_serve(args) -> int:
+    import asyncio
+
+    from .server import serve
+
+    try:
+        asyncio.run(serve(
+            host=args.host, port=args.port, jobs=args.jobs, zoom=args.zoom, scan_opts=_scan_opts(args),
+            max_concurrent=args.max_concurrent, max_pending=args.max_pending,
+            request_timeout=args.timeout, max_upload_mb=args.max_upload, pages_per_task=args.pages_per_task,
+            ttl=args.ttl, work_dir=args.work_dir,
+        ))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _cmd_detect(args) -> int:
+    from .batch import collect_pdfs
+    from .core import EncryptedPdfError, open_pdf, parse_pages
+    from .parallel import detect_document
+    from .records import open_writer, page_records
+
+    stream = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    tracer = _start_trace(args)
+    failed = 0
+    qr = 0
+    try:
+        writer = open_writer(stream, args.format)
+        scan_opts = _scan_opts(args)
+        for path, _ in collect_pdfs(args.inputs):
+            try:
+                doc = open_pdf(path)
+                try:
+                    pages = parse_pages(args.pages, len(doc))
+
+                    # 1ページ終わるごとに書き出す（注釈付け・保存は行わない）
+                    def on_page(pidx, dets, done, total, page_zoom, _path=path):
+                        nonlocal qr
+                        writer.write(page_records(_path, pidx, dets, page_zoom))
+                        qr += len(dets)
+
+                    detect_document(
+                        path, pages, args.zoom, workers=args.page_jobs, on_page=on_page, doc=doc,
+                        decode_threads=args.decode_threads, **scan_opts,
+                    )
+                finally:
+                    doc.close()
+            except EncryptedPdfError as e:
+                print(f"skipped {path} - {e}", file=sys.stderr, flush=True)
+            except Exception as e:
+                failed += 1
+                print(f"error   {path} - {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    _finish_trace(args, tracer)
+    print(f"QR {qr}件 / 失敗 {failed}", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdfqrlink", description="PDF内QRコードに注釈を追加します。")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("batch", help="複数のPDFを一括処理します。")
+    p.add_argument("inputs", nargs="+", help="入力PDFまたはディレクトリ")
+    p.add_argument("output", help="出力ディレクトリ（*_annotated.pdf を書き出します）")
+    p.add_argument("--jobs", "-j", type=_positive_int, default=os.cpu_count() or 1, help="並列プロセス数")
+    p.add_argument("--page-jobs", type=_positive_int, default=1, help="1ファイル内のページ並列プロセス数")
+    p.add_argument("--decode-threads", type=int, default=0, metavar="N",
+                   help="描画と復号を重ねる復号スレッド数（--page-jobs 1 のとき。0 で使わない）")
+    p.add_argument("--zoom", type=float, default=3.0, help="レンダリング倍率 (既定: 3.0)")
+    p.add_argument("--pages", default="all", help="解析ページ範囲 例: all / 1-3,5")
+    p.add_argument("--timeout", type=float, default=None, help="1ファイルあたりの制限秒数")
+    p.add_argument("--summary", default="-", help="集計JSONの出力先 (既定: 標準出力)")
+    p.add_argument("--checkpoint", default=None, metavar="DIR",
+                   help="ページごとの検出結果を DIR に記録し、中断・タイムアウトしたファイルを次回は続きから処理する")
+    p.add_argument("--incremental", action="store_true",
+                   help="入力をコピーして注釈を追記保存する（大きなPDFで全体を書き直さない）")
+    p.add_argument("--overlay", action="store_true",
+                   help="枠・番号をページ内容へ描き込み、リンクだけを注釈として残す（QRの多いPDFで速く小さい。reannotate 不可）")
+    _add_scan_args(p)
+    _add_trace_args(p)
+    p.set_defaults(func=_cmd_batch)
+
+    p = sub.add_parser("reannotate", help="注釈済みPDFを、内容の変わったページだけ検出し直して更新します。")
+    p.add_argument("inputs", nargs="+", help="注釈済みPDFまたはディレクトリ")
+    dest = p.add_mutually_exclusive_group()
+    dest.add_argument("--output", "-o", default=None,
+                      help="出力ディレクトリ（省略時は入力の隣に *_reannotated.pdf を書きます）")
+    dest.add_argument("--in-place", action="store_true",
+                      help="出力を分けず、入力ファイルをその場で追記保存する")
+    p.add_argument("--decode-threads", type=int, default=0, metavar="N",
+                   help="描画と復号を重ねる復号スレッド数（0 で使わない）")
+    p.add_argument("--zoom", type=float, default=3.0, help="レンダリング倍率 (既定: 3.0)")
+    _add_scan_args(p)
+    _add_trace_args(p)
+    p.set_defaults(func=_cmd_reannotate)
+
+    p = sub.add_parser("watch", help="フォルダを監視し、置かれたPDFを順に処理します。")
+    p.add_argument("inputs", nargs="+", help="監視するディレクトリ")
+    p.add_argument("--output", "-o", default=None,
+                   help="出力ディレクトリ（省略時は入力の隣に *_annotated.pdf と *_annotated.json を書きます）")
+    p.add_argument("--db", default=None, metavar="PATH",
+                   help="待ち行列 (SQLite) の場所 (既定: ユーザーのキャッシュディレクトリの watch.sqlite)")
+    p.add_argument("--jobs", "-j", type=_positive_int, default=os.cpu_count() or 1, help="並列プロセス数")
+    p.add_argument("--page-jobs", type=_positive_int, default=1, help="1ファイル内のページ並列プロセス数")
+    p.add_argument("--decode-threads", type=int, default=0, metavar="N",
+                   help="描画と復号を重ねる復号スレッド数（--page-jobs 1 のとき。0 で使わない）")
+    p.add_argument("--zoom", type=float, default=3.0, help="レンダリング倍率 (既定: 3.0)")
+    p.add_argument("--pages", default="all", help="解析ページ範囲 例: all / 1-3,5")
+    p.add_argument("--timeout", type=float, default=None, help="1ファイルあたりの制限秒数")
+    p.add_argument("--incremental", action="store_true",
+                   help="入力をコピーして注釈を追記保存する（大きなPDFで全体を書き直さない）")
+    p.add_argument("--overlay", action="store_true",
+                   help="枠・番号をページ内容へ描き込み、リンクだけを注釈として残す（QRの多いPDFで速く小さい。reannotate 不可）")
+    p.add_argument("--settle", type=float, default=2.0, metavar="SEC",
+                   help="サイズと更新時刻がこの秒数変わらなければ書き込み完了とみなす")
+    p.add_argument("--poll", type=float, default=1.0, metavar="SEC", help="フォルダの走査間隔")
+    p.add_argument("--max-queue", type=_positive_int, default=1000,
+                   help="待ち行列の上限。超えた分はフォルダに残し、空きができてから登録する")
+    p.add_argument("--memory-budget", type=float, default=2048, metavar="MB",
+                   help="処理中ジョブのメモリ見積もりの合計の上限")
+    p.add_argument("--metrics", default=None, metavar="PATH", help="スループット等の指標を定期的に書き出すJSON")
+    p.add_argument("--metrics-every", type=float, default=30.0, metavar="SEC", help="指標の出力間隔")
+    p.add_argument("--once", action="store_true", help="置かれているファイルを処理し終えたら終了する")
+    _add_scan_args(p)
+    _add_trace_args(p)
+    p.set_defaults(func=_cmd_watch)
+
+    p = sub.add_parser("serve", help="ローカルHTTPサービスとして待ち受けます。")
+    p.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス (既定: 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765, help="待ち受けるポート (既定: 8765)")
+    p.add_argument("--jobs", "-j", type=_positive_int, default=os.cpu_count() or 1,
+                   help="検出・注釈付けのワーカープロセス数（起動時に立ち上げて使い回す）")
+    p.add_argument("--max-concurrent", type=_positive_int, default=2, help="同時に処理するリクエスト数")
+    p.add_argument("--max-pending", type=int, default=16,
+                   help="処理待ちのリクエスト数の上限。超えると 503 を返す")
+    p.add_argument("--timeout", type=float, default=300.0, help="1リクエストあたりの制限秒数")
+    p.add_argument("--max-upload", type=float, default=200.0, metavar="MB", help="受け付けるPDFの最大サイズ")
+    p.add_argument("--pages-per-task", type=_positive_int, default=4,
+                   help="ワーカーへ渡す1タスクあたりのページ数（小さいほど結果が早く届く）")
+    p.add_argument("--ttl", type=float, default=600.0, metavar="SEC", help="注釈付きPDFを取得できる期間")
+    p.add_argument("--work-dir", default=None, help="アップロードと結果を置くディレクトリ (既定: 一時ディレクトリ)")
+    p.add_argument("--zoom", type=float, default=3.0, help="既定のレンダリング倍率（リクエストの zoom で上書き可）")
+    _add_scan_args(p)
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser("detect", help="QRの検出結果だけを NDJSON / CSV で書き出します（PDFは作りません）。")
+    p.add_argument("inputs", nargs="+", help="入力PDFまたはディレクトリ")
+    p.add_argument("--out", "-o", default="-", help="出力先 (既定: 標準出力)")
+    p.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="出力形式")
+    p.add_argument("--page-jobs", type=_positive_int, default=1, help="1ファイル内のページ並列プロセス数")
+    p.add_argument("--decode-threads", type=int, default=0, metavar="N",
+                   help="描画と復号を重ねる復号スレッド数（--page-jobs 1 のとき。0 で使わない）")
+    p.add_argument("--zoom", type=float, default=3.0, help="レンダリング倍率 (既定: 3.0)")
+    p.add_argument("--pages", default="all", help="解析ページ範囲 例: all / 1-3,5")
+    _add_scan_args(p)
+    _add_trace_args(p)
+    p.set_defaults(func=_cmd_detect)
+    return parser
+
+
+def _check_tiles(args) -> str | None:
+    # タイル分割の設定が、この実行で使い得る最大の倍率でのりしろを保てるか調べる
+    from .autozoom import MAX_AUTO_ZOOM
+    from .server import MAX_REQUEST_ZOOM
+    from .tiles import DEFAULT_MAX_TILE_PIXELS, DEFAULT_TILE_OVERLAP, min_tile_pixels
+
+    max_tile_pixels = DEFAULT_MAX_TILE_PIXELS if args.max_tile_pixels is None else args.max_tile_pixels
+    if not max_tile_pixels:
+        return None
+    overlap = DEFAULT_TILE_OVERLAP if args.tile_overlap is None else args.tile_overlap
+    zoom = args.zoom
+    if args.auto_zoom:
+        zoom = max(zoom, MAX_AUTO_ZOOM)
+    if args.func is _cmd_serve:
+        zoom = max(zoom, MAX_REQUEST_ZOOM)
+    need = min_tile_pixels(zoom, overlap)
+    if max_tile_pixels < need:
+        return (f"--max-tile-pixels {max_tile_pixels} ではのりしろ {overlap:g}pt を倍率 {zoom:g} で保てません"
+                f"（{need} 以上にするか --tile-overlap を小さくしてください）")
+    return None
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, "max_tile_pixels"):
+        error = _check_tiles(args)
+        if error:
+            parser.error(error)
+    return args.func(args)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# 粗→密の2段階検出
+# 1) 低倍率でページ全体を描画し、候補領域（zxing の位置ヒント／ファインダパターン）を探す
+# 2) 候補領域だけを clip 付きで高倍率描画して復号し、座標をページ全体の画素座標へ戻す
+# 候補領域のどれかが読めなかったページは、ページ全体を描画し直す（取りこぼしを黙って返さない）
+import numpy as np
+import fitz  # PyMuPDF
+import zxingcpp
+
+from . import trace
+from .core import _merge_detections, detect_and_decode_qr_gray, detect_page, render_page_gray
+
+# QR の一辺の最大モジュール数（バージョン40）。ファインダ中心から外周までは最大でこれ - 3.5 モジュール
+QR_MAX_MODULES = 177
+
+
+def find_finder_patterns(gray: np.ndarray, threshold: int = 128, min_module: float = 0.8) -> list:
+    # 行ごとのランレングスから 1:1:3:1:1 の並びを探し、縦に連続するものをファインダとみなす
+    # 戻り値: [(cx, cy, module_px), ...]（画素座標）
+    dark = gray < threshold
+    h, w = dark.shape
+    hits: list[tuple[float, int, float]] = []
+    for y in range(h):
+        row = dark[y]
+        edges = np.flatnonzero(row[1:] != row[:-1]) + 1
+        if len(edges) < 4:
+            continue
+        starts = np.concatenate(([0], edges))
+        lengths = np.diff(np.concatenate((starts, [w])))
+        win = np.lib.stride_tricks.sliding_window_view(lengths, 5)
+        first_dark = row[starts[:len(win)]]
+        total = win.sum(axis=1)
+        module = total / 7.0
+        tol = module * 0.5 + 0.5
+        ok = (
+            first_dark
+            & (module >= min_module)
+            & (np.abs(win[:, 0] - module) <= tol)
+            & (np.abs(win[:, 1] - module) <= tol)
+            & (np.abs(win[:, 2] - module * 3.0) <= tol * 2.0)
+            & (np.abs(win[:, 3] - module) <= tol)
+            & (np.abs(win[:, 4] - module) <= tol)
+        )
+        for i in np.flatnonzero(ok):
+            hits.append((starts[i] + total[i] / 2.0, y, float(module[i])))
+
+    # 縦方向にまとめる（中心x が近く、行が連続しているもの）。hits は行順に並んでいる
+    groups: list[list] = []
+    active: list[list] = []
+    for cx, y, mod in hits:
+        active = [g for g in active if y - g[4] <= 2]
+        for g in active:
+            gx, gy, gm, n, last = g
+            if abs(cx - gx) <= max(gm, mod) and last < y:
+                g[0] = (gx * n + cx) / (n + 1)
+                g[1] = gy + y
+                g[2] = (gm * n + mod) / (n + 1)
+                g[3] = n + 1
+                g[4] = y
+                break
+        else:
+            g = [cx, y, mod, 1, y]
+            groups.append(g)
+            active.append(g)
+    # 中央の 3 モジュール幅の帯が縦にも続き、縦方向にも 1:1:3:1:1 になっているものだけ残す
+    found = []
+    for gx, gy, gm, n, _ in groups:
+        cy = gy / n
+        if n >= max(2, gm * 2.0) and _cross_check_vertical(dark, gx, cy, gm):
+            found.append((float(gx), float(cy), float(gm)))
+    return found
+
+
+def _cross_check_vertical(dark: np.ndarray, cx: float, cy: float, module: float) -> bool:
+    col = dark[:, min(int(cx), dark.shape[1] - 1)]
+    y = min(int(round(cy)), len(col) - 1)
+    if not col[y]:
+        return False
+
+    def run(start: int, step: int, color: bool) -> int:
+        i, n = start, 0
+        while 0 <= i < len(col) and col[i] == color:
+            n += 1
+            i += step
+        return n
+
+    up_c = run(y, -1, True)
+    down_c = run(y + 1, 1, True)
+    up_l = run(y - up_c, -1, False)
+    down_l = run(y + 1 + down_c, 1, False)
+    up_d = run(y - up_c - up_l, -1, True)
+    down_d = run(y + 1 + down_c + down_l, 1, True)
+    runs = [up_d, up_l, up_c + down_c, down_l, down_d]
+    total = sum(runs)
+    if total == 0 or 0 in runs:
+        return False
+    mod = total / 7.0
+    tol = mod * 0.5 + 0.5
+    if abs(mod - module) > module * 0.5 + 0.5:
+        return False
+    return (abs(runs[0] - mod) <= tol and abs(runs[1] - mod) <= tol and abs(runs[2] - mod * 3.0) <= tol * 2.0
+            and abs(runs[3] - mod) <= tol and abs(runs[4] - mod) <= tol)
+
+
+def _zxing_position_hints(gray: np.ndarray) -> list:
+    # 復号できなかったものも含め、zxing が見つけた位置の四隅を返す
+    try:
+        barcodes = zxingcpp.read_barcodes(gray, return_errors=True)
+    except TypeError:
+        barcodes = zxingcpp.read_barcodes(gray)
+    quads = []
+    for bc in barcodes:
+        pos = getattr(bc, "position", None)
+        if pos is None:
+            continue
+        quad = np.array([
+            (pos.top_left.x, pos.top_left.y),
+            (pos.top_right.x, pos.top_right.y),
+            (pos.bottom_right.x, pos.bottom_right.y),
+            (pos.bottom_left.x, pos.bottom_left.y),
+        ], dtype=np.float32)
+        if np.ptp(quad, axis=0).min() >= 2.0:
+            quads.append(quad)
+    return quads
+
+
+def _merge_rects(rects: list) -> list:
+    rects = [fitz.Rect(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        out: list = []
+        for r in rects:
+            for k, o in enumerate(out):
+                if o.intersects(r):
+                    out[k] = o | r
+                    merged = True
+                    break
+            else:
+                out.append(r)
+        rects = out
+    return rects
+
+
+def _finder_regions(finders: list) -> list:
+    # 近いファインダ同士をまとめ、1つのQRを覆う矩形にする（画素座標）
+    n = len(finders)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(n):
+        for j in range(i + 1, n):
+            xi, yi, mi = finders[i]
+            xj, yj, mj = finders[j]
+            # 同じQRのファインダ同士は中心間で最大 QR_MAX_MODULES - 7 モジュール離れる
+            if max(abs(xi - xj), abs(yi - yj)) <= (QR_MAX_MODULES - 7) * max(mi, mj):
+                parent[find(i)] = find(j)
+
+    clusters: dict[int, list] = {}
+    for i in range(n):
+        clusters.setdefault(find(i), []).append(finders[i])
+    rects = []
+    for members in clusters.values():
+        mod = max(m for _, _, m in members)
+        xs = [x for x, _, _ in members]
+        ys = [y for _, y, _ in members]
+        # 3つ揃っていればその外接矩形＋余白、欠けていればどちら向きにも最大のQRが収まるだけ広げる
+        grow = mod * (4.0 if len(members) >= 3 else QR_MAX_MODULES - 3.0)
+        rects.append(fitz.Rect(min(xs) - grow, min(ys) - grow, max(xs) + grow, max(ys) + grow))
+    return rects
+
+
+def find_candidate_regions(page: fitz.Page, coarse_zoom: float = 1.0) -> list:
+    # 戻り値: ページ座標の候補矩形
+    pix, gray = render_page_gray(page, coarse_zoom)
+    with trace.span("coarse", pixels=pix.width * pix.height) as sp:
+        rects = _finder_regions(find_finder_patterns(gray))
+        for quad in _zxing_position_hints(gray):
+            r = fitz.Rect(quad.min(axis=0).tolist() + quad.max(axis=0).tolist())
+            pad = max(r.width, r.height) * 0.15 + 4.0
+            rects.append(fitz.Rect(r.x0 - pad, r.y0 - pad, r.x1 + pad, r.y1 + pad))
+        sp.set(regions=len(rects))
+    origin = fitz.Point(pix.x, pix.y)
+    page_rects = []
+    for r in _merge_rects(rects):
+        pr = fitz.Rect(r.x0 + origin.x, r.y0 + origin.y, r.x1 + origin.x, r.y1 + origin.y) / coarse_zoom
+        pr &= page.rect
+        if not pr.is_empty:
+            page_rects.append(pr)
+    return page_rects
+
+
+def detect_regions(page: fitz.Page, zoom: float, regions: list) -> tuple[list, int]:
+    # 各領域を高倍率で描画して復号し、点をページ全体の画素座標（zoom 倍）へ戻す
+    # 戻り値: (検出結果, 何も読めなかった領域の数)
+    results = []
+    misses = 0
+    for clip in regions:
+        pix, gray = render_page_gray(page, zoom, clip=clip)
+        offset = np.array([pix.x, pix.y], dtype=np.float32)
+        dets = detect_and_decode_qr_gray(gray)
+        if not dets:
+            misses += 1
+        for det in dets:
+            det["points"] = det["points"] + offset
+            results.append(det)
+    return _merge_detections(results), misses
+
+
+def detect_page_coarse_to_fine(page: fitz.Page, zoom: float, coarse_zoom: float = 1.0,
+                               stats: dict | None = None) -> list:
+    # stats を渡すと、候補領域が読めずページ全体を描画し直した回数を coarse_fallbacks に加算する
+    regions = find_candidate_regions(page, coarse_zoom)
+    if not regions:
+        return []
+    dets, misses = detect_regions(page, zoom, regions)
+    if not misses:
+        return dets
+    # 候補の位置がずれている・領域が小さすぎるなど。QRらしきものを見つけたページでは取りこぼさない
+    if stats is not None:
+        stats["coarse_fallbacks"] = stats.get("coarse_fallbacks", 0) + 1
+    return detect_page(page, zoom, True)
@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+# GUI 非依存のコア処理（検出・注釈出力・ページ指定の解釈）
+# tkinter / ttkbootstrap / tkinterdnd2 はここから import しないこと
+# PIL / OpenCV は従来の RGB 経路でしか使わないため、使う時点で読み込む（OpenCV は任意）
+import io
+import json
+import os
+import numpy as np
+import fitz  # PyMuPDF
+import zxingcpp
+
+from . import trace
+
+# 注釈の subject（再注釈時に自分の書いた注釈を見分ける）
+SUBJECT_DECODE = "QR decode"
+SUBJECT_LABEL = "QR label"
+SUBJECT_BOX = "QR box"
+SUMMARY_TITLE = "QR Decode Summary"
+# 処理済みの状態（サマリーページの位置・ページ内容のハッシュ）を置くカタログのキー
+_STATE_KEY = "PdfQrLinkState"
+
+
+# ====== QR検出ロジック ======
+def _qr_results(barcodes) -> list:
+    results = []
+    for bc in barcodes:
+        if bc.format != zxingcpp.BarcodeFormat.QRCode:
+            continue
+        pos = getattr(bc, "position", None)
+        if pos is None:
+            continue
+        pts = np.array([
+            (float(pos.top_left.x), float(pos.top_left.y)),
+            (float(pos.top_right.x), float(pos.top_right.y)),
+            (float(pos.bottom_right.x), float(pos.bottom_right.y)),
+            (float(pos.bottom_left.x), float(pos.bottom_left.y)),
+        ], dtype=np.float32)
+        results.append({"text": getattr(bc, "text", ""), "points": pts})
+    return results
+
+
+def _rgb_to_bgr(img_rgb: np.ndarray) -> np.ndarray:
+    try:
+        import cv2
+    except ImportError:
+        return np.ascontiguousarray(img_rgb[:, :, ::-1])
+    return np.ascontiguousarray(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR))
+
+
+def detect_and_decode_qr_zxing(pil_img) -> list:
+    # pil_img: PIL.Image.Image
+    with trace.span("convert") as sp:
+        img_rgb = np.array(pil_img.convert("RGB"))
+        img_bgr = _rgb_to_bgr(img_rgb)
+        sp.set(pixels=img_bgr.shape[0] * img_bgr.shape[1], bytes=img_rgb.nbytes + img_bgr.nbytes)
+    with trace.span("decode", pixels=img_bgr.shape[0] * img_bgr.shape[1]):
+        return _qr_results(zxingcpp.read_barcodes(img_bgr))
+
+
+def detect_and_decode_qr_gray(gray: np.ndarray) -> list:
+    # 8bit グレースケール (h, w) をそのまま zxing に渡す（PIL/OpenCV を経由しない）
+    with trace.span("decode", pixels=gray.shape[0] * gray.shape[1]):
+        return _qr_results(zxingcpp.read_barcodes(gray))
+
+
+def _pixmap_gray_view(pix: fitz.Pixmap) -> np.ndarray:
+    # pix のサンプルをコピーせずに (h, w) の uint8 ビューとして包む
+    if pix.n != 1 or pix.alpha:
+        raise ValueError("グレースケール(アルファなし)の Pixmap ではありません。")
+    buf = getattr(pix, "samples_mv", None)
+    if buf is None:
+        buf = pix.samples  # 旧版はコピーになる
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    return arr.reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def render_page_gray(page: fitz.Page, zoom: float, clip: fitz.Rect | None = None):
+    # 戻り値の配列は pix のバッファを参照するため、使用中は pix も保持すること
+    mat = fitz.Matrix(zoom, zoom)
+    with trace.span("render", page=page.number) as sp:
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+        sp.set(pixels=pix.width * pix.height, bytes=pix.stride * pix.height)
+    return pix, _pixmap_gray_view(pix)
+
+
+def _detect_page_rgb(page: fitz.Page, zoom: float) -> list:
+    from PIL import Image
+
+    mat = fitz.Matrix(zoom, zoom)
+    with trace.span("render", page=page.number) as sp:
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csRGB)
+        sp.set(pixels=pix.width * pix.height, bytes=pix.stride * pix.height)
+    with trace.span("convert", page=page.number) as sp:
+        pil_img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        sp.set(bytes=pix.stride * pix.height * 2)  # samples のコピー + PIL 画像
+    return detect_and_decode_qr_zxing(pil_img)
+
+
+def detect_page(page: fitz.Page, zoom: float, fast: bool = True) -> list:
+    # fast=True: csGRAY で描画し、ゼロコピーで zxing へ渡す
+    # fast=False / 高速経路が使えない場合: 従来の RGB -> PIL -> OpenCV 経路
+    if fast:
+        try:
+            pix, gray = render_page_gray(page, zoom)
+        except (ValueError, AttributeError):
+            pass
+        else:
+            return detect_and_decode_qr_gray(gray)
+    return _detect_page_rgb(page, zoom)
+
+
+# ====== ユーティリティ ======
+def _square_rect_from_points(pts: np.ndarray, zoom: float, margin: float = 4.0) -> fitz.Rect:
+    xs = [x / zoom for x, _ in pts]
+    ys = [y / zoom for _, y in pts]
+    base = fitz.Rect(min(xs), min(ys), max(xs), max(ys))
+    w, h = base.width, base.height
+    size = max(w, h)
+    cx, cy = base.x0 + w / 2.0, base.y0 + h / 2.0
+    sq = fitz.Rect(cx - size / 2.0, cy - size / 2.0, cx + size / 2.0, cy + size / 2.0)
+    return fitz.Rect(sq.x0 - margin, sq.y0 - margin, sq.x1 + margin, sq.y1 + margin)
+
+
+def _merge_detections(dets: list) -> list:
+    # 重なった描画領域で二重に拾った同一QRを1件にまとめる（同じ文字列かつ中心が近いもの）
+    merged: list = []
+    for det in dets:
+        pts = det["points"]
+        center = pts.mean(axis=0)
+        size = float(np.ptp(pts, axis=0).max())
+        dup = False
+        for kept in merged:
+            if kept["text"] != det["text"]:
+                continue
+            kpts = kept["points"]
+            if np.linalg.norm(kpts.mean(axis=0) - center) <= max(size, float(np.ptp(kpts, axis=0).max())) / 2.0:
+                dup = True
+                break
+        if not dup:
+            merged.append(det)
+    return merged
+
+
+def _safe_add_text_annot(page, point, contents, icon="Comment"):
+    try:
+        return page.add_text_annot(point, contents, icon=icon)  # 新
+    except AttributeError:
+        return page.addTextAnnot(point, contents, icon=icon)    # 旧
+
+
+def _safe_add_freetext_annot(page, rect, text, **kwargs):
+    try:
+        return page.add_freetext_annot(rect, text, **kwargs)    # 新
+    except AttributeError:
+        return page.addFreetextAnnot(rect, text, **kwargs)      # 旧
+
+
+def _safe_insert_link(page, rect, uri):
+    payload = {"kind": fitz.LINK_URI, "from": rect, "uri": uri}
+    try:
+        return page.insert_link(payload)  # 新
+    except AttributeError:
+        return page.insertLink(payload)   # 旧
+
+
+def _rect_valid(r: fitz.Rect) -> bool:
+    return (r is not None) and (r.width > 1.0) and (r.height > 1.0)
+
+
+def _text_width(text: str, fontname: str, fontsize: float) -> float:
+    try:
+        return fitz.get_text_length(text, fontname=fontname, fontsize=fontsize)  # 新
+    except Exception:
+        try:
+            return fitz.getTextlength(text, fontname=fontname, fontsize=fontsize)  # 旧
+        except Exception:
+            return len(text) * fontsize * 0.6  # 概算
+
+
+class _GlyphWidths:
+    # 1文字ごとの送り幅をキャッシュし、行幅を O(文字数) で求める
+    # （base14 フォントの get_text_length はカーニングなしの単純和なので結果は一致する）
+    def __init__(self, fontname: str, fontsize: float):
+        self.fontname = fontname
+        self.fontsize = fontsize
+        self._w: dict[str, float] = {}
+
+    def char(self, ch: str) -> float:
+        w = self._w.get(ch)
+        if w is None:
+            w = _text_width(ch, self.fontname, self.fontsize)
+            self._w[ch] = w
+        return w
+
+    def text(self, text: str) -> float:
+        return sum(self.char(ch) for ch in text)
+
+
+def _wrap_to_width(text: str, max_width: float, widths: _GlyphWidths) -> list[str]:
+    # 文字単位の折り返し（入らない1文字はそのまま1行にする）
+    if not text:
+        return [""]
+    lines: list[str] = []
+    start = 0
+    used = 0.0
+    for i, ch in enumerate(text):
+        if ch == "\n":
+            lines.append(text[start:i])
+            start, used = i + 1, 0.0
+            continue
+        w = widths.char(ch)
+        if used + w <= max_width:
+            used += w
+        elif i == start:
+            lines.append(ch)
+            start, used = i + 1, 0.0
+        else:
+            lines.append(text[start:i])
+            start, used = i, w
+    if start < len(text):
+        lines.append(text[start:])
+    return lines
+
+
+class _PageTextBatch:
+    # 1ページ分の見出し・罫線・本文行（等間隔）を1つの Shape にため、ページごとに1回だけ commit する
+    def __init__(self, fontname: str, fontsize: float, line_gap: float):
+        self.fontname = fontname
+        self.fontsize = fontsize
+        self.line_gap = line_gap
+        self.shape = None
+        self._origin = None
+        self._lines: list[str] = []
+
+    def start(self, page: fitz.Page):
+        self.shape = page.new_shape()
+        self._origin = None
+        self._lines = []
+
+    def add(self, point: fitz.Point, text: str):
+        if self._origin is None:
+            self._origin = point
+        self._lines.append(text)
+
+    def flush(self):
+        if self.shape is None:
+            return
+        if self._lines:
+            self.shape.insert_text(
+                self._origin, self._lines, fontsize=self.fontsize, fontname=self.fontname,
+                color=(0, 0, 0), lineheight=self.line_gap / self.fontsize,
+            )
+        self.shape.commit()
+        self.shape = None
+        self._lines = []
+
+
+def _append_summary_pages(
+    doc: fitz.Document,
+    entries: list[tuple[int, str]],
+    title: str = SUMMARY_TITLE,
+    fontname: str = "helv",
+):
+    # ページサイズは先頭ページを踏襲、なければA4相当
+    if len(doc) > 0:
+        page_rect = doc[0].rect
+    else:
+        page_rect = fitz.Rect(0, 0, 595, 842)  # 約A4
+
+    margin = 36  # 0.5 inch
+    col_left = page_rect.x0 + margin
+    col_right = page_rect.x1 - margin
+    top = page_rect.y0 + margin
+    bottom = page_rect.y1 - margin
+    title_fs = 16
+    body_fs = 11
+    line_gap = body_fs * 1.35
+    widths = _GlyphWidths(fontname, body_fs)
+    body = _PageTextBatch(fontname, body_fs, line_gap)
+
+    def new_page():
+        # ページ追加で既存の Page 参照は無効になるため、先に書き込む
+        body.flush()
+        p = doc.new_page(width=page_rect.width, height=page_rect.height)
+        body.start(p)
+        return p
+
+    def write_title(p: fitz.Page):
+        shape = body.shape
+        shape.insert_text(fitz.Point(col_left, top), title, fontsize=title_fs, fontname=fontname, color=(0, 0, 0))
+        shape.draw_line(
+            fitz.Point(col_left, top + title_fs * 0.6),
+            fitz.Point(col_right, top + title_fs * 0.6),
+        )
+        shape.finish(color=(0, 0, 0), width=0.7)
+        return top + title_fs * 1.6
+
+    page = new_page()
+    y = write_title(page)
+
+    info_line = f"Total: {len(entries)}"
+    body.add(fitz.Point(col_left, y), info_line)
+    y += line_gap
+
+    max_width = col_right - col_left
+    for idx, txt in entries:
+        prefix = f"#{idx}: "
+        first_line_budget = max_width - widths.text(prefix)
+        wrapped = []
+        for i, seg in enumerate(txt.split("\n")):
+            seg_lines = _wrap_to_width(seg, max_width if i else max(first_line_budget, 24), widths)
+            if i == 0 and seg_lines:
+                head = seg_lines[0]
+                seg_lines[0] = prefix + head
+            wrapped.extend(seg_lines)
+        if not wrapped:
+            wrapped = [prefix]
+
+        for line in wrapped:
+            if y + line_gap > bottom:
+                page = new_page()
+                y = write_title(page)
+            body.add(fitz.Point(col_left, y), line)
+            y += line_gap
+    body.flush()
+
+
+def _is_encrypted(doc) -> bool:
+    val = getattr(doc, "is_encrypted", None)
+    if val is None:
+        val = getattr(doc, "isEncrypted", None)
+    needs = getattr(doc, "needs_pass", None)
+    if needs is None:
+        needs = getattr(doc, "needsPass", False)
+    try:
+        return bool(val) or bool(needs)
+    except Exception:
+        return False
+
+
+# ====== 注釈付きPDFを書き出す ======
+class EncryptedPdfError(RuntimeError):
+    pass
+
+
+def open_pdf(path: str) -> fitz.Document:
+    # 暗号化チェック・検出・注釈付けを1つのドキュメントで済ませるための入口
+    doc = fitz.open(path)
+    if _is_encrypted(doc):
+        doc.close()
+        raise EncryptedPdfError("暗号化されているPDFは対象外です。")
+    return doc
+
+
+def read_annotation_state(doc: fitz.Document) -> dict | None:
+    # annotate_document が書いた状態。無い・壊れている場合は None
+    try:
+        kind, val = doc.xref_get_key(doc.pdf_catalog(), _STATE_KEY)
+    except Exception:
+        return None
+    if kind != "string":
+        return None
+    try:
+        state = json.loads(val)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) and state.get("v") == 1 else None
+
+
+def write_annotation_state(doc: fitz.Document, summary_start: int, page_qr_counts: dict[str, int],
+                           overlay: bool = False):
+    # page_qr_counts: {ページ内容のハッシュ: そのページのQR件数}
+    # overlay=True: 枠・番号をページ内容へ描き込んだ出力（注釈として取り除けないため再注釈の対象外）
+    state = {"v": 1, "summary": [summary_start, len(doc) - summary_start], "pages": page_qr_counts}
+    if overlay:
+        state["overlay"] = True
+    doc.xref_set_key(doc.pdf_catalog(), _STATE_KEY, fitz.get_pdf_str(json.dumps(state, separators=(",", ":"))))
+
+
+def annotate_document(doc: fitz.Document, detections_map, zoom_map, overlay: bool = False):
+    # doc をその場で書き換える（保存は save_document）
+    # 再注釈（reannotate.py）で変更のないページを見分けられるよう、ページ内容のハッシュも記録する
+    # overlay=True: 枠・番号をページごとに1回の描画でページ内容へ描き込み、リンクだけを注釈として残す
+    #   （QRが数百あるページで注釈の作成・保存が重くなるのを避ける。コメント注釈は付けない）
+    from .cache import PageFingerprinter
+
+    global_idx = 1
+    summary_entries: list[tuple[int, str]] = []
+    fingerprints = PageFingerprinter(doc, decoded=True)
+    page_qr_counts: dict[str, int] = {}
+
+    # detections_map: {pidx: [dict]} または DetectionStore（ページを読み出すたびに dict を作る）
+    for pidx in sorted(detections_map.keys()):
+        dets = detections_map.get(pidx, [])
+        with trace.span("annotate", page=pidx, qr=len(dets)):
+            page = doc.load_page(pidx)
+            page_qr_counts[fingerprints.page(page)] = len(dets)
+            draw = _overlay_page if overlay else _annotate_page
+            global_idx = draw(page, dets, zoom_map.get(pidx, 3.0), global_idx, summary_entries)
+
+    summary_start = len(doc)
+    with trace.span("summary", entries=len(summary_entries)):
+        _append_summary_pages(doc, summary_entries, title=SUMMARY_TITLE)
+    write_annotation_state(doc, summary_start, page_qr_counts, overlay=overlay)
+
+
+def _label_geometry(rect: fitz.Rect, global_idx: int) -> tuple[str, float, fitz.Rect]:
+    # 番号ラベル: (文字列, フォントサイズ, 枠の左下に置く矩形)
+    unit = max(12.0, min(rect.width, rect.height) / 4.0)
+    label_text = f"#{global_idx}"
+    fontsize = max(8.0, min(13.0, unit * 0.55))
+    pad = max(2.0, fontsize * 0.35)
+    text_w = _text_width(label_text, fontname="helv", fontsize=fontsize)
+    label_w = max(unit, text_w + pad * 2.0)
+    label_h = max(unit, fontsize * 1.35)
+    return label_text, fontsize, fitz.Rect(rect.x0, rect.y1 - label_h, rect.x0 + label_w, rect.y1)
+
+
+def _link_rects(rect: fitz.Rect, label_rect: fitz.Rect, txt: str) -> list[fitz.Rect]:
+    # URL のときだけ、番号ラベルを避けた2つの矩形にリンクを張る
+    is_url = txt.lower().startswith("http://") or txt.lower().startswith("https://")
+    if not is_url:
+        return []
+    link_top = fitz.Rect(rect.x0, rect.y0, rect.x1, label_rect.y0)
+    link_right = fitz.Rect(label_rect.x1, label_rect.y0, rect.x1, rect.y1)
+    return [lr for lr in (link_top, link_right) if _rect_valid(lr)]
+
+
+def _insert_links(page: fitz.Page, rect: fitz.Rect, label_rect: fitz.Rect, txt: str):
+    for lr in _link_rects(rect, label_rect, txt):
+        _safe_insert_link(page, lr, txt)
+
+
+def _append_uri_links(page: fitz.Page, links: list[tuple[fitz.Rect, str]]):
+    # リンク注釈のオブジェクトを直接作り、ページの /Annots へまとめて追加する
+    # （insert_link は1件ごとに既存のリンクを走査して名前を付けるため、件数の2乗で遅くなる）
+    # links: [(未回転のページ座標の矩形, URL)]
+    if not links:
+        return
+    doc = page.parent
+    to_pdf = ~page.transformation_matrix
+    refs = []
+    for lr, uri in links:
+        r = lr * to_pdf
+        xref = doc.get_new_xref()
+        doc.update_object(xref, f"<</Type/Annot/Subtype/Link/Rect[{r.x0:g} {r.y0:g} {r.x1:g} {r.y1:g}]"
+                                f"/BS<</W 0>>/A<</S/URI/URI{fitz.get_pdf_str(uri)}>>>>")
+        refs.append(f"{xref} 0 R")
+    kind, val = doc.xref_get_key(page.xref, "Annots")
+    if kind == "xref":
+        val = doc.xref_object(int(val.split()[0]), compressed=True)
+        kind = "array"
+    existing = val.strip()[1:-1].strip() if kind == "array" else ""
+    doc.xref_set_key(page.xref, "Annots", "[" + " ".join(([existing] if existing else []) + refs) + "]")
+
+
+def _overlay_page(page: fitz.Page, dets: list, zoom: float, global_idx: int,
+                  summary_entries: list[tuple[int, str]]) -> int:
+    # 塗り・枠・ラベル地をそれぞれまとめて描き、ラベル文字とともに1回の commit でページ内容へ追加する
+    if not dets:
+        return global_idx
+    # 回転したページでは、描画とリンクの座標を未回転の座標へ戻す
+    derot = page.derotation_matrix if page.rotation else None
+
+    def _r(r: fitz.Rect) -> fitz.Rect:
+        return r * derot if derot is not None else r
+
+    items, links = [], []
+    for det in dets:
+        txt = (det.get("text") or "").strip()
+        rect = _square_rect_from_points(det["points"], zoom, margin=4.0)
+        label_text, fontsize, label_rect = _label_geometry(rect, global_idx)
+        items.append((rect, label_text, fontsize, label_rect))
+        links.extend((_r(lr), txt) for lr in _link_rects(rect, label_rect, txt))
+        summary_entries.append((global_idx, txt if txt else ""))
+        global_idx += 1
+
+    shape = page.new_shape()
+    for rect, *_ in items:
+        shape.draw_rect(_r(rect))
+    shape.finish(color=None, fill=(0, 1, 1), fill_opacity=0.30, width=0)
+    for rect, *_ in items:
+        shape.draw_rect(_r(rect))
+    shape.finish(color=(1, 0, 0), fill=None, width=1.5)
+    for _, _, _, label_rect in items:
+        shape.draw_rect(_r(label_rect))
+    shape.finish(color=(1, 0, 0), fill=(1, 1, 1), width=0.8, fill_opacity=0.90, stroke_opacity=0.90)
+    for _, label_text, fontsize, label_rect in items:
+        pad = max(2.0, fontsize * 0.35)
+        origin = fitz.Point(label_rect.x0 + pad, label_rect.y1 - (label_rect.height - fontsize * 0.75) / 2.0)
+        shape.insert_text(origin * derot if derot is not None else origin, label_text,
+                          fontsize=fontsize, fontname="helv", color=(1, 0, 0), rotate=page.rotation)
+    shape.commit(overlay=True)
+    _append_uri_links(page, links)
+    return global_idx
+
+
+def _annotate_page(page: fitz.Page, dets: list, zoom: float, global_idx: int,
+                   summary_entries: list[tuple[int, str]]) -> int:
+    # 1ページ分の注釈を付け、次の通し番号を返す
+    for det in dets:
+        pts = det["points"]
+        txt = (det.get("text") or "").strip()
+
+        rect = _square_rect_from_points(pts, zoom, margin=4.0)
+        fill_annot = page.add_rect_annot(rect)
+        fill_annot.set_border(width=0)
+        fill_annot.set_colors(stroke=None, fill=(0, 1, 1))
+        fill_annot.set_opacity(0.30)
+        fill_annot.set_info({"subject": SUBJECT_BOX})
+        fill_annot.update()
+        border_annot = page.add_rect_annot(rect)
+        border_annot.set_border(width=1.5)
+        border_annot.set_colors(stroke=(1, 0, 0), fill=None)
+        border_annot.set_opacity(1.0)
+        border_annot.set_info({"subject": SUBJECT_BOX})
+        border_annot.update()
+
+        ICON_EST = 20.0
+        GAP = 6.0
+        offset = ICON_EST + GAP
+        bubble_pt = fitz.Point(rect.x0 - offset, rect.y0 - offset)
+        pagebox = page.bound()
+        bx = min(max(bubble_pt.x, pagebox.x0 + 2), pagebox.x1 - 2)
+        by = min(max(bubble_pt.y, pagebox.y0 + 2), pagebox.y1 - 2)
+        bubble_pt = fitz.Point(bx, by)
+        contents_str = f"[#{global_idx}] {txt}"
+        text_annot = _safe_add_text_annot(page, bubble_pt, contents_str, icon="Comment")
+        try:
+            text_annot.set_info({"content": contents_str, "title": f"QR #{global_idx}", "subject": SUBJECT_DECODE})
+        except Exception:
+            pass
+        text_annot.set_colors(stroke=(1, 0, 0), fill=None)
+        text_annot.update()
+
+        label_text, fontsize, label_rect = _label_geometry(rect, global_idx)
+        try:
+            ft = _safe_add_freetext_annot(
+                page, label_rect, label_text,
+                fontsize=fontsize, fontname="helv",
+                text_color=(1, 0, 0), fill_color=(1, 1, 1),
+                align=fitz.TEXT_ALIGN_LEFT, rotate=0,
+            )
+        except TypeError:
+            ft = _safe_add_freetext_annot(page, label_rect, label_text, fontsize=fontsize, text_color=(1, 0, 0))
+        try:
+            ft.set_border(width=0.8)
+            if hasattr(ft, "set_opacity"):
+                ft.set_opacity(0.90)
+            ft.set_info({"title": f"QR #{global_idx}", "subject": SUBJECT_LABEL})
+            ft.update()
+        except Exception:
+            pass
+
+        _insert_links(page, rect, label_rect, txt)
+
+        summary_entries.append((global_idx, txt if txt else ""))
+        global_idx += 1
+    return global_idx
+
+
+def save_document(doc: fitz.Document, out_path: str, incremental: bool = False):
+    # incremental=True は doc が out_path から開かれている場合のみ（追記保存）
+    with trace.span("save", incremental=incremental) as sp:
+        if incremental:
+            doc.saveIncr()
+        else:
+            doc.save(out_path, deflate=True)
+        sp.set(bytes=os.path.getsize(out_path))
+
+
+def export_annotated_pdf(source, detections_map, zoom_map, out_path: str | None = None, overlay: bool = False):
+    # source: PDF のバイト列 / パス / 開いている fitz.Document（最後のものは閉じない）
+    # out_path を渡すとファイルへ直接保存してパスを返す。省略時は従来どおりバイト列を返す
+    if isinstance(source, fitz.Document):
+        doc, own = source, False
+    elif isinstance(source, (bytes, bytearray)):
+        doc, own = fitz.open(stream=source, filetype="pdf"), True
+    else:
+        doc, own = fitz.open(source), True
+    try:
+        if _is_encrypted(doc):
+            raise EncryptedPdfError("暗号化されているPDFは対象外です。")
+        annotate_document(doc, detections_map, zoom_map, overlay=overlay)
+        if out_path is not None:
+            save_document(doc, out_path)
+            return out_path
+        with trace.span("save") as sp:
+            out = io.BytesIO()
+            doc.save(out, deflate=True)
+            sp.set(bytes=out.tell())
+        return out.getvalue()
+    finally:
+        if own:
+            doc.close()
+
+
+def parse_pages(sel: str, total: int) -> list[int]:
+    if not sel or sel.strip().lower() == "all":
+        return list(range(total))
+    pages = set()
+    for token in sel.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        if "-" in token:
+            a, b = token.split("-", 1)
+            a = int(a)
+            b = int(b)
+            pages.update(range(a - 1, b))
+        else:
+            pages.add(int(token) - 1)
+    return sorted(p for p in pages if 0 <= p < total)
+
@@ -0,0 +1,826 @@
+# -*- coding: utf-8 -*-
+# GUI 本体（tkinter / ttkbootstrap / tkinterdnd2 を読み込むのはこのモジュールだけ）
+# 起動は app.py から。ワーカープロセスはこのモジュールを import しない
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import tkinter as tk
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from tkinter import filedialog, messagebox
+from tkinter import font as tkfont
+
+# ttk は ttkbootstrap 版を使う
+import ttkbootstrap as tb
+from ttkbootstrap import ttk as ttkb
+from ttkbootstrap.constants import PRIMARY, INFO, SUCCESS, DANGER, SECONDARY, INVERSE
+# ドラッグ＆ドロップ
+from tkinterdnd2 import DND_FILES, TkinterDnD
+
+from . import trace
+from .batch import init_stop_event, output_path_for, process_file, stop_requested
+from .cache import default_cache_path
+from .checkpoint import CheckpointJournal
+from .core import (
+    EncryptedPdfError,
+    annotate_document,
+    open_pdf,
+    parse_pages,
+    save_document,
+)
+from .parallel import Cancelled, detect_document
+from .tiles import DEFAULT_MAX_TILE_PIXELS
+
+# 48x48 PNG (Base64埋め込み)
+APP_ICON_PNG48_B64 = """
+iVBORw0KGgoAAAANSUhEUgAAADAAAAAwCAYAAABXAvmHAAARFElEQVR4nMWZeZBdVZ3HP+ece+9bu/v13p2lk5BOQvYEwmZYwmA0oELFESZYajklQ6TEmQwoA6iMOjjj4FIzOm6Do1ZGVETUcVAYBxDBJRAJBBIC2Um6k7xeXvfrt9z9nPnjdmchgQCBml/Vq1fvvnvO+X1/53e+v+UIwPAminiTF5CvZ5B4yW8lBFK89Gkib6p1OAUDKSmxlcILo2OmsJRCSYkApJDYloUfhnhh8MZo/BKxXusAJSWdTc20NjQSGyhXy3x85mx+NzTIb8ujTGpsYqxeww18bMuiJd+EMYaa79FfGsQLwzcUwKt2oQkHyTppOgvNKKmQQrB25iz+ZuFiruydTSHfiJISg8EYQ6w1sY4RQpBLpWnNN9CQzvz/AJhwkopX5/m+F9k9VOTPCk18avEZfO25Ldz49CZySmIQCCGT98cHCSGIdExsNA2ZDI2Z7BsG4DW7EIAbhrhhyP17drG8tZ279u8liCMkAgNYSh7eCSEEQgiUVAgExhgmtbRRO9hPrONTBvC6WUgA+4OA6zdv4oWxMXKWhRYgBFRqLnXPx1KS0Uod1w8StjDJlighac7lx+c6MXu9qQAYt3RrLk9bOo2tJGEc43khQ6N13nvZ+bz13AXsHx7mmj8/n7eeO4/+wVG+cMPVrP/ctYRRRC6dHp/r1Ij2dbnQxKJp28EIgR9ETJ/WzievuZxv/OCXvH1ZJ7NmvoWzF87gputW8+ILu2hJjbGgJ8eS5ctY+eBT3PvQJqQUaH1qAE4pUM6Z1EPKUezsO8CtH7qcT/zdeylue4HmxkacdAZyaXTFRUqgMUulb5BcRyvfv/u33PzVnzJUKxFGp3YOXqcLJWKMplxx8aKQFWfMJh5z6Zw6jd88tZty1SeueUhLUa76fPnrPydt2Uit6SjkUPKUlj4sr9OFksMaxZpb/vJSOtryTG1rRinFN9f/kp888ifOWTCT29etIQ5CPvvvP2XfoRFEpPnb694NOonYUkjg1HbgNQGQ8ghjaG2YMaWVte+7BNwAqj4MjrF4SifXfvlGdh04hKl5CK352JpVdLcW2Pb8Pqj4CJ3EBnOU90opEAhirV8TgFe9jxMHTmuDQCCloFiqcGjvIAgJsYGqy3lLTkeGIbNmTkY6Ch1quie1YdyAuTOmYoKYSsUljCOMSeKElBKtk8j9Wl3rVb+ttWHJ7B4WzplGrDVaGwZKZT742fW899Zv8ezuA5C2CcsVjBBE1QC3WMcf9QnLHiJlE/kBIp1i674B/DAkjGKMMWit6e3pZPniWW/8DiRRVLJ0zjS+++lreOa/7uA//+HDTJnURTaTYk9fkR8+/Edu+NqPCHWEcixE2sYv1Xnsoz/jtx++l/rBMUjbWHmHTRs384MHfs9oZZSUY9PV0c4X113Nll98kXvuuJ6LzpiDbSnEy6Tnx+nHK9BoMocgm3bY8pN/ZnpnHr9cIdXezmD6dA5VYaC/j/7+Pp5+9jnetXgqF81vA7+ObG6m+Mc+wnrMlBXT0LUKrt3A9x56gchu4LRZ05k6bQadhSzd7haikWEEMbGTZ87qm9h7cBgpBNq8Msu/4iE2BqSEuhfw1LY9TJ+3gpSJIJWmfdYi2rFh6ZkAfACoVqsE1UOkqv3ovqfpXJwCHaJrZZh1MSLbzUfOe//xC+3ej+WPQUMrW5/cTrFUSQ75SZQ/KYAJEMYY1n3pLuphTOj7PLt/lEvfk+bC85fjZPMgLbSBfD4P+V6gF5NpJXzmV2ClUItXITt6mchBDSDQaK/Oi3v38tB9j+MN7KKzo5XP3fnzJHcS4lVHWHOyj1TquGe5hiazdt3HzdPP7zCjA/3GhDVjjDFGa2N0bI6TiWeRZyrDh8yO3bvNvb/ZYFa+e42x84Vj15PSSHn8mif6vOIZkFKhj0p5p89fyuIVlzH7zOW09PRiZQtIK0ObCpnueCzstmlubcOYxMJHW0gIiVer8Hxfmb1BniGdxcUBNFF9iOLOzTzzyP1sfvQBDuzcdpQOEv0KzHRiABPcHMdIpVi26j1cvGYtMxYtw8k1EIagDDj4OAxjGMat72Z5YTqzZy4+zO+HAYz/Hi72c/fWbxE50GA3o6wubGcO2p5FZDUQAW55hBc2/Ibf/fS7PP3wfQkIpdDxiSP2cQCOPjzzz38b77nhdqYvPIsoiqjXXBzp0GS/SOA+SqmygdHKDrygRM0v8YFFX+fsRVdgjEaIIww9AWCo2McXHr6cIe8AlrSxLUnWydOcn0V3y9twsiupmtOwMwpLarZueJSf/evfs33joyDEMTXFhFjHKi8xRmM5DlfddAeXvO8jCKBeLhEZm858TFj7Dtt2rWekfoAoltgqS9bJkUl3oLXBaI0x+pgIY7RJONkYCtluVMZBGguEwY98+ka2srv4BF1NdzF32rUE7mpGAsPsZedz0/oHeeDOO7j3X26DcUMcDcI6onySm6Rzea7/6j0sfesqxoZGEx5WKbrSNYaLt7Cl79dI2UAhOzVRFIMXBoxWKyjHRkiJeEl8FCr5zje1UQ1jhuoDZJwcSlqkbZvmbAciJyjVhvjDtk+y9LTnaG26haGxGhnbsHrdJ+iYNptv3nA1RutjQFgTPi+ERErBtV/6AYsvXsVIcRjLshFA3rEYK32RzfsfoCXfQ8ZyGKlVqHoeUmpAYZRh2+ZHyAxnybQ04qQyCCGJ4wi3UmZ0uMjg7j247ihhWwZTlxjp4yoXKQUZJ0Nbvp160Mifdn2fs3sVLY23Meb5jBaHecsVVxKFHnfe9MEEgNbJjgBmgm0u/+vPcOWNt1EuDqMcB4zGkKHN3sgTz30Ix25GIBmujiKFwfUlUspxXjc4P69jj0rsfBql7KQbEUeYOCTwfEwQozqyuFdIyGoyGnxfIKRBSY3RgsZsE1JK6n6Rc+Z+lZJeiaJOGEYUOlu5+/Of4r5v3H6YIaWQEq1jJvXO47JrPkZleAxl2xht0MbgWDajY38kjJIFiuUSYEinJOkUNGRiHDvGMRrbpBCOA1oTeC6eWyeu+RhfkM7lSBcaMSVN4SlNV3+O8rBCC3B9QdW1CCLBmDuCkgpLZjg09EvyTkLIyrIpD5W54vpPMGPhskT5pDeV+OtFf/FXZPNZgjAkNqCkGOfzCCXqpOw0Fb+MFApjJJW6wAug6kEQSUIEQhkapEIbgwZkJKjOk0S9IGqa2A9paM/x9oHZPPT5MR6/p4qSYElDYxZsSyKlRbk+gm2lUKKOwMMSEscS6DjGSaW57NqbJ+gBqeMIqRSnn70C3w1I2RaWTJKohDgEKbsBL6qjpERK8ENQwmArgzYCx4JsRvCCK3hyn2F6voOsnUK3GqKzFPoSgXuBYDT2WXPBCiY3tLAlKhONaoQ2IMFS42VFnNQbY/URmht68SKbSY0Wc9vT2JZFdazC3PMuoaW7B611Qhf5Qistnd3oOAIhiMc7BVJAbCQxLYRhMN7D0TgqIps2ZFJgSbAtQ2U0ZuuuOvcfPEixanPNpW+nukijbIUVC+KFEK62GZ5SATcmi42dUwRGEQSCUsXgeoZYWwS+RyrfQEexh8CLGKxHKCHIpRRhFJJuLDBt/tJER4BMvhHlZAjCJNodcR9BEAc49hIa8q14gY/WDl6oGCpD1ZUEoaDqCcJIYgtBa2OGR7fvx83GZOamEEGMF0FUE5BW3BU8xo+bd4BtM+MsRUtB05wXZBxB2oIorqE6C6ysXUxuY0Cct/B8zbNFl3qYWNy2oLNn5hEAfr2G77kImVg/jJNqVRuBsGKicgcrxDtRLQWq7igpGZGxNLaElgZozkChU9I80yIuw64xj3/b9zCgwSRul01r8imF8Wz2njnGyk820rUww/Cgxgt9fOFhN1vMnb6Edx66lK5vH+Dg7DlIKYm1wY8SvYRI0od0vulIHBgrDVItDdA1Yw5uvY5UYvyIgIoiRgoFpv+qiyvbzmLj0hEOuDuoVkt4dY/QtYhChVKSeasUOnIotNm4k0PsQGJk4o6erxBEpFWAF0WoJkEqm0aqJrKmndn2VKb2N9D6ZEDTU5v49dJz8Bcuo9F3iSyVlJ5mIjEkcXfAkspCxxHb//QYU05fiKjXsMa7D8YkIxwl2HTJZcz6pydY80wLuxZdQl/3GMPNdQ5GJaLUGLGoQVfIhTfmqNRD4jEfaSyEcMCEBLKOcQp05TuZRIFmt8CUahPtQxn0HpfOIUO4byfDUY2Hl1/Gkxe9i+VEzGpLM+Zrtg/75ByJEQKtYXD/7iQGS6WMjmPmnnsxN61/kGq5jFRJ719JiDToOMakMxx8fifn3P0devdux7UUTZMnMZAz5LqaqLYIyo5HJpWhntLs7xzguegZysUyzZ2NnKnO5rTdLYQv1uis2fgDVcJSmUIccag6SGtHFztnnM7/zDyLvZPnsHJmgTOnNpK2BLtKAYO1ECWT+jyKIj71zkWMHNqfRGIhJEIKPv69/+X0cy7Eq1QwUiIQWBI68zY61uyrG/6w7SCTdm5mwa5NzB/oxyv20W1nkUgGooiWfAGEYDTvUH13B7+YtIG3FBfQ+yOXfKVK0S3Tkc3g6oDAsTEdPTzZNoUt05fS19lDY9pmRU+OJTNawRgqgWbHsI8AwjAk39LC4/99N99YtwYp1bGpxMwl53LzDx/Dq1WTfF4IcrZkXkfSSa4HMc8PuPxuX4WRqkdmpMSk0X5m1YboHh1ADO5nstZkQp9SaZAuq5Fg7VLkAzsZ3Laf5imT6TeCoG0K/c2d7O2czmBnD5VUllmtaea3OPR25smmHap+RCXQFKsRfmTQOsayHdxalc9ddR5DfXuOpNhwpPp6x9pbWHPrP1I6NIxt22igO28zpclOfA6oehF7BqscqISUIkGxGlCueqSjgGzgkQ08nMhDBT6pWBAqg2s7+Kk8bjqLl8kRS4WJIpwooCmlWLVkMo3ZFCP1CDfU+HGSyiDAxDGOk0LaDl+5bjXPPHIfQiqMjo8uaARSJVXY+2/7Cqs+9FHGSuWkY4akLatoy1pkbUnGkiiVoI9ijetHPLhtkN1DblJVRQYtkhzGsiTGALEmDEKU1uQcScZRNGZTtBWyNDekiY0gjJJU2VYCKUBiMDom01ggqFf5j1uu4Yn772GCeCYMeqQ6GL8OMlpz+XW3snrdZ8BArTKGRqCUImVJHJmM1ImBiA2EOgETx5ogjAjCmJGqx95iOTlLlmRaRxPplEUubZN2LNKOleRNOrkUjMZLX2E0UaxpaMhhp1Ns3/h71n/6evZte/oY5Y8HMP5IyATE3HMv5uqbv8CU+Weio4jIrxOG8fgdk0Qe3fo4fKEHUghsS1KuBWzcfpAgjFFScMGCKeQzDv54S3HiqsoYQxhrjDFIZZHJ5bBtxcHd27n/21/i0R/fOf7f8bXxy3YlJl62bIdz3nEVF1y1lmnzzyCbzxJFhjj0MVFIFCVNWoNAj2exCZBk6g3bDuIGEULA4tPaacmn8SONJZPLQKkUQjkoJ4WUUBur8uKzj7PxV3ez4b4f4dUq43wvkyLmJXKStsqxLY2euUtYcOEqes9YTteMORQ6JpHJ5ZAyaYBFsQGtEWjMeKd5444iwxUXISTzetqY1t1ErMFWEEYGr1Zl5FAf/dufZcem3/PcHx6if8fW4wz5cnLyK6ajWixHSyqbo6Onl64Zs2mbPJ32qTNobOumqbWdVDaL5aRJ2Ta7D46w68AwJoroyAmaRI3Bg/2UDuzl0N6dDO3fw1D/HkLfO2pJcdjiJ2svvqY7MiHl4c7FibbziAISy04KfK01cRSNv//yS0mpQIiTzn1KAI5VUowHOznRMQGjx28dTzzlhGVBjI8x4/mWeVWN3BPJ/wFBUHaOyNjkwgAAAABJRU5ErkJggg=="""
+
+
+# ワーカーからのログ・進捗は溜めておき、この間隔でまとめて画面へ反映する
+UI_FLUSH_MS = 100
+# ログ欄に残す行数の上限（大量のファイルを流しても Text が重くならないように）
+LOG_MAX_LINES = 5000
+
+
+# ====== GUI アプリ（DnD + 自動開始） ======
+class QRPdfAnnotatorApp(TkinterDnD.Tk):
+    def __init__(self):
+        super().__init__()
+
+        # 参照保持（GC対策）
+        self._icon_img48 = tk.PhotoImage(data=APP_ICON_PNG48_B64)
+        # 以後に作られる Toplevel にも同じアイコンを適用
+        self.iconphoto(True, self._icon_img48)
+
+        # ---- 基本設定
+        self.title("PDF内QRコードに注釈追加")
+        self.geometry("700x830")
+
+        # ---- ttkbootstrap テーマ
+        self.style = tb.Style(theme="minty")
+
+        # ---- フォントを Noto Sans 系に統一（自動フォールバック）
+        family = self._choose_font_family()
+        self._apply_global_fonts(family)
+        # Canvas用フォント（名前付きで保持）
+        self._font_ui = tkfont.Font(family=family, size=11)
+        self._font_small = tkfont.Font(family=family, size=9)
+
+        # ---- 入力状態
+        self.pdf_path = tk.StringVar()
+        self.out_dir = tk.StringVar()                  # 出力フォルダ（指定すると保存ダイアログなしで書き出す）
+        self.zoom = tk.DoubleVar(value=3.0)
+        self.page_sel = tk.StringVar(value="all")
+        self.workers = tk.IntVar(value=min(4, os.cpu_count() or 1))
+        self.file_jobs = tk.IntVar(value=1)            # キューで同時に処理するファイル数
+        self.auto_run_on_drop = tk.BooleanVar(value=True)  # ドロップで自動開始（既定ON）
+        self.coarse_mode = tk.BooleanVar(value=False)  # 粗→密の2段階検出
+        self.image_mode = tk.BooleanVar(value=False)   # 埋め込み画像を直接復号
+        self.use_cache = tk.BooleanVar(value=True)     # 検出キャッシュ
+        self.trace_mode = tk.BooleanVar(value=False)   # 段階ごとの処理時間を計測
+        self.full_scan = tk.BooleanVar(value=False)    # 事前判定をせず全ページを描画
+        self.resumable = tk.BooleanVar(value=True)     # ページごとのチェックポイント（中断後の再開）
+        self.reuse_positions = tk.BooleanVar(value=False)  # 前のページのQR位置だけを先に読む
+        self.auto_zoom = tk.BooleanVar(value=False)    # ページごとに倍率を見積もる
+        self.vector_mode = tk.BooleanVar(value=False)  # ベクターのQRを塗り図形から直接読む
+
+        # ワーカー系
+        self._worker: threading.Thread | None = None
+        self._stop_flag = False
+        self._session = None                      # start_process で開いたドキュメント
+        self.annotated_path: str | None = None     # 注釈付きPDFの一時ファイル
+        self._tracer = None                         # 直近の計測結果（trace.Tracer）
+
+        # 複数ファイルのキュー（出力フォルダへ順に書き出す）
+        self._queue: deque[str] = deque()
+        self._queue_lock = threading.Lock()
+        self._queue_total = 0                       # 今回の実行で登録されたファイル数
+        self._queue_run = False                     # 実行中のワーカーがキュー処理か
+        self._queue_outputs: set[str] = set()       # 今回の実行で使った出力パス（同名ファイルの上書き防止）
+
+        # ワーカーから溜めた UI 更新（_flush_ui でまとめて反映）
+        self._ui_lock = threading.Lock()
+        self._log_buf: list[str] = []
+        self._pending_progress: float | None = None
+        self._pending_status: str | None = None
+
+        # 単色パレット（ドロップエリア用）
+        self._pal = {"bg": "#FFFFFF", "border": "#D0D5DD", "text": "#111827", "muted": "#6B7280", "accent": "#2D7FF9"}
+
+        # UI構築
+        self._build_ui()
+        self._bind_shortcuts()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after(UI_FLUSH_MS, self._flush_ui)
+
+    # ===== フォント適用 =====
+    def _choose_font_family(self) -> str:
+        # 優先順位で選択（存在しなければ次へ）
+        preferred = ["Noto Sans JP", "Noto Sans", "Yu Gothic UI", "Segoe UI", "Arial"]
+        available = set(tkfont.families())
+        for f in preferred:
+            if f in available:
+                return f
+        return "TkDefaultFont"
+
+    def _apply_global_fonts(self, family: str):
+        # Tk 名前付きフォントを書き換えると既存/今後のウィジェットに反映
+        for name, size, weight in [
+            ("TkDefaultFont", 11, "normal"),
+            ("TkTextFont", 11, "normal"),
+            ("TkFixedFont", 11, "normal"),
+            ("TkHeadingFont", 13, "bold"),
+            ("TkMenuFont", 11, "normal"),
+            ("TkTooltipFont", 10, "normal"),
+        ]:
+            try:
+                f = tkfont.nametofont(name)
+                f.configure(family=family, size=size, weight=weight)
+            except Exception:
+                pass
+
+    # ===== UI =====
+    def _build_ui(self):
+        pad = {"padx": 10, "pady": 6}
+
+        # ===== 入力カード =====
+        card_in = ttkb.Labelframe(self, text="入力", bootstyle=SECONDARY)
+        card_in.pack(fill="x", **pad)
+
+        # PDF選択
+        row = 0
+        ttkb.Label(card_in, text="PDFファイル").grid(row=row, column=0, sticky="e", padx=8, pady=8)
+        self.ent_pdf = ttkb.Entry(card_in, textvariable=self.pdf_path, width=60)
+        self.ent_pdf.grid(row=row, column=1, sticky="we", padx=8, pady=8)
+        ttkb.Button(card_in, text="参照…", command=self.select_pdf, bootstyle=PRIMARY).grid(
+            row=row, column=2, sticky="w", padx=8, pady=8
+        )
+        card_in.columnconfigure(1, weight=1)
+
+        # Entryにドロップ対応
+        self.ent_pdf.drop_target_register(DND_FILES)
+        self.ent_pdf.dnd_bind("<<Drop>>", self._on_drop)
+
+        # 出力フォルダ（複数ファイルのキューでは必須）
+        row += 1
+        ttkb.Label(card_in, text="出力フォルダ").grid(row=row, column=0, sticky="e", padx=8, pady=4)
+        ttkb.Entry(card_in, textvariable=self.out_dir, width=60).grid(row=row, column=1, sticky="we", padx=8, pady=4)
+        ttkb.Button(card_in, text="参照…", command=self.select_out_dir, bootstyle=PRIMARY).grid(
+            row=row, column=2, sticky="w", padx=8, pady=4
+        )
+
+        # レンダリング倍率
+        row += 1
+        ttkb.Label(card_in, text="レンダリング倍率").grid(row=row, column=0, sticky="e", padx=8, pady=4)
+        zfrm = ttkb.Frame(card_in)
+        zfrm.grid(row=row, column=1, sticky="we", padx=8, pady=4)
+        self.zoom_label = ttkb.Label(zfrm, text=f"{self.zoom.get():.2f}x", bootstyle=SECONDARY)
+        self.zoom_label.pack(side="right")
+        self.zoom_scale = ttkb.Scale(
+            zfrm, from_=2.0, to=5.0, orient="horizontal",
+            command=self._on_zoom_change, value=self.zoom.get()
+        )
+        self.zoom_scale.pack(fill="x", side="left", expand=True, padx=(0, 8))
+        ttkb.Label(card_in, text="").grid(row=row, column=2, sticky="w")
+
+        # 並列ワーカー数
+        row += 1
+        ttkb.Label(card_in, text="並列ワーカー数").grid(row=row, column=0, sticky="e", padx=8, pady=4)
+        ttkb.Spinbox(card_in, from_=1, to=os.cpu_count() or 1, textvariable=self.workers, width=6).grid(
+            row=row, column=1, sticky="w", padx=8, pady=4
+        )
+        ttkb.Label(card_in, text="1 = 逐次処理", bootstyle=SECONDARY).grid(
+            row=row, column=2, sticky="w", padx=8, pady=4
+        )
+
+        # 同時処理ファイル数（キュー）
+        row += 1
+        ttkb.Label(card_in, text="同時処理ファイル数").grid(row=row, column=0, sticky="e", padx=8, pady=4)
+        ttkb.Spinbox(card_in, from_=1, to=os.cpu_count() or 1, textvariable=self.file_jobs, width=6).grid(
+            row=row, column=1, sticky="w", padx=8, pady=4
+        )
+        ttkb.Label(card_in, text="複数ファイルのとき（2以上はファイルごとに別プロセス）", bootstyle=SECONDARY).grid(
+            row=row, column=2, sticky="w", padx=8, pady=4
+        )
+
+        # 解析ページ範囲
+        row += 1
+        ttkb.Label(card_in, text="解析ページ範囲").grid(row=row, column=0, sticky="e", padx=8, pady=4)
+        ttkb.Entry(card_in, textvariable=self.page_sel).grid(row=row, column=1, sticky="we", padx=8, pady=4)
+        ttkb.Label(card_in, text="例: all / 1-3,5,10-12", bootstyle=SECONDARY).grid(
+            row=row, column=2, sticky="w", padx=8, pady=4
+        )
+
+        # 自動開始トグル
+        row += 1
+        ttkb.Checkbutton(card_in, text="ドロップで自動解析する", variable=self.auto_run_on_drop).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="粗→密の2段階検出（低倍率で候補を探して絞り込む）", variable=self.coarse_mode).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="埋め込み画像から直接読み取る（見つからないページのみ描画）", variable=self.image_mode).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="ベクターのQRを図形から直接読み取る（読めないページのみ描画）", variable=self.vector_mode).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="検出キャッシュを使う（同じページの再解析を省略）", variable=self.use_cache).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="全ページを描画する（画像・図形の無いページも省略しない）", variable=self.full_scan).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="同じ位置のQRを使い回す（前のページのQR位置だけを先に読む）", variable=self.reuse_positions).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="倍率をページごとに自動で決める（倍率の指定は見積もれないページに使う）", variable=self.auto_zoom).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="中断したら続きから再開する（ページごとに検出結果を記録）", variable=self.resumable).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 4)
+        )
+        row += 1
+        ttkb.Checkbutton(card_in, text="処理時間の内訳を計測する（描画・復号・注釈・保存）", variable=self.trace_mode).grid(
+            row=row, column=1, sticky="w", padx=8, pady=(0, 8)
+        )
+
+        # ===== ドロップエリア（Canvas演出） =====
+        drop_card = ttkb.Labelframe(self, text="ドラッグ＆ドロップ", bootstyle=SECONDARY)
+        drop_card.pack(fill="x", **pad)
+
+        self.drop_canvas = tk.Canvas(drop_card, height=120, bd=0, highlightthickness=0, cursor="hand2")
+        self.drop_canvas.pack(fill="x", padx=10, pady=10)
+
+        # DnD登録
+        self.drop_canvas.drop_target_register(DND_FILES)
+        self.drop_canvas.dnd_bind("<<Drop>>", self._on_drop)
+        self.drop_canvas.dnd_bind("<<DragEnter>>", self._on_drag_enter)
+        self.drop_canvas.dnd_bind("<<DragLeave>>", self._on_drag_leave)
+
+        # ウィンドウ全体も受け付け（任意）
+        self.drop_target_register(DND_FILES)
+        self.dnd_bind("<<Drop>>", self._on_drop)
+        self.dnd_bind("<<DragEnter>>", self._on_drag_enter)
+        self.dnd_bind("<<DragLeave>>", self._on_drag_leave)
+
+        self._draw_drop_area(hover=False)
+        self.drop_canvas.bind("<Configure>", lambda e: self._draw_drop_area(hover=False))
+
+        # ===== 実行ボタン群（角丸が映える配色）=====
+        btnfrm = ttkb.Frame(self)
+        btnfrm.pack(fill="x", **pad)
+        self.btn_run  = ttkb.Button(btnfrm, text="解析開始 ▶️", bootstyle=PRIMARY,  command=self.start_process)
+        self.btn_stop = ttkb.Button(btnfrm, text="停止 ⏹",     bootstyle=DANGER,   command=self.stop_process, state="disabled")
+        self.btn_save = ttkb.Button(btnfrm, text="保存… 💾",    bootstyle=SUCCESS,  command=self.save_output, state="disabled")
+        self.btn_trace = ttkb.Button(btnfrm, text="計測結果… ⏱", bootstyle=SECONDARY, command=self.save_trace, state="disabled")
+        self.btn_run.pack(side="left")
+        self.btn_stop.pack(side="left", padx=6)
+        self.btn_save.pack(side="left", padx=6)
+        self.btn_trace.pack(side="right")
+
+        # ===== 進捗・ログ =====
+        pfrm = ttkb.Labelframe(self, text="進捗", bootstyle=SECONDARY)
+        pfrm.pack(fill="x", **pad)
+        self.progress = ttkb.Progressbar(pfrm, maximum=100, mode="determinate", bootstyle=f"{INFO}-striped")
+        self.progress.pack(fill="x", padx=10, pady=10)
+        self.progress_text = ttkb.Label(pfrm, text="0%", bootstyle=SECONDARY)
+        self.progress_text.place(in_=self.progress, relx=0.5, rely=0.5, anchor="center")
+
+        self.status = ttkb.Label(self, text="待機中", bootstyle=SECONDARY)
+        self.status.pack(anchor="w", padx=12)
+
+        log_card = ttkb.Labelframe(self, text="ログ", bootstyle=SECONDARY)
+        log_card.pack(fill="both", expand=True, **pad)
+        self.log = tk.Text(log_card, height=12, relief="flat", wrap="word")
+        self.log.pack(fill="both", expand=True, padx=10, pady=10)
+
+    # ===== ドロップエリア描画 =====
+    def _draw_drop_area(self, hover: bool):
+        p = self._pal
+        c = self.drop_canvas
+        c.delete("all")
+        bg = p["bg"]
+        fg = p["accent"] if hover else p["border"]
+        c.configure(bg=bg)
+        w = c.winfo_width() or c.winfo_reqwidth()
+        h = c.winfo_height() or c.winfo_reqheight()
+        pad = 10
+        c.create_rectangle(pad, pad, w - pad, h - pad, dash=(6, 4), outline=fg, width=2, fill=bg)
+        c.create_text(w / 2, h / 2 - 8, text="ここに PDF をドラッグ＆ドロップ（複数可） ⤵️",
+                      fill=p["text"], font=self._font_ui)
+        c.create_text(w / 2, h / 2 + 16, text="または「参照…」をクリック",
+                      fill=p["muted"], font=self._font_small)
+
+    def _on_drag_enter(self, event):
+        self._draw_drop_area(hover=True)
+
+    def _on_drag_leave(self, event):
+        self._draw_drop_area(hover=False)
+
+    # ===== イベント =====
+    def _on_drop(self, event):
+        try:
+            paths = self.tk.splitlist(event.data)
+            if not paths:
+                return
+            pdfs = [p.strip("{}") for p in paths if p.strip("{}").lower().endswith(".pdf")]
+            if not pdfs:
+                messagebox.showwarning("注意", "PDFファイルをドロップしてください。")
+                return
+            # 複数ファイル、または出力フォルダの指定があればキューへ
+            if len(pdfs) > 1 or self.out_dir.get().strip():
+                self.enqueue(pdfs)
+                return
+            picked = pdfs[0]
+            self.pdf_path.set(picked)
+            self.log_write(f"ドロップ: {picked}\n")
+            if self._worker and self._worker.is_alive():
+                self.log_write("現在解析中のため、自動開始はスキップしました。\n")
+                return
+            if self.auto_run_on_drop.get():
+                self.after(150, self.start_process)
+        except Exception as e:
+            messagebox.showerror("エラー", f"ドロップ処理に失敗しました: {e}")
+
+    def _on_zoom_change(self, val):
+        try:
+            v = float(val)
+        except ValueError:
+            v = 3.0
+        self.zoom.set(v)
+        self.zoom_label.config(text=f"{v:.2f}x")
+
+    def select_pdf(self):
+        paths = filedialog.askopenfilenames(
+            title="PDFを選択",
+            filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")]
+        )
+        if len(paths) > 1:
+            self.enqueue(list(paths))
+        elif paths:
+            self.pdf_path.set(paths[0])
+
+    def select_out_dir(self):
+        path = filedialog.askdirectory(title="出力フォルダを選択")
+        if path:
+            self.out_dir.set(path)
+
+    # ===== キュー =====
+    def enqueue(self, paths: list[str]):
+        if not self.out_dir.get().strip():
+            self.select_out_dir()
+            if not self.out_dir.get().strip():
+                self.log_write("出力フォルダが未指定のため、キューへの追加を取り消しました。\n")
+                return
+        with self._queue_lock:
+            self._queue.extend(paths)
+            self._queue_total += len(paths)
+            waiting = len(self._queue)
+        self.log_write(f"キューに追加: {len(paths)}件（待ち {waiting}件）\n")
+        if self._worker and self._worker.is_alive():
+            # キュー処理中ならそのまま拾われる。単一ファイルの解析中なら終了後に始める
+            if not self._queue_run:
+                self.log_write("現在の解析が終わってからキューを処理します。\n")
+            return
+        if self.auto_run_on_drop.get():
+            self.after(150, self.start_queue)
+
+    def _next_queued(self) -> str | None:
+        with self._queue_lock:
+            return self._queue.popleft() if self._queue else None
+
+    def _output_for(self, path: str, out_dir: str) -> str:
+        # 別フォルダの同名ファイルが同じ出力を上書きしないよう、番号を付けて分ける
+        out = output_path_for(os.path.basename(path), out_dir)
+        stem, n = out[:-len(".pdf")], 2
+        while out in self._queue_outputs:
+            out = f"{stem}_{n}.pdf"
+            n += 1
+        self._queue_outputs.add(out)
+        return out
+
+    # ===== 実行系 =====
+    def start_process(self):
+        if self._worker and self._worker.is_alive():
+            return
+        if self._queue:
+            self.start_queue()
+            return
+        path = self.pdf_path.get().strip()
+        if not path or not os.path.exists(path):
+            messagebox.showerror("エラー", "PDFファイルを選択してください。")
+            return
+
+        # ここで開いたドキュメントを暗号化チェック・検出・注釈付けまで使い回す
+        try:
+            session = open_pdf(path)
+        except EncryptedPdfError:
+            self.log_write("暗号化されているPDFは対象外のためスキップします。\n")
+            messagebox.showinfo("対象外", "暗号化されているPDFは解析対象外です。")
+            return
+        except Exception as e:
+            messagebox.showerror("エラー", f"PDFを開けませんでした: {e}")
+            return
+        self._session = session
+        self._discard_output()
+
+        self._stop_flag = False
+        self.btn_run.config(state="disabled")
+        self.btn_stop.config(state="normal")
+        self.btn_save.config(state="disabled")
+        self.btn_trace.config(state="disabled")
+        self._tracer = None
+        self.progress.config(value=0)
+        try:
+            self.progress_text.config(text="0%")
+        except Exception:
+            pass
+        self.status.config(text="解析準備中…")
+        self.log_delete()
+        self.log_write(f"入力PDF: {path}\n")
+
+        self._worker = threading.Thread(target=self._process_worker, daemon=True)
+        self._worker.start()
+        self.after(200, self._poll_worker)
+
+    def start_queue(self):
+        if (self._worker and self._worker.is_alive()) or not self._queue:
+            return
+        self._discard_output()
+        self._stop_flag = False
+        self._queue_run = True
+        self._queue_outputs.clear()
+        self.btn_run.config(state="disabled")
+        self.btn_stop.config(state="normal")
+        self.btn_save.config(state="disabled")
+        self.btn_trace.config(state="disabled")
+        self._tracer = None
+        self.progress.config(value=0)
+        try:
+            self.progress_text.config(text="0%")
+        except Exception:
+            pass
+        self.status.config(text="キュー処理中…")
+        self.log_write(f"出力フォルダ: {self.out_dir.get().strip()}\n")
+
+        self._worker = threading.Thread(target=self._queue_worker, daemon=True)
+        self._worker.start()
+        self.after(200, self._poll_worker)
+
+    def stop_process(self):
+        self._stop_flag = True
+        self.log_write("停止要求を受け付けました…\n")
+
+    def _poll_worker(self):
+        if self._worker and self._worker.is_alive():
+            self.after(200, self._poll_worker)
+        else:
+            # ワーカーが最後に溜めた表示を先に反映する（下の状態表示を上書きしないように）
+            self._apply_ui()
+            self.btn_run.config(state="normal")
+            self.btn_stop.config(state="disabled")
+            if self._tracer is not None:
+                self.btn_trace.config(state="normal")
+            if self._queue_run:
+                # 結果は出力フォルダへ書き出し済み（状態表示はワーカーが設定）
+                self._queue_run = False
+            elif self.annotated_path:
+                self.btn_save.config(state="normal")
+                self.status.config(text="完了")
+                self.after(150, self.save_output)
+            else:
+                self.status.config(text="中断/失敗")
+            # 解析中にドロップされたファイルを続けて処理する
+            if self._queue and not self._stop_flag:
+                self.after(150, self.start_queue)
+
+    def _scan_opts(self) -> dict:
+        return {
+            "coarse_zoom": 1.0 if self.coarse_mode.get() else None,
+            "images": bool(self.image_mode.get()),
+            "cache": default_cache_path() if self.use_cache.get() else None,
+            "prefilter": not self.full_scan.get(),
+            "max_tile_pixels": DEFAULT_MAX_TILE_PIXELS,
+            "templates": bool(self.reuse_positions.get()),
+            "auto_zoom": bool(self.auto_zoom.get()),
+            "vector": bool(self.vector_mode.get()),
+        }
+
+    def _process_worker(self):
+        doc_in, self._session = self._session, None
+        tracer = trace.enable(fresh=True) if self.trace_mode.get() else None
+        journal = None
+        try:
+            pdf_path = self.pdf_path.get()
+            zoom = float(self.zoom.get())
+            page_sel = self.page_sel.get().strip()
+            workers = max(1, int(self.workers.get()))
+            # 逐次処理では描画と復号を別スレッドで重ねる（描画1本＋復号スレッド）
+            decode_threads = min(3, max(1, (os.cpu_count() or 1) - 1))
+            scan_opts = self._scan_opts()
+            images, cache = scan_opts["images"], scan_opts["cache"]
+            total_pages = len(doc_in)
+            target_pages = parse_pages(page_sel, total_pages)
+            if not target_pages:
+                raise RuntimeError("解析対象ページが空です。指定を見直してください。")
+            self.log_write(f"ページ数: {total_pages} / 解析対象: {', '.join(str(p+1) for p in target_pages)}\n")
+            if self.resumable.get():
+                # 停止・異常終了しても、終わったページは次回（同じPDF・同じ設定）に使い回す
+                journal = CheckpointJournal.for_document(pdf_path, zoom, scan_opts)
+                resumed = sum(1 for p in target_pages if p in journal.pages)
+                if resumed:
+                    self.log_write(f"前回の続きから再開: {resumed}ページ分の検出結果を使います。\n")
+
+            def on_page(pidx, detections, done, total, page_zoom):
+                self.log_write(f"Page {pidx+1}: QR {len(detections)}件\n")
+                self._set_progress(done / total * 100.0)
+                self._set_status(f"解析中… ({done}/{total})")
+
+            stats: dict = {}
+            try:
+                detections_map, zoom_map = detect_document(
+                    pdf_path, target_pages, zoom, workers=workers,
+                    on_page=on_page, should_stop=lambda: self._stop_flag, doc=doc_in,
+                    stats=stats, decode_threads=decode_threads, checkpoint=journal, **scan_opts,
+                )
+            except Cancelled:
+                self.log_write("ユーザーにより停止されました。\n")
+                if journal is not None:
+                    self.log_write(f"完了した {len(journal.pages)}ページは記録済みです。次回は続きから再開します。\n")
+                return
+            if stats["prefiltered"]:
+                self.log_write(f"事前判定で除外: {stats['prefiltered']}ページ（画像・図形・注釈なし）\n")
+            if cache:
+                self.log_write(f"キャッシュ: ヒット {stats['cache_hits']}ページ / 新規 {stats['cache_misses']}ページ\n")
+            if stats["tiled_pages"]:
+                self.log_write(f"タイル分割: {stats['tiled_pages']}ページ / {stats['tiles']}タイル\n")
+            if stats["coarse_fallbacks"]:
+                self.log_write(f"粗→密: 候補が読めずページ全体を描画し直したページ {stats['coarse_fallbacks']}\n")
+            if stats["roi_pages"] or stats["roi_fallbacks"]:
+                skipped = stats["roi_pixels_skipped"] / max(1, stats["roi_pixels_skipped"] + stats["roi_pixels"])
+                self.log_write(
+                    f"QR位置の使い回し: {stats['roi_pages']}ページ（全体に戻したページ {stats['roi_fallbacks']}）, "
+                    f"描画を省いた画素 {skipped:.0%}\n"
+                )
+            if scan_opts["vector"]:
+                self.log_write(
+                    f"図形から検出: {stats['vector_pages']}ページ / 描画に回したページ: {stats['vector_fallbacks']}ページ\n"
+                )
+            if scan_opts["auto_zoom"] and stats["raster_pages"]:
+                zooms = sorted(zoom_map.values())
+                self.log_write(
+                    f"自動倍率: {stats['auto_zoom_pages']}ページで見積もり（{zooms[0]:g}〜{zooms[-1]:g}倍）, "
+                    f"描画 {stats['raster_pixels'] // stats['raster_pages']:,}画素/ページ\n"
+                )
+            if images:
+                self.log_write(
+                    f"埋め込み画像で検出: {stats['image_pages']}ページ / 描画: {stats['raster_pages']}ページ "
+                    f"(画像復号 {stats['images_decoded']}件, 再利用 {stats['images_reused']}件)\n"
+                )
+
+            # 結果はメモリに抱えず一時ファイルへ直接保存し、「保存…」でコピーする
+            annotate_document(doc_in, detections_map, zoom_map)
+            fd, tmp_path = tempfile.mkstemp(prefix="pdfqrlink_", suffix=".pdf")
+            os.close(fd)
+            try:
+                save_document(doc_in, tmp_path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+            self.annotated_path = tmp_path
+            if journal is not None:
+                journal.discard()
+            self.log_write("注釈PDFの生成が完了しました。\n")
+        except Exception as e:
+            self.log_write("エラー: " + str(e) + "\n")
+            self.log_write(traceback.format_exc() + "\n")
+            messagebox.showerror("エラー", str(e))
+        finally:
+            if journal is not None:
+                journal.close()
+            doc_in.close()
+            if tracer is not None:
+                trace.disable()
+                self._log_trace(tracer)
+                self._tracer = tracer
+
+    def _queue_worker(self):
+        # キューが空になるまで、同時処理ファイル数ぶんずつ batch.process_file で処理する
+        # 2以上ならプロセスプール（ファイル内はページ逐次）、1ならこのスレッドで処理する
+        tracer = trace.enable(fresh=True) if self.trace_mode.get() else None
+        out_dir = self.out_dir.get().strip()
+        jobs = max(1, int(self.file_jobs.get()))
+        page_jobs = 1 if jobs > 1 else max(1, int(self.workers.get()))
+        opts = {
+            "zoom": float(self.zoom.get()), "page_sel": self.page_sel.get().strip(),
+            "page_jobs": page_jobs, "scan_opts": self._scan_opts(),
+            "decode_threads": min(3, max(1, (os.cpu_count() or 1) - 1)) if jobs == 1 else 0,
+        }
+        tally = {"done": 0, "ok": 0, "failed": 0, "qr": 0}
+        t0 = time.perf_counter()
+        # GUI のスレッドを fork しないよう spawn で起動する
+        # 停止はワーカーと共有する Event で伝え、処理中のファイルもページの区切りで打ち切らせる
+        pool = stop_event = None
+        if jobs > 1:
+            ctx = multiprocessing.get_context("spawn")
+            stop_event = ctx.Event()
+            pool = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                                       initializer=init_stop_event, initargs=(stop_event,))
+        in_flight: dict = {}
+        try:
+            while True:
+                # 空きができたら次を投入する（処理中にドロップされたファイルもここで拾う）
+                while not self._stop_flag and len(in_flight) < jobs:
+                    path = self._next_queued()
+                    if path is None:
+                        break
+                    out = self._output_for(path, out_dir)
+                    if pool is None:
+                        res = process_file(path, out, **opts, should_stop=lambda: self._stop_flag)
+                        self._queue_result(res, tally)
+                    else:
+                        fut = pool.submit(process_file, path, out, **opts, traced=tracer is not None,
+                                          should_stop=stop_requested)
+                        in_flight[fut] = path
+                if not in_flight:
+                    break
+                if self._stop_flag and not stop_event.is_set():
+                    # 未着手のファイルは取り消し、処理中のワーカーには打ち切りを伝える
+                    stop_event.set()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                done, _ = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    path = in_flight.pop(fut)
+                    if fut.cancelled():
+                        continue
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        # ワーカープロセスの異常終了など
+                        res = {"file": path, "output": None, "status": "error", "qr_count": 0,
+                               "seconds": 0.0, "error": f"{type(e).__name__}: {e}"}
+                    self._queue_result(res, tally)
+        except Exception as e:
+            self.log_write("エラー: " + str(e) + "\n")
+            self.log_write(traceback.format_exc() + "\n")
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            with self._queue_lock:
+                dropped = len(self._queue) if self._stop_flag else 0
+                if dropped:
+                    self._queue.clear()
+                self._queue_total = len(self._queue)
+            if dropped:
+                self.log_write(f"停止: 未処理の {dropped}件をキューから外しました。\n")
+            self.log_write(
+                f"キュー完了: {tally['done']}件 / 成功 {tally['ok']} / 失敗 {tally['failed']} / "
+                f"QR {tally['qr']}件 / {time.perf_counter() - t0:.1f}s\n"
+            )
+            self._set_status(f"完了（成功 {tally['ok']} / 失敗 {tally['failed']}）")
+            if tracer is not None:
+                trace.disable()
+                self._log_trace(tracer)
+                self._tracer = tracer
+
+    def _queue_result(self, res: dict, tally: dict):
+        trace.add_events(res.pop("trace", None))
+        tally["done"] += 1
+        tally["qr"] += res["qr_count"]
+        with self._queue_lock:
+            total = max(self._queue_total, tally["done"])
+        line = f"[{tally['done']}/{total}] {res['status']:7s} {os.path.basename(res['file'])}"
+        if res["status"] == "ok":
+            tally["ok"] += 1
+            line += f" → {os.path.basename(res['output'])} (QR {res['qr_count']}件, {res['seconds']:.2f}s)"
+        else:
+            if res["status"] != "cancelled":
+                tally["failed"] += 1
+            line += f" - {res['error']}"
+        self.log_write(line + "\n")
+        self._set_progress(tally["done"] / total * 100.0)
+        self._set_status(f"キュー処理中… ({tally['done']}/{total})")
+
+    def _log_trace(self, tracer):
+        lines = trace.format_summary(tracer)
+        if lines:
+            self.log_write("---- 処理時間の内訳 ----\n" + "\n".join(lines) + "\n")
+
+    def save_trace(self):
+        if self._tracer is None:
+            return
+        path = filedialog.asksaveasfilename(
+            title="計測結果を保存",
+            defaultextension=".json",
+            initialfile="pdfqrlink_trace.json",
+            filetypes=[("JSON（集計＋イベント）", "*.json"), ("Chrome trace（chrome://tracing / Perfetto）", "*.trace.json")]
+        )
+        if path:
+            fmt = "chrome" if path.lower().endswith(".trace.json") else "json"
+            try:
+                self._tracer.save(path, fmt)
+            except Exception as e:
+                messagebox.showerror("エラー", f"保存に失敗しました: {e}")
+
+    # ===== 小物 =====
+    # _set_progress / _set_status / log_write はどのスレッドからも呼べる。
+    # 1件ごとに after(0) を積まず、_flush_ui が UI_FLUSH_MS ごとにまとめて反映する（進捗・状態は最新値のみ）
+    def _set_progress(self, val):
+        with self._ui_lock:
+            self._pending_progress = val
+
+    def _set_status(self, text):
+        with self._ui_lock:
+            self._pending_status = text
+
+    def _apply_ui(self):
+        with self._ui_lock:
+            logs, self._log_buf = self._log_buf, []
+            progress, self._pending_progress = self._pending_progress, None
+            status, self._pending_status = self._pending_status, None
+        if logs:
+            self.log.insert("end", "".join(logs))
+            lines = int(self.log.index("end-1c").split(".")[0])
+            if lines > LOG_MAX_LINES:
+                self.log.delete("1.0", f"{lines - LOG_MAX_LINES + 1}.0")
+            self.log.see("end")
+        if progress is not None:
+            self.progress.config(value=progress)
+            try:
+                self.progress_text.config(text=f"{progress:.0f}%")
+            except Exception:
+                pass
+        if status is not None:
+            self.status.config(text=status)
+
+    def _flush_ui(self):
+        try:
+            self._apply_ui()
+        finally:
+            self.after(UI_FLUSH_MS, self._flush_ui)
+
+    def _discard_output(self):
+        if self.annotated_path and os.path.exists(self.annotated_path):
+            try:
+                os.remove(self.annotated_path)
+            except OSError:
+                pass
+        self.annotated_path = None
+
+    def _on_close(self):
+        self._stop_flag = True
+        with self._queue_lock:
+            self._queue.clear()
+        self._discard_output()
+        self.destroy()
+
+    def save_output(self):
+        if not self.annotated_path:
+            messagebox.showwarning("警告", "出力データがありません。先に解析してください。")
+            return
+        in_name = os.path.splitext(os.path.basename(self.pdf_path.get()))[0]
+        out_path = filedialog.asksaveasfilename(
+            title="注釈付きPDFを保存",
+            defaultextension=".pdf",
+            initialfile=f"{in_name}_annotated.pdf",
+            filetypes=[("PDF files", "*.pdf")]
+        )
+        if out_path:
+            try:
+                shutil.copyfile(self.annotated_path, out_path)
+                messagebox.showinfo("完了", "保存しました。")
+            except Exception as e:
+                messagebox.showerror("エラー", f"保存に失敗しました: {e}")
+
+    def log_write(self, text: str):
+        with self._ui_lock:
+            self._log_buf.append(text)
+
+    def log_delete(self):
+        with self._ui_lock:
+            self._log_buf.clear()
+        self.log.delete("1.0", "end")
+
+    def _bind_shortcuts(self):
+        self.bind_all("<Control-o>", lambda e: self.select_pdf())
+        self.bind_all("<Control-r>", lambda e: self.start_process())
+        self.bind_all("<Control-s>", lambda e: self.save_output())
+        self.bind_all("<Escape>",    lambda e: self.stop_process())
+
+
+def main():
+    app = QRPdfAnnotatorApp()
+    app.mainloop()
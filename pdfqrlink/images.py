@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# ページに埋め込まれた画像(XObject)を元の解像度のまま復号する（ページ全体の描画なし）
+# 同じ xref の画像は文書内で一度だけ復号し、配置行列でページ座標へ写す
+import numpy as np
+import fitz  # PyMuPDF
+
+from . import trace
+from .core import _merge_detections, _pixmap_gray_view, detect_and_decode_qr_gray
+
+# QR（最小 21 モジュール）を保持できない小さな画像は見ない
+MIN_IMAGE_SIDE = 21
+
+
+def _gray_pixmap(doc: fitz.Document, xref: int) -> fitz.Pixmap:
+    pix = fitz.Pixmap(doc, xref)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    return pix
+
+
+def decode_image_xref(doc: fitz.Document, xref: int) -> list:
+    # 戻り値: [{"text", "points"}]。points は画像内の正規化座標 (0..1)
+    with trace.span("image", xref=xref) as sp:
+        pix = _gray_pixmap(doc, xref)
+        sp.set(pixels=pix.width * pix.height, bytes=pix.stride * pix.height)
+    dets = detect_and_decode_qr_gray(_pixmap_gray_view(pix))
+    scale = np.array([pix.width, pix.height], dtype=np.float32)
+    return [{"text": d["text"], "points": d["points"] / scale} for d in dets]
+
+
+class ImageDecoder:
+    # 文書単位で xref -> 復号結果 をキャッシュする
+    def __init__(self, doc: fitz.Document):
+        self.doc = doc
+        self._cache: dict[int, list] = {}
+        self.decoded = 0
+        self.reused = 0
+
+    def _decode(self, xref: int) -> list:
+        if xref in self._cache:
+            self.reused += 1
+            return self._cache[xref]
+        try:
+            dets = decode_image_xref(self.doc, xref)
+        except Exception:
+            dets = []
+        self._cache[xref] = dets
+        self.decoded += 1
+        return dets
+
+    def detect(self, page: fitz.Page, zoom: float) -> list:
+        # 戻り値の points はページ描画時と同じ zoom 倍の画素座標
+        results = []
+        for info in page.get_image_info(xrefs=True):
+            xref = info.get("xref", 0)
+            if xref <= 0 or min(info.get("width", 0), info.get("height", 0)) < MIN_IMAGE_SIDE:
+                continue
+            dets = self._decode(xref)
+            if not dets:
+                continue
+            mat = fitz.Matrix(info["transform"]) * page.rotation_matrix * fitz.Matrix(zoom, zoom)
+            for d in dets:
+                pts = [fitz.Point(float(u), float(v)) * mat for u, v in d["points"]]
+                results.append({
+                    "text": d["text"],
+                    "points": np.array([(p.x, p.y) for p in pts], dtype=np.float32),
+                })
+        return _merge_detections(results)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# 1つのPDF内のページを複数プロセスで並列に検出する
+# 各ワーカーは自前で fitz.Document を開き、連続したページのチャンクを受け持つ
+import math
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from . import trace
+from .pipeline import Cancelled, scan_pipelined
+from .scanner import PageScanner, merge_stats
+from .store import DetectionStore
+
+
+# ワーカープロセス内で保持するスキャナ（ドキュメントを開いたまま使い回す）
+_worker_scanner: PageScanner | None = None
+
+
+def _init_worker(pdf_path: str, zoom: float, scan_opts: dict, traced: bool = False):
+    global _worker_scanner
+    if traced:
+        trace.enable()
+    _worker_scanner = PageScanner(fitz.open(pdf_path), zoom, **scan_opts)
+    # プロセス終了時にキャッシュを閉じる（容量超過分の回収を含む）
+    multiprocessing.util.Finalize(None, _worker_scanner.close, exitpriority=10)
+
+
+def _scan_chunk(pages: list[int]) -> tuple[list[tuple[int, list, float]], dict, list]:
+    # 計測が有効なら、このチャンクで記録したイベントも親へ返す
+    results = [(pidx, *_worker_scanner.scan(pidx)) for pidx in pages]
+    return results, _worker_scanner.take_stats(), trace.take_events()
+
+
+def chunk_pages(pages: list[int], workers: int, max_chunk: int = 8) -> list[list[int]]:
+    # ワーカーあたり数チャンクになる大きさで分割（進捗と停止の粒度を確保）
+    if not pages:
+        return []
+    size = max(1, min(max_chunk, math.ceil(len(pages) / (workers * 4))))
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def detect_document(pdf_path: str, pages: list[int], zoom: float, workers: int = 1,
+                    on_page=None, should_stop=None, doc: fitz.Document | None = None,
+                    stats: dict | None = None, decode_threads: int = 0, checkpoint=None, **scan_opts):
+    # 戻り値: (detections_map, zoom_map)。detections_map は DetectionStore（{pidx: [dict]} と同じく読める）
+    # どちらもページ順に並ぶ
+    # on_page(pidx, detections, done, total, page_zoom) は呼び出し元スレッドで完了順に呼ばれる
+    # （detections の座標は page_zoom 倍で描画した画像の画素座標）
+    # scan_opts は PageScanner へそのまま渡す。stats を渡すと検出方式ごとの集計を加算する
+    # decode_threads >= 1 かつ逐次処理のとき、描画と復号を別スレッドで重ねる（pipeline.py）
+    # checkpoint (checkpoint.CheckpointJournal) を渡すと、記録済みのページは検出せずに使い、
+    # 新しく終わったページを1ページずつ記録する（on_page は記録済みのページでは呼ばない）
+    store = DetectionStore()
+    total = len(pages)
+    if checkpoint is not None:
+        resumed = [pidx for pidx in pages if pidx in checkpoint.pages]
+        for pidx in resumed:
+            dets, page_zoom = checkpoint.pages[pidx]
+            store.add_page(pidx, [{"text": d["text"], "points": np.array(d["points"], dtype=np.float32)}
+                                  for d in dets], page_zoom)
+        if stats is not None:
+            merge_stats(stats, {"resumed": len(resumed)})
+        pages = [pidx for pidx in pages if pidx not in checkpoint.pages]
+
+    def _collect(pidx: int, dets: list, page_zoom: float):
+        store.add_page(pidx, dets, page_zoom)
+        if checkpoint is not None:
+            checkpoint.record(pidx, dets, page_zoom)
+        if on_page is not None:
+            on_page(pidx, dets, len(store), total, page_zoom)
+
+    chunks = chunk_pages(pages, workers)
+    workers = min(workers, len(chunks))
+    if workers <= 1:
+        own = doc is None
+        d = fitz.open(pdf_path) if own else doc
+        scanner = PageScanner(d, zoom, **scan_opts)
+        try:
+            if decode_threads >= 1:
+                scan_pipelined(scanner, pages, decoders=decode_threads,
+                               on_result=_collect, should_stop=should_stop)
+            else:
+                for pidx in pages:
+                    if should_stop is not None and should_stop():
+                        raise Cancelled()
+                    _collect(pidx, *scanner.scan(pidx))
+        finally:
+            if stats is not None:
+                merge_stats(stats, scanner.take_stats())
+            scanner.close()
+            if own:
+                d.close()
+    else:
+        # GUI のスレッドを fork しないよう spawn で起動する
+        ctx = multiprocessing.get_context("spawn")
+        ex = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(pdf_path, zoom, scan_opts, trace.active() is not None))
+        cancelled = False
+        try:
+            pending = {ex.submit(_scan_chunk, chunk) for chunk in chunks}
+            while pending:
+                if should_stop is not None and should_stop():
+                    cancelled = True
+                    raise Cancelled()
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    chunk_results, chunk_stats, chunk_events = fut.result()
+                    if stats is not None:
+                        merge_stats(stats, chunk_stats)
+                    trace.add_events(chunk_events)
+                    for pidx, dets, page_zoom in chunk_results:
+                        _collect(pidx, dets, page_zoom)
+        finally:
+            ex.shutdown(wait=not cancelled, cancel_futures=True)
+
+    return store, store.zoom_map
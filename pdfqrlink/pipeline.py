@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# 1プロセス内でページの描画（MuPDF）と復号（zxing-cpp）を重ねる
+# 呼び出しスレッドがページを順に描画して上限付きキューへ積み、復号スレッドが取り出して読む。
+# MuPDF の Document はスレッド間で共有できないため描画は1本（呼び出しスレッド）に限る。
+# zxing-cpp は復号中 GIL を解放するので、描画中のページと復号中のページが並行して進む
+# Pixmap の解放も MuPDF を呼ぶため、復号スレッドには触らせず呼び出しスレッド（scanner.finish など）で行う
+import queue
+import threading
+
+from . import trace
+from .core import detect_and_decode_qr_gray
+from .scanner import PageScanner
+
+
+class Cancelled(Exception):
+    pass
+
+
+_STOP = object()
+
+
+def _decoder_loop(jobs: queue.Queue, done: queue.Queue):
+    # job.gray（pix のバッファのビュー）だけを読む。job.pix は呼び出しスレッドが持ち続けて解放する
+    while True:
+        job = jobs.get()
+        if job is _STOP:
+            return
+        try:
+            with trace.span("decoder", page=job.pidx):
+                dets = detect_and_decode_qr_gray(job.gray)
+            done.put((job, dets, None))
+        except BaseException as e:  # 呼び出しスレッドで送出し直す
+            done.put((job, None, e))
+
+
+def scan_pipelined(scanner: PageScanner, pages: list[int], decoders: int = 1, depth: int | None = None,
+                   on_result=None, should_stop=None) -> dict[int, tuple[list, float]]:
+    # 戻り値: {pidx: (detections, zoom)}
+    # on_result(pidx, detections, zoom) はページ順に、呼び出しスレッドで呼ばれる
+    # depth: 復号待ちで保持するページ画像の上限（メモリの上限 ≒ (depth + decoders + 1) ページ分）
+    decoders = max(1, decoders)
+    depth = max(1, depth if depth is not None else decoders)
+    jobs: queue.Queue = queue.Queue(maxsize=depth)
+    done: queue.Queue = queue.Queue()
+    threads = [threading.Thread(target=_decoder_loop, args=(jobs, done), daemon=True) for _ in range(decoders)]
+    for t in threads:
+        t.start()
+
+    results: dict[int, tuple[list, float]] = {}
+    ready: dict[int, tuple[list, float]] = {}
+    state = {"in_flight": 0, "next": 0}
+
+    def _stopped() -> bool:
+        return should_stop is not None and should_stop()
+
+    def _emit():
+        # ページ順に並ぶところまで返す
+        while state["next"] < len(pages) and pages[state["next"]] in ready:
+            pidx = pages[state["next"]]
+            results[pidx] = ready.pop(pidx)
+            state["next"] += 1
+            if on_result is not None:
+                on_result(pidx, *results[pidx])
+
+    def _collect(timeout: float | None):
+        # 復号済みのページを受け取る（timeout=None なら待たない）
+        while True:
+            try:
+                job, dets, err = done.get(timeout=timeout) if timeout else done.get_nowait()
+            except queue.Empty:
+                return
+            state["in_flight"] -= 1
+            if err is not None:
+                job.pix = job.gray = None
+                raise err
+            ready[job.pidx] = scanner.finish(job, dets)
+            timeout = None
+
+    try:
+        for pidx in pages:
+            if _stopped():
+                raise Cancelled()
+            job = scanner.prepare(pidx)
+            if job.gray is None:
+                ready[pidx] = scanner.finish(job)
+            else:
+                while True:
+                    try:
+                        jobs.put(job, timeout=0.1)
+                        break
+                    except queue.Full:
+                        _collect(None)
+                        _emit()
+                        if _stopped():
+                            raise Cancelled()
+                state["in_flight"] += 1
+            _collect(None)
+            _emit()
+        while state["in_flight"]:
+            if _stopped():
+                raise Cancelled()
+            _collect(0.1)
+            _emit()
+    finally:
+        # 停止・例外時も、積み残しを捨ててから復号スレッドを終わらせる
+        while True:
+            try:
+                jobs.get_nowait().pix = None
+            except queue.Empty:
+                break
+        for _ in threads:
+            jobs.put(_STOP)
+        for t in threads:
+            t.join()
+        # 受け取らずに終わった復号済みのページも、この（描画の）スレッドで手放す
+        while True:
+            try:
+                done.get_nowait()[0].pix = None
+            except queue.Empty:
+                break
+    return results
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# 高倍率で描画する前に、QRを含み得ないページを安く除外する
+# 1) 内容の判定: QRが入る大きさの画像・塗りまたは線の図形の密集・注釈のどれも無いページは除外
+# 2) 縮小画像の判定（任意）: 1) を通ったページを低倍率で描画し、ファインダーパターンも
+#    zxing の位置ヒントも見つからなければ除外（小さいQRを見落とす可能性があるので既定では使わない）
+import fitz  # PyMuPDF
+
+from . import trace
+
+# これより小さく表示される画像・図形には読み取れる大きさのQRは入らない（約5mm）
+MIN_QR_SIDE_PT = 14.0
+# ベクターで描かれたQRとみなす、塗り図形の要素数の下限（21x21 の最小のQRでも数十以上になる）
+MIN_VECTOR_ITEMS = 40
+# モジュールになり得る図形の太さ・一辺の下限（pt）。これより細い線はQRを描けない
+MIN_MODULE_PT = 0.2
+
+
+def _has_qr_sized_images(page: fitz.Page) -> bool:
+    for info in page.get_image_info():
+        r = fitz.Rect(info["bbox"])
+        if min(r.width, r.height) >= MIN_QR_SIDE_PT and min(info.get("width", 0), info.get("height", 0)) >= 21:
+            return True
+    return False
+
+
+def _has_dense_drawings(page: fitz.Page) -> bool:
+    get = getattr(page, "get_cdrawings", None) or page.get_drawings
+    items = 0
+    for path in get():
+        # モジュールごとに別パスで描く生成系もあるので、パスの大きさでは絞らず要素数を数える
+        # モジュールの並びを太い線で描く生成系もあるので、十分な太さの線も数える
+        stroked = path.get("color") is not None and (path.get("width") or 0) >= MIN_MODULE_PT
+        if path.get("fill") is None and not stroked:
+            continue
+        items += len(path["items"])
+        if items >= MIN_VECTOR_ITEMS:
+            return True
+    return False
+
+
+def has_qr_content(page: fitz.Page) -> bool:
+    # 注釈の外観（スタンプ等）も描画されるため、注釈があれば対象に残す
+    if page.first_annot is not None:
+        return True
+    return _has_qr_sized_images(page) or _has_dense_drawings(page)
+
+
+def page_may_contain_qr(page: fitz.Page, thumb_zoom: float | None = None) -> tuple[bool, str]:
+    # 戻り値: (描画して調べる必要があるか, 理由)
+    with trace.span("prefilter", page=page.number) as sp:
+        if not has_qr_content(page):
+            sp.set(result="no_content")
+            return False, "no_content"
+        if thumb_zoom:
+            from .coarse import find_candidate_regions
+
+            if not find_candidate_regions(page, thumb_zoom):
+                sp.set(result="no_finder")
+                return False, "no_finder"
+        sp.set(result="scan")
+        return True, "scan"
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# 注釈済みPDFの再注釈（内容が変わったページだけ検出し直して追記保存する）
+# export_annotated_pdf / process_file が書いた注釈（subject で判別）とサマリーページを取り除き、
+# カタログに残した状態（ページ内容のハッシュ）と一致するページは既存の注釈をそのまま使う。
+# 状態の無い古い出力は、注釈とサマリーページの重複を取り除いたうえで全ページを検出し直す
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import fitz  # PyMuPDF
+
+from . import trace
+from .cache import PageFingerprinter
+from .core import (
+    SUBJECT_BOX, SUBJECT_DECODE, SUBJECT_LABEL, SUMMARY_TITLE, _annotate_page, _append_summary_pages,
+    EncryptedPdfError, open_pdf, read_annotation_state, write_annotation_state,
+)
+from .parallel import detect_document
+
+_OUR_SUBJECTS = (SUBJECT_DECODE, SUBJECT_LABEL, SUBJECT_BOX)
+_TITLE_NUM = re.compile(r"QR #(\d+)$")
+_CONTENT = re.compile(r"\[#\d+\] ?(.*)$", re.S)
+# _annotate_page が QR の外接正方形に足す余白 (pt)
+_BOX_MARGIN = 4.0
+
+
+def _is_summary_page(page: fitz.Page) -> bool:
+    return page.get_text("text").lstrip().startswith(SUMMARY_TITLE)
+
+
+def _summary_pages(doc: fitz.Document, state: dict | None) -> list[int]:
+    # 状態に記録した位置を確かめて使い、合わなければ末尾から見出しで探す
+    if state is not None:
+        start, count = state.get("summary", (0, 0))
+        pages = list(range(start, start + count))
+        if pages and pages[-1] < len(doc) and all(_is_summary_page(doc[p]) for p in pages):
+            return pages
+    pages = []
+    for pno in range(len(doc) - 1, -1, -1):
+        if not _is_summary_page(doc[pno]):
+            break
+        pages.append(pno)
+    return sorted(pages)
+
+
+def _annot_rect(doc: fitz.Document, annot) -> fitz.Rect:
+    # 線幅のぶん広げられた注釈の矩形から、作成時に渡した矩形を戻す（/RD の差分を引く）
+    r = fitz.Rect(annot.rect)
+    kind, val = doc.xref_get_key(annot.xref, "RD")
+    if kind == "array":
+        left, top, right, bottom = (float(v) for v in val.strip("[]").split())
+        r = fitz.Rect(r.x0 + left, r.y0 + top, r.x1 - right, r.y1 - bottom)
+    return r
+
+
+def _harvest(page: fitz.Page) -> tuple[list[int], list[tuple[int, fitz.Rect, str]]]:
+    # 戻り値: (自分の書いた注釈の xref, [(番号, 枠, 文字列)])
+    # 旧版の枠（subject なしの矩形注釈）は、番号ラベルと左下の角が一致するものを自分の注釈とみなす
+    ours: list[int] = []
+    labels: dict[int, fitz.Rect] = {}
+    texts: dict[int, str] = {}
+    squares: list = []
+    for annot in page.annots():
+        info = annot.info
+        subject = info.get("subject", "")
+        if subject in _OUR_SUBJECTS:
+            ours.append(annot.xref)
+        m = _TITLE_NUM.match(info.get("title", ""))
+        if subject == SUBJECT_LABEL and m:
+            labels[int(m.group(1))] = fitz.Rect(annot.rect)
+        elif subject == SUBJECT_DECODE and m:
+            c = _CONTENT.match(info.get("content", ""))
+            texts[int(m.group(1))] = c.group(1) if c else info.get("content", "")
+        elif annot.type[0] == fitz.PDF_ANNOT_SQUARE and subject in ("", SUBJECT_BOX):
+            squares.append((annot.xref, subject, _annot_rect(page.parent, annot)))
+
+    entries = []
+    for num, label in sorted(labels.items()):
+        box = None
+        for xref, subject, r in squares:
+            if abs(r.x0 - label.x0) < 0.5 and abs(r.y1 - label.y1) < 0.5:
+                box = r
+                if not subject:
+                    ours.append(xref)
+        if box is not None:
+            entries.append((num, box, texts.get(num, "")))
+    return ours, entries
+
+
+def _strip_page(page: fitz.Page, ours: list[int], boxes: list[fitz.Rect]):
+    # 自分の注釈と、その枠の中に張ったリンクを消す
+    for xref in ours:
+        annot = page.load_annot(xref)
+        if annot is not None:
+            page.delete_annot(annot)
+    boxes = [b + (-1, -1, 1, 1) for b in boxes]
+    for link in page.get_links():
+        if link.get("kind") == fitz.LINK_URI and any(fitz.Rect(link["from"]) in b for b in boxes):
+            page.delete_link(link)
+
+
+def _entries_to_dets(entries: list[tuple[int, fitz.Rect, str]]) -> list:
+    # 既存の枠から、zoom=1.0 の検出結果を作り直す（_annotate_page で同じ枠になる）
+    dets = []
+    for _, box, txt in entries:
+        r = fitz.Rect(box.x0 + _BOX_MARGIN, box.y0 + _BOX_MARGIN, box.x1 - _BOX_MARGIN, box.y1 - _BOX_MARGIN)
+        pts = np.array([[r.x0, r.y0], [r.x1, r.y0], [r.x1, r.y1], [r.x0, r.y1]], dtype=np.float32)
+        dets.append({"text": txt, "points": pts})
+    return dets
+
+
+def reannotate_document(doc: fitz.Document, zoom: float = 3.0, decode_threads: int = 0,
+                        stats: dict | None = None, **scan_opts) -> dict:
+    # doc をその場で書き換える。戻り値: ページ・QR件数の内訳
+    # 注釈を消したページを描画する必要があるため、検出はこのプロセス内の doc で行う
+    state = read_annotation_state(doc)
+    if state and state.get("overlay"):
+        raise ValueError("枠・番号をページ内容へ描き込んだPDF（--overlay）は更新できません。元のPDFから作り直してください。")
+    known = (state or {}).get("pages", {})
+    summary = _summary_pages(doc, state)
+    if summary:
+        doc.delete_pages(summary[0], summary[-1])
+
+    fingerprints = PageFingerprinter(doc, decoded=True)
+    plan: dict[int, tuple[str, list]] = {}
+    changed: list[int] = []
+    for pidx in range(len(doc)):
+        page = doc.load_page(pidx)
+        ours, entries = _harvest(page)
+        fp = fingerprints.page(page)
+        if fp in known and known[fp] == len(entries):
+            plan[pidx] = (fp, entries)
+            continue
+        _strip_page(page, ours, [e[1] for e in entries])
+        plan[pidx] = (fp, None)
+        changed.append(pidx)
+
+    detections_map, zoom_map = detect_document(
+        None, changed, zoom, workers=1, doc=doc, stats=stats, decode_threads=decode_threads, **scan_opts,
+    ) if changed else ({}, {})
+
+    result = {"pages_changed": len(changed), "pages_unchanged": len(plan) - len(changed),
+              "qr_reused": 0, "qr_detected": 0, "summary_pages_removed": len(summary)}
+    global_idx = 1
+    summary_entries: list[tuple[int, str]] = []
+    page_qr_counts: dict[str, int] = {}
+    for pidx, (fp, entries) in plan.items():
+        page = doc.load_page(pidx)
+        first = global_idx
+        if entries is None:
+            dets = detections_map.get(pidx, [])
+            with trace.span("annotate", page=pidx, qr=len(dets)):
+                global_idx = _annotate_page(page, dets, zoom_map.get(pidx, zoom), global_idx, summary_entries)
+            result["qr_detected"] += len(dets)
+        elif entries and entries[0][0] != global_idx:
+            # 前のページの件数が変わって番号がずれた場合だけ、同じ枠で付け直す
+            ours, _ = _harvest(page)
+            _strip_page(page, ours, [e[1] for e in entries])
+            with trace.span("annotate", page=pidx, qr=len(entries)):
+                global_idx = _annotate_page(page, _entries_to_dets(entries), 1.0, global_idx, summary_entries)
+            result["qr_reused"] += len(entries)
+        else:
+            summary_entries.extend((global_idx + i, txt) for i, (_, _, txt) in enumerate(entries))
+            global_idx += len(entries)
+            result["qr_reused"] += len(entries)
+        page_qr_counts[fp] = global_idx - first
+
+    summary_start = len(doc)
+    with trace.span("summary", entries=len(summary_entries)):
+        _append_summary_pages(doc, summary_entries, title=SUMMARY_TITLE)
+    write_annotation_state(doc, summary_start, page_qr_counts)
+    return result
+
+
+def reannotated_path_for(in_path: str) -> str:
+    return os.path.splitext(in_path)[0] + "_reannotated.pdf"
+
+
+def reannotate_file(in_path: str, out_path: str | None = None, zoom: float = 3.0,
+                    decode_threads: int = 0, scan_opts: dict | None = None, in_place: bool = False) -> dict:
+    # in_path をコピーした out_path（省略時は入力の隣の *_reannotated.pdf）へ追記保存する
+    # in_place=True のときは in_path をその場で追記保存する
+    # 追記保存できない文書（修復が必要な壊れたPDFなど）は全体を書き直す
+    t0 = time.perf_counter()
+    result = {"file": in_path, "output": None, "status": "ok", "incremental": False,
+              "seconds": 0.0, "error": None, "stats": {}}
+    if in_place:
+        out_path = None
+    elif out_path is None:
+        out_path = reannotated_path_for(in_path)
+    target = out_path or in_path
+    part = target + ".part"
+    with trace.span("file", file=in_path) as file_span:
+        try:
+            if out_path is not None and os.path.abspath(out_path) != os.path.abspath(in_path):
+                os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+                shutil.copyfile(in_path, part)
+                src = part
+            else:
+                src = in_path
+            doc = open_pdf(src)
+            try:
+                result.update(reannotate_document(doc, zoom, decode_threads=decode_threads,
+                                                  stats=result["stats"], **(scan_opts or {})))
+                result["incremental"] = bool(doc.can_save_incrementally())
+                with trace.span("save", incremental=result["incremental"]):
+                    if result["incremental"]:
+                        doc.saveIncr()
+                    else:
+                        doc.save(target + ".full", deflate=True)
+            finally:
+                doc.close()
+            if not result["incremental"]:
+                os.replace(target + ".full", target)
+            elif src != target:
+                os.replace(src, target)
+            result["output"] = target
+        except EncryptedPdfError as e:
+            result["status"] = "skipped"
+            result["error"] = str(e)
+        except Exception as e:
+            result["status"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            for leftover in (part, target + ".full"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        file_span.set(status=result["status"])
+    result["seconds"] = round(time.perf_counter() - t0, 4)
+    return result
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# 検出結果を1件1行のレコード（NDJSON / CSV）として書き出す（注釈付け・保存は行わない）
+# 座標は注釈と同じく、描画画像の画素座標を倍率で割った PDF のポイント座標
+import csv
+import json
+
+CSV_FIELDS = ["file", "page", "index", "text",
+              "x0", "y0", "x1", "y1", "x2", "y2", "x3", "y3",
+              "rect_x0", "rect_y0", "rect_x1", "rect_y1"]
+
+
+def quad_pt(points, zoom: float) -> list:
+    # 描画画像の画素座標 -> PDF のポイント座標（4隅、zxing の返す順）
+    return [[round(float(x) / zoom, 2), round(float(y) / zoom, 2)] for x, y in points]
+
+
+def page_records(file: str, pidx: int, dets: list, zoom: float) -> list[dict]:
+    # page・index は1始まり。rect は注釈の枠と同じ正方形（余白なし）
+    from .core import _square_rect_from_points
+
+    records = []
+    for i, det in enumerate(dets, 1):
+        r = _square_rect_from_points(det["points"], zoom, margin=0.0)
+        records.append({
+            "file": file,
+            "page": pidx + 1,
+            "index": i,
+            "text": det.get("text") or "",
+            "quad": quad_pt(det["points"], zoom),
+            "rect": [round(r.x0, 2), round(r.y0, 2), round(r.x1, 2), round(r.y1, 2)],
+        })
+    return records
+
+
+class NdjsonWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, records: list[dict]):
+        for rec in records:
+            self.stream.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        # ページごとに書き出し、後段がすぐ読めるようにする
+        self.stream.flush()
+
+
+class CsvWriter:
+    def __init__(self, stream, header: bool = True):
+        self.stream = stream
+        self._writer = csv.writer(stream)
+        if header:
+            self._writer.writerow(CSV_FIELDS)
+            stream.flush()
+
+    def write(self, records: list[dict]):
+        for rec in records:
+            quad = [v for pt in rec["quad"] for v in pt]
+            self._writer.writerow([rec["file"], rec["page"], rec["index"], rec["text"], *quad, *rec["rect"]])
+        self.stream.flush()
+
+
+def open_writer(stream, fmt: str):
+    return CsvWriter(stream) if fmt == "csv" else NdjsonWriter(stream)
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# 1ドキュメント分の検出設定と状態をまとめ、ページ単位の検出方式を切り替える
+# 粗→密・埋め込み画像・ベクターの各モジュールは有効にしたときだけ読み込む（ワーカーの起動を軽くする）
+import fitz  # PyMuPDF
+
+from . import trace
+from .cache import DEFAULT_MAX_BYTES, DetectionCache, PageFingerprinter
+from .core import detect_and_decode_qr_gray, detect_page, render_page_gray
+from .tiles import DEFAULT_TILE_OVERLAP, detect_page_tiled, page_pixels
+
+
+def _new_stats() -> dict:
+    return {
+        "pages": 0,
+        "image_pages": 0,
+        "raster_pages": 0,
+        "images_decoded": 0,
+        "images_reused": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "tiled_pages": 0,
+        "tiles": 0,
+        "coarse_fallbacks": 0,
+        "prefiltered": 0,
+        "roi_pages": 0,
+        "roi_fallbacks": 0,
+        "roi_pixels": 0,
+        "roi_pixels_skipped": 0,
+        "raster_pixels": 0,
+        "auto_zoom_pages": 0,
+        "vector_pages": 0,
+        "vector_fallbacks": 0,
+    }
+
+
+def merge_stats(total: dict, part: dict):
+    for k, v in part.items():
+        total[k] = total.get(k, 0) + v
+
+
+class PageJob:
+    # prepare() と finish() の間で受け渡す1ページ分の状態
+    # gray が None でなければ、呼び出し側で復号して finish() へ渡す（描画と復号を別スレッドにできる）
+    __slots__ = ("pidx", "zoom", "dets", "pix", "gray", "key", "geometry")
+
+    def __init__(self, pidx: int, zoom: float):
+        self.pidx = pidx
+        self.zoom = zoom
+        self.dets: list | None = None
+        self.pix = None
+        self.gray = None
+        self.key: str | None = None  # キャッシュへ書き込む場合のキー
+        self.geometry: tuple | None = None  # ページ全体を調べた結果からQRの位置を覚える場合のページ寸法・回転
+
+
+class PageScanner:
+    def __init__(self, doc: fitz.Document, zoom: float = 3.0, fast: bool = True,
+                 coarse_zoom: float | None = None, images: bool = False,
+                 cache: str | None = None, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_tile_pixels: int | None = None, tile_overlap: float = DEFAULT_TILE_OVERLAP,
+                 tile_workers: int = 1, prefilter: bool = False, prefilter_zoom: float | None = None,
+                 templates: bool = False, auto_zoom: bool = False, vector: bool = False):
+        self.doc = doc
+        self.zoom = zoom
+        self.fast = fast
+        self.coarse_zoom = coarse_zoom
+        self.images = None
+        if images:
+            from .images import ImageDecoder
+
+            self.images = ImageDecoder(doc)
+        # max_tile_pixels を超えるページはタイルに分けて描画する（None なら分割しない）
+        self.max_tile_pixels = max_tile_pixels
+        self.tile_overlap = tile_overlap
+        self.tile_workers = tile_workers
+        # prefilter=True: QRを含み得ないページを描画前に除外する（prefilter_zoom で縮小画像の判定も行う）
+        self.prefilter = None
+        if prefilter:
+            from .prefilter import page_may_contain_qr
+
+            self.prefilter = page_may_contain_qr
+        self.prefilter_zoom = prefilter_zoom
+        # vector=True: ベクターで描かれたQRを塗り図形から直接読む（vector.py）。判断がつかないページだけ描画する
+        self.vector = None
+        if vector:
+            from .vector import detect_vector_qr
+
+            self.vector = detect_vector_qr
+        # templates=True: 前のページで見つけたQRの位置だけを先に描画・復号する（templates.py）
+        self.templates = None
+        if templates:
+            from .templates import TemplateRegions
+
+            self.templates = TemplateRegions()
+        # auto_zoom=True: ページごとに内容から倍率を見積もる（autozoom.py）。zoom は見積もれないページの倍率
+        self.estimate_zoom = None
+        if auto_zoom:
+            from .autozoom import estimate_page_zoom
+
+            self.estimate_zoom = estimate_page_zoom
+        self.stats = _new_stats()
+        # cache にはキャッシュ DB のパスを渡す（None なら使わない）
+        self.cache = DetectionCache(cache, cache_max_bytes) if cache else None
+        self._fingerprints = PageFingerprinter(doc) if cache else None
+        self._settings = {"fast": fast, "coarse_zoom": coarse_zoom, "images": images}
+        if vector:
+            self._settings["vector"] = True
+        if templates:
+            # 領域だけで済ませた結果は全体を調べた結果と区別する
+            self._settings["templates"] = True
+        if auto_zoom:
+            self._settings["auto_zoom"] = True
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def take_stats(self) -> dict:
+        # 集計を取り出してリセットする（ワーカーから親へ差分を返すため）
+        stats = self.stats
+        if self.images is not None:
+            stats["images_decoded"] += self.images.decoded
+            stats["images_reused"] += self.images.reused
+            self.images.decoded = self.images.reused = 0
+        self.stats = _new_stats()
+        return stats
+
+    def scan(self, pidx: int) -> tuple[list, float]:
+        # 戻り値: (detections, zoom)。detections の points は zoom 倍の画素座標
+        with trace.span("page", page=pidx):
+            job = self.prepare(pidx)
+            if job.gray is not None:
+                job.dets = detect_and_decode_qr_gray(job.gray)
+            return self.finish(job)
+
+    def prepare(self, pidx: int) -> PageJob:
+        # キャッシュ・埋め込み画像で済めば結果を入れて返す。通常のページ全体描画なら
+        # 描画だけ行い、復号前のグレースケール画像を job.gray に載せて返す
+        # （粗→密・タイル分割・従来経路は描画と復号が入り組むため、ここで最後まで処理する）
+        job = PageJob(pidx, self.zoom)
+        page = self.doc.load_page(pidx)
+        self.stats["pages"] += 1
+        if self.prefilter is not None and not self.prefilter(page, self.prefilter_zoom)[0]:
+            self.stats["prefiltered"] += 1
+            job.dets = []
+            return job
+        if self.estimate_zoom is not None:
+            job.zoom, source = self.estimate_zoom(page, self.zoom)
+            if source != "fallback":
+                self.stats["auto_zoom_pages"] += 1
+        zoom = job.zoom
+        if self.cache is not None:
+            key = self.cache.make_key(self._fingerprints.page(page), zoom, self._settings)
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.stats["cache_hits"] += 1
+                job.dets, job.zoom = hit
+                return job
+            self.stats["cache_misses"] += 1
+            job.key = key
+        if self.images is not None:
+            dets = self.images.detect(page, zoom)
+            if dets:
+                self.stats["image_pages"] += 1
+                job.dets = dets
+                return job
+        if self.vector is not None:
+            dets = self.vector(page, zoom)
+            if dets is not None:
+                self.stats["vector_pages"] += 1
+                job.dets = dets
+                return job
+            self.stats["vector_fallbacks"] += 1
+        if self.templates is not None:
+            dets = self.templates.detect(page, zoom, self.stats)
+            if dets is not None:
+                job.dets = dets
+                return job
+            job.geometry = self.templates.geometry(page)
+        self.stats["raster_pages"] += 1
+        self.stats["raster_pixels"] += page_pixels(page, zoom)
+        if self._whole_page_render(page, zoom):
+            try:
+                job.pix, job.gray = render_page_gray(page, zoom)
+                return job
+            except (ValueError, AttributeError):
+                pass
+        job.dets, job.zoom = self._scan_raster(page, zoom)
+        return job
+
+    def finish(self, job: PageJob, dets: list | None = None) -> tuple[list, float]:
+        # 復号結果を受け取り、キャッシュへ書いて (detections, zoom) を返す
+        if dets is not None:
+            job.dets = dets
+        job.pix = job.gray = None
+        if job.geometry is not None:
+            self.templates.learn(job.geometry, job.dets, job.zoom)
+        if job.key is not None:
+            self.cache.put(job.key, job.dets, job.zoom)
+        return job.dets, job.zoom
+
+    def _whole_page_render(self, page: fitz.Page, zoom: float) -> bool:
+        return self.fast and not self.coarse_zoom and not self._tiled(page, zoom)
+
+    def _tiled(self, page: fitz.Page, zoom: float) -> bool:
+        return bool(self.max_tile_pixels) and page_pixels(page, zoom) > self.max_tile_pixels
+
+    def _scan_raster(self, page: fitz.Page, zoom: float) -> tuple[list, float]:
+        if self._tiled(page, zoom):
+            dets, ntiles = detect_page_tiled(page, zoom, self.max_tile_pixels,
+                                             self.tile_overlap, self.tile_workers)
+            self.stats["tiled_pages"] += 1
+            self.stats["tiles"] += ntiles
+            return dets, zoom
+        if self.coarse_zoom:
+            from .coarse import detect_page_coarse_to_fine
+
+            return detect_page_coarse_to_fine(page, zoom, self.coarse_zoom, self.stats), zoom
+        return detect_page(page, zoom, self.fast), zoom
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+# ローカルHTTPサービス（asyncio, 標準ライブラリのみ）
+#   POST /detect?pages=1-3,5&zoom=3.0   本文: PDF（Content-Length 必須）
+#       -> application/x-ndjson を逐次返す:
+#          {"type": "accepted", ...} / {"type": "page", "page": 1, "detections": [...]} ...（ページ順）/
+#          {"type": "done", "download": "/jobs/<id>/annotated.pdf", ...}（失敗時は {"type": "error"}）
+#       注釈付きPDFは全ページの検出が終わってから作る（page はその前に届き、done は作り終えてから届く）
+#   GET  /jobs/<id>/annotated.pdf   注釈付きPDF（ttl 秒で削除）
+#   GET  /metrics                   待ち行列・処理中の数、所要時間のヒストグラムなど (JSON)
+#   GET  /healthz
+# 検出と注釈付けは起動時に立ち上げたプロセスプール（import 済み）で行い、ページのチャンクごとに結果を返す
+# ワーカーが異常終了したらそのリクエストは 503 とし、プールを作り直す
+import asyncio
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+from .records import quad_pt
+from .store import DetectionStore
+
+# 所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_MAX_HEADER_BYTES = 64 * 1024
+# リクエストで指定できる zoom の範囲（ワーカーのメモリを使い切る・落とす値を受け付けない）
+MIN_REQUEST_ZOOM = 0.5
+MAX_REQUEST_ZOOM = 8.0
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout",
+            411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+# ---- ワーカープロセス側 ----
+def _warm_worker():
+    # 起動時に重いモジュールを読み込んでおく（最初のリクエストで import 時間を払わない）
+    import importlib
+
+    for name in ("core", "scanner"):
+        importlib.import_module(f"{__package__}.{name}")
+
+
+def _inspect_pdf(pdf_path: str) -> int:
+    from .core import open_pdf
+
+    doc = open_pdf(pdf_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def _scan_pages(pdf_path: str, pages: list[int], zoom: float, scan_opts: dict,
+                deadline: float | None = None) -> tuple[list, dict]:
+    # チャンクの終わりでドキュメントを閉じる（削除されたアップロードをワーカーが開いたまま残さない）
+    # 期限（time.time()）を過ぎるか、打ち切り・終了でアップロードが消されたら、残りのページは調べずに返す
+    import fitz
+
+    from .scanner import PageScanner
+
+    if not os.path.exists(pdf_path):
+        return [], {}
+    scanner = PageScanner(fitz.open(pdf_path), zoom, **scan_opts)
+    try:
+        results = []
+        for pidx in pages:
+            if (deadline is not None and time.time() > deadline) or not os.path.exists(pdf_path):
+                break
+            results.append((pidx, *scanner.scan(pidx)))
+        return results, scanner.take_stats()
+    finally:
+        scanner.close()
+        scanner.doc.close()
+
+
+def _annotate(pdf_path: str, out_path: str, detections_map, zoom_map: dict, overlay: bool = False) -> int:
+    from .core import export_annotated_pdf
+
+    export_annotated_pdf(pdf_path, detections_map, zoom_map, out_path, overlay=overlay)
+    return os.path.getsize(out_path)
+
+
+# ---- サーバー側 ----
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float):
+        for i, edge in enumerate(self.buckets):
+            if value <= edge:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.n += 1
+
+    def to_dict(self) -> dict:
+        # 累積件数（Prometheus の le と同じ意味）
+        cum, acc = {}, 0
+        for edge, c in zip(self.buckets, self.counts):
+            acc += c
+            cum[str(edge)] = acc
+        cum["+Inf"] = self.n
+        return {"count": self.n, "sum": round(self.total, 4), "buckets": cum}
+
+
+class QrLinkServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, jobs: int = 1, zoom: float = 3.0,
+                 scan_opts: dict | None = None, max_concurrent: int = 2, max_pending: int = 16,
+                 request_timeout: float = 300.0, max_upload_mb: float = 200.0, pages_per_task: int = 4,
+                 ttl: float = 600.0, work_dir: str | None = None):
+        self.host = host
+        self.port = port
+        self.jobs = jobs
+        self.zoom = zoom
+        self.scan_opts = scan_opts or {}
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.max_upload = int(max_upload_mb * 1024 * 1024)
+        self.pages_per_task = max(1, pages_per_task)
+        self.ttl = ttl
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="pdfqrlink-")
+        self._own_dir = work_dir is None
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_restarts = 0
+        self._server = None
+        self._outputs: dict[str, tuple[str, float]] = {}  # job -> (出力パス, 期限)
+        self._started = time.time()
+        self._waiting = 0
+        self._running = 0
+        self._requests: dict[str, int] = {}
+        self._pages = 0
+        self._qr = 0
+        self._latency = Histogram()
+        self._first_page = Histogram()
+        self._queue_wait = Histogram()
+
+    # ---- 起動・停止 ----
+    def _new_pool(self) -> ProcessPoolExecutor:
+        import multiprocessing
+
+        # GUI 等のスレッドを fork しないよう spawn で起動する
+        return ProcessPoolExecutor(max_workers=self.jobs, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_warm_worker)
+
+    def _restart_pool(self, broken: ProcessPoolExecutor):
+        # ワーカーが異常終了（メモリ不足・MuPDF のクラッシュ）するとプールは以後使えないので作り直す
+        # 同じプールで失敗した複数のリクエストが来ても作り直すのは1回だけ
+        if self._pool is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+        self._pool_restarts += 1
+
+    async def start(self):
+        # 先に全ワーカーを立ち上げておく
+        self._pool = self._new_pool()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, time.sleep, 0.05) for _ in range(self.jobs)))
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._reaper = asyncio.create_task(self._reap_outputs())
+
+    async def serve_until_stopped(self):
+        # SIGINT / SIGTERM で待ち受けを止める（ワーカーも close で終わらせる）
+        import signal
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, getattr(signal, "SIGTERM", None)):
+            if sig is None:
+                continue
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows のイベントループでは KeyboardInterrupt で抜ける
+        await stop.wait()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._reaper.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._own_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def _reap_outputs(self):
+        while True:
+            await asyncio.sleep(min(60.0, max(1.0, self.ttl / 4)))
+            now = time.time()
+            for job, (path, expires) in list(self._outputs.items()):
+                if expires < now:
+                    del self._outputs[job]
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    # ---- HTTP ----
+    async def _read_request(self, reader: asyncio.StreamReader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > _MAX_HEADER_BYTES:
+            raise HttpError(400, "ヘッダーが大きすぎます。")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "不正なリクエスト行です。")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+        return method.upper(), target, headers
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes,
+                    content_type: str = "application/json"):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, data: dict):
+        await self._send(writer, status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        status = 500
+        try:
+            method, target, headers = await asyncio.wait_for(self._read_request(reader), 30.0)
+            url = urlsplit(target)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/detect":
+                if method != "POST":
+                    raise HttpError(405, "POST で送ってください。")
+                status = await self._detect(reader, writer, headers, query)
+            elif url.path.startswith("/jobs/") and url.path.endswith("/annotated.pdf"):
+                status = await self._download(writer, url.path.split("/")[2])
+            elif url.path == "/metrics":
+                await self._send_json(writer, 200, self.metrics())
+                status = 200
+            elif url.path == "/healthz":
+                await self._send_json(writer, 200, {"ok": True})
+                status = 200
+            else:
+                raise HttpError(404, "見つかりません。")
+        except HttpError as e:
+            status = e.status
+            await self._send_json(writer, e.status, {"error": str(e)})
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            status = 408
+            await self._send_json(writer, 408, {"error": "リクエストを受け取れませんでした。"})
+        except ConnectionError:
+            status = 499
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            self._requests[str(status)] = self._requests.get(str(status), 0) + 1
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _download(self, writer, job: str) -> int:
+        entry = self._outputs.get(job)
+        if entry is None or not os.path.exists(entry[0]):
+            raise HttpError(404, "結果が見つからないか、期限切れです。")
+        size = os.path.getsize(entry[0])
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: application/pdf\r\nContent-Length: {size}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1"))
+        with open(entry[0], "rb") as f:
+            while data := f.read(1024 * 1024):
+                writer.write(data)
+                await writer.drain()
+        return 200
+
+    async def _detect(self, reader, writer, headers: dict, query: dict) -> int:
+        if "content-length" not in headers:
+            raise HttpError(411, "Content-Length が必要です。")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise HttpError(400, "Content-Length が不正です。")
+        if length < 0:
+            raise HttpError(400, "Content-Length が不正です。")
+        if length > self.max_upload:
+            raise HttpError(413, f"{self.max_upload // (1024 * 1024)}MB を超えるPDFは受け付けません。")
+        # 混雑時は待たせずに断る（待ち行列の上限）
+        if self._waiting >= self.max_pending:
+            raise HttpError(503, "混雑しています。しばらくしてから再送してください。")
+        try:
+            zoom = float(query.get("zoom", self.zoom))
+        except ValueError:
+            raise HttpError(400, "zoom が不正です。")
+        if not math.isfinite(zoom) or not MIN_REQUEST_ZOOM <= zoom <= MAX_REQUEST_ZOOM:
+            raise HttpError(400, f"zoom は {MIN_REQUEST_ZOOM}〜{MAX_REQUEST_ZOOM} で指定してください。")
+        overlay = query.get("overlay", "0") not in ("", "0", "false")
+
+        job = uuid.uuid4().hex
+        src = os.path.join(self.work_dir, f"{job}.pdf")
+        # 本文はメモリに溜めずにファイルへ書く
+        deadline = time.monotonic() + self.request_timeout
+        try:
+            # 受信の途中で切れた・時間切れになった本文も finally で消す
+            with open(src, "wb") as f:
+                left = length
+                while left:
+                    data = await asyncio.wait_for(reader.read(min(left, 1024 * 1024)),
+                                                  max(0.1, deadline - time.monotonic()))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", left)
+                    f.write(data)
+                    left -= len(data)
+
+            t0 = time.perf_counter()
+            self._waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self._waiting -= 1
+            self._queue_wait.observe(time.perf_counter() - t0)
+            self._running += 1
+            try:
+                return await self._run_job(writer, job, src, query.get("pages", "all"), zoom, t0, overlay)
+            finally:
+                self._running -= 1
+                self._slots.release()
+        finally:
+            if os.path.exists(src):
+                os.remove(src)
+
+    async def _run_job(self, writer, job: str, src: str, page_sel: str, zoom: float, t0: float,
+                       overlay: bool = False) -> int:
+        from .core import EncryptedPdfError, parse_pages
+
+        loop = asyncio.get_running_loop()
+        # このリクエストの間は同じプールを使う（異常終了したらそのプールだけを作り直す）
+        pool = self._pool
+        try:
+            total = await loop.run_in_executor(pool, _inspect_pdf, src)
+            pages = parse_pages(page_sel, total)
+        except EncryptedPdfError as e:
+            raise HttpError(422, str(e))
+        except ValueError:
+            raise HttpError(400, "pages が不正です。例: all / 1-3,5")
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            raise HttpError(503, "ワーカーが異常終了しました。再送してください。")
+        except Exception as e:
+            raise HttpError(422, f"PDFを開けません: {type(e).__name__}: {e}")
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+
+        async def emit(obj: dict):
+            data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+
+        await emit({"type": "accepted", "job": job, "pages": len(pages), "total_pages": total})
+        chunks = [pages[i:i + self.pages_per_task] for i in range(0, len(pages), self.pages_per_task)]
+        # 実行中のチャンクは cancel では止まらないため、ワーカー側でも期限を見てページの間で打ち切る
+        deadline = time.time() + max(1.0, self.request_timeout - (time.perf_counter() - t0))
+        futures = []
+        store = DetectionStore()
+        first = True
+        try:
+            futures = [loop.run_in_executor(pool, _scan_pages, src, chunk, zoom, self.scan_opts, deadline)
+                       for chunk in chunks]
+
+            async def _collect():
+                nonlocal first
+                # 投入順（＝ページ順）に待つ。先に終わった後ろのチャンクは前のチャンクを待ってから返す
+                for chunk, fut in zip(chunks, futures):
+                    results, _ = await fut
+                    if len(results) < len(chunk):
+                        # ワーカー側の期限で打ち切られた
+                        raise asyncio.TimeoutError
+                    for pidx, dets, page_zoom in results:
+                        store.add_page(pidx, dets, page_zoom)
+                        if first:
+                            self._first_page.observe(time.perf_counter() - t0)
+                            first = False
+                        await emit({
+                            "type": "page", "page": pidx + 1,
+                            "detections": [{"text": d.get("text") or "", "quad": quad_pt(d["points"], page_zoom)}
+                                           for d in dets],
+                        })
+                out = os.path.join(self.work_dir, f"{job}_annotated.pdf")
+                # ストアは詰めた配列として渡す（QRごとの dict を pickle しない）
+                size = await loop.run_in_executor(pool, _annotate, src, out, store, store.zoom_map, overlay)
+                return out, size
+
+            remaining = self.request_timeout - (time.perf_counter() - t0)
+            out, size = await asyncio.wait_for(_collect(), max(1.0, remaining))
+        except asyncio.TimeoutError:
+            for fut in futures:
+                fut.cancel()
+            await emit({"type": "error", "status": 408, "error": "タイムアウトしました。"})
+            await self._end_chunked(writer)
+            return 408
+        except ConnectionError:
+            for fut in futures:
+                fut.cancel()
+            raise
+        except BrokenProcessPool:
+            for fut in futures:
+                fut.cancel()
+            self._restart_pool(pool)
+            await emit({"type": "error", "status": 503, "error": "ワーカーが異常終了しました。再送してください。"})
+            await self._end_chunked(writer)
+            return 503
+        except Exception as e:
+            for fut in futures:
+                fut.cancel()
+            await emit({"type": "error", "status": 500, "error": f"{type(e).__name__}: {e}"})
+            await self._end_chunked(writer)
+            return 500
+
+        self._outputs[job] = (out, time.time() + self.ttl)
+        qr = store.qr_count
+        self._pages += len(pages)
+        self._qr += qr
+        seconds = time.perf_counter() - t0
+        self._latency.observe(seconds)
+        await emit({"type": "done", "job": job, "qr_count": qr, "bytes": size, "seconds": round(seconds, 4),
+                    "download": f"/jobs/{job}/annotated.pdf", "expires_in": self.ttl})
+        await self._end_chunked(writer)
+        return 200
+
+    async def _end_chunked(self, writer):
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def metrics(self) -> dict:
+        return {
+            "uptime_sec": round(time.time() - self._started, 1),
+            "workers": self.jobs,
+            "pool_restarts": self._pool_restarts,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._waiting,
+            "in_flight": self._running,
+            "stored_outputs": len(self._outputs),
+            "requests": dict(self._requests),
+            "pages": self._pages,
+            "qr_codes": self._qr,
+            "latency_sec": self._latency.to_dict(),
+            "first_page_sec": self._first_page.to_dict(),
+            "queue_wait_sec": self._queue_wait.to_dict(),
+        }
+
+
+async def serve(**kwargs):
+    server = QrLinkServer(**kwargs)
+    await server.start()
+    print(f"http://{server.host}:{server.port}/ で待ち受けています（作業ディレクトリ: {server.work_dir}）",
+          flush=True)
+    try:
+        await server.serve_until_stopped()
+    finally:
+        await server.close()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# 検出結果の列指向ストア（大量のQRを扱う一括処理でのメモリ削減）
+# QR 1件ごとの dict と (4,2) の ndarray の代わりに、構造化配列の1行（ページ・文字列番号・4隅）と
+# 重複を除いた文字列表で持つ。{pidx: [{"text", "points"}]} と同じように読める Mapping で、
+# 読み出したときだけ dict を作る（points は配列のビュー）。save / load で .npz に保存できる
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([("page", np.int32), ("text", np.int32), ("quad", np.float32, (4, 2))])
+# start / count: このページの行の範囲。zoom: points の座標系（その倍率で描画した画像の画素座標）
+PAGE_DTYPE = np.dtype([("page", np.int32), ("zoom", np.float32), ("start", np.int64), ("count", np.int32)])
+
+_INITIAL_ROWS = 256
+
+
+def _grow(arr: np.ndarray, need: int) -> np.ndarray:
+    if need <= len(arr):
+        return arr
+    # 1.5倍ずつ広げる（余分な容量を抑える）
+    out = np.zeros(max(need, len(arr) * 3 // 2), dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+class DetectionStore(Mapping):
+    def __init__(self):
+        self._rows = np.zeros(_INITIAL_ROWS, dtype=DETECTION_DTYPE)
+        self._n = 0
+        self._pages = np.zeros(64, dtype=PAGE_DTYPE)
+        self._npages = 0
+        self._page_index: dict[int, int] = {}  # pidx -> self._pages の行
+        self._texts: list[str] = []
+        self._text_ids: dict[str, int] = {}
+
+    # ---- 追加 ----
+    def _intern(self, text: str) -> int:
+        tid = self._text_ids.get(text)
+        if tid is None:
+            tid = self._text_ids[text] = len(self._texts)
+            self._texts.append(text)
+        return tid
+
+    def add_page(self, pidx: int, dets: list, zoom: float):
+        # 同じページをもう一度追加すると置き換える（前の行は残るが参照されない）
+        k = len(dets)
+        self._rows = _grow(self._rows, self._n + k)
+        rows = self._rows[self._n:self._n + k]
+        if k:
+            rows["text"] = [self._intern(det.get("text") or "") for det in dets]
+            rows["quad"] = np.stack([det["points"] for det in dets])
+            rows["page"] = pidx
+        slot = self._page_index.get(pidx)
+        if slot is None:
+            self._pages = _grow(self._pages, self._npages + 1)
+            slot = self._page_index[pidx] = self._npages
+            self._npages += 1
+        self._pages[slot] = (pidx, zoom, self._n, k)
+        self._n += k
+
+    # ---- Mapping ----
+    def __getitem__(self, pidx: int) -> list[dict]:
+        _, _, start, count = self._pages[self._page_index[pidx]]
+        rows = self._rows[start:start + count]
+        return [{"text": self._texts[tid], "points": quad} for tid, quad in zip(rows["text"].tolist(), rows["quad"])]
+
+    def __iter__(self):
+        return iter(sorted(self._page_index))
+
+    def __len__(self) -> int:
+        return self._npages
+
+    def __contains__(self, pidx) -> bool:
+        return pidx in self._page_index
+
+    # ---- 集計・参照 ----
+    def count(self, pidx: int) -> int:
+        slot = self._page_index.get(pidx)
+        return 0 if slot is None else int(self._pages[slot]["count"])
+
+    @property
+    def qr_count(self) -> int:
+        return int(self._pages[:self._npages]["count"].sum())
+
+    @property
+    def zoom_map(self) -> dict[int, float]:
+        pages = self._pages[:self._npages]
+        return {int(p): float(z) for p, z in sorted(zip(pages["page"].tolist(), pages["zoom"].tolist()))}
+
+    @property
+    def nbytes(self) -> int:
+        # 使用中の配列と文字列表の大きさ（辞書の索引は含まない）
+        return (self._rows[:self._n].nbytes + self._pages[:self._npages].nbytes
+                + sum(sys.getsizeof(t) for t in self._texts))
+
+    # ---- 保存・復元（pickle を使わない .npz） ----
+    def _packed(self) -> dict[str, np.ndarray]:
+        # 参照されている行だけを、ページ順に詰め直す
+        order = sorted(self._page_index)
+        pages = np.zeros(len(order), dtype=PAGE_DTYPE)
+        chunks, start = [], 0
+        for i, pidx in enumerate(order):
+            _, zoom, s, c = self._pages[self._page_index[pidx]]
+            chunks.append(self._rows[s:s + c])
+            pages[i] = (pidx, zoom, start, c)
+            start += c
+        rows = np.concatenate(chunks) if chunks else np.zeros(0, dtype=DETECTION_DTYPE)
+        encoded = [t.encode("utf-8") for t in self._texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return {"rows": rows, "pages": pages, "text_blob": blob, "text_offsets": offsets}
+
+    @classmethod
+    def _from_packed(cls, rows: np.ndarray, pages: np.ndarray, blob: np.ndarray, offsets: np.ndarray):
+        store = cls()
+        store._rows = np.array(rows, dtype=DETECTION_DTYPE)
+        store._n = len(store._rows)
+        store._pages = np.array(pages, dtype=PAGE_DTYPE)
+        store._npages = len(store._pages)
+        store._page_index = {int(p): i for i, p in enumerate(store._pages["page"].tolist())}
+        raw = blob.tobytes()
+        bounds = offsets.tolist()
+        store._texts = [raw[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+        store._text_ids = {t: i for i, t in enumerate(store._texts)}
+        return store
+
+    def save(self, path):
+        np.savez(path, **self._packed())
+
+    @classmethod
+    def load(cls, path) -> "DetectionStore":
+        with np.load(path, allow_pickle=False) as data:
+            return cls._from_packed(data["rows"], data["pages"], data["text_blob"], data["text_offsets"])
+
+    def __getstate__(self):
+        # プロセス間で渡すときも、余分な容量と索引を除いて送る
+        return self._packed()
+
+    def __setstate__(self, state):
+        other = self._from_packed(state["rows"], state["pages"], state["text_blob"], state["text_offsets"])
+        self.__dict__.update(other.__dict__)
+
+    @classmethod
+    def from_maps(cls, detections_map, zoom_map, default_zoom: float = 3.0) -> "DetectionStore":
+        # 従来の {pidx: [dict]} / {pidx: zoom} から作る
+        store = cls()
+        for pidx in sorted(detections_map):
+            store.add_page(pidx, detections_map[pidx], zoom_map.get(pidx, default_zoom))
+        return store
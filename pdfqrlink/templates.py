@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# 文書内で同じ位置に繰り返し印刷されるQR（フッターの追跡コードなど）の位置を覚え、
+# 後のページではその領域だけを描画・復号する
+# ページ全体を描画し直すのは、覚えた領域の外にQRになり得る画像・塗り図形の密集があるとき、
+# または内容のある領域で読めなかったとき
+import fitz  # PyMuPDF
+import numpy as np
+
+from . import trace
+from .core import _merge_detections, _square_rect_from_points, detect_and_decode_qr_gray, render_page_gray
+from .prefilter import MIN_QR_SIDE_PT, MIN_VECTOR_ITEMS
+from .tiles import page_pixels
+
+# 覚えた位置の周りに足す余白（QRの一辺に対する割合と最小値、pt）
+REGION_PAD_RATIO = 0.25
+REGION_PAD_MIN = 6.0
+# ページの寸法・回転ごとに覚える領域の上限（位置がばらばらな文書では増やさない）
+MAX_REGIONS = 16
+
+
+def page_geometry(page: fitz.Page) -> tuple:
+    r = page.rect
+    return round(r.width, 1), round(r.height, 1), page.rotation
+
+
+def _content_rects(page: fitz.Page) -> tuple[list, list]:
+    # 戻り値: (QRが入る大きさの画像の矩形, 塗り図形の (矩形, 要素数))
+    images = []
+    for info in page.get_image_info():
+        r = fitz.Rect(info["bbox"])
+        if min(r.width, r.height) >= MIN_QR_SIDE_PT and min(info.get("width", 0), info.get("height", 0)) >= 21:
+            images.append(r)
+    get = getattr(page, "get_cdrawings", None) or page.get_drawings
+    fills = [(fitz.Rect(path["rect"]), len(path["items"])) for path in get() if path.get("fill") is not None]
+    return images, fills
+
+
+class TemplateRegions:
+    def __init__(self, max_regions: int = MAX_REGIONS):
+        self.max_regions = max_regions
+        self._regions: dict[tuple, list[fitz.Rect]] = {}
+
+    @staticmethod
+    def geometry(page: fitz.Page) -> tuple:
+        # 覚えた位置を使い回すページの区分（寸法・回転）
+        return page_geometry(page)
+
+    def learn(self, geometry: tuple, dets: list, zoom: float):
+        # geometry: geometry() の値（ページ全体を調べた結果から覚える）
+        regions = self._regions.setdefault(geometry, [])
+        for det in dets:
+            r = _square_rect_from_points(det["points"], zoom, margin=0.0)
+            pad = max(REGION_PAD_MIN, r.width * REGION_PAD_RATIO)
+            r = fitz.Rect(r.x0 - pad, r.y0 - pad, r.x1 + pad, r.y1 + pad)
+            if any(r.contains(c) or c.contains(r) for c in regions):
+                continue
+            if len(regions) >= self.max_regions:
+                return
+            regions.append(r)
+
+    def detect(self, page: fitz.Page, zoom: float, stats: dict) -> list | None:
+        # 覚えた領域だけで済めば検出結果（points はページ全体を zoom 倍で描画したときの画素座標）、
+        # ページ全体を調べる必要があれば None を返す
+        # stats: roi_pages（領域だけで済んだページ）/ roi_fallbacks（領域を試して全体へ戻ったページ）/
+        #        roi_pixels（領域の描画画素数）/ roi_pixels_skipped（領域だけで済んだページで描画せずに済んだ画素数）
+        regions = [r & page.rect for r in self._regions.get(page_geometry(page), [])]
+        regions = [r for r in regions if not r.is_empty]
+        if not regions:
+            return None
+        dets, pixels = self._detect_regions(page, zoom, regions)
+        stats["roi_pixels"] += pixels
+        if dets is None:
+            stats["roi_fallbacks"] += 1
+        else:
+            stats["roi_pages"] += 1
+            stats["roi_pixels_skipped"] += max(0, page_pixels(page, zoom) - pixels)
+        return dets
+
+    def _detect_regions(self, page: fitz.Page, zoom: float, regions: list) -> tuple[list | None, int]:
+        # 戻り値: (検出結果または None, 領域の描画画素数)
+        pixels = 0
+        with trace.span("templates", page=page.number, regions=len(regions)) as sp:
+            # 注釈の外観（スタンプ等）は領域の外にもQRを描き得る
+            if page.first_annot is not None:
+                sp.set(result="annots")
+                return None, pixels
+            images, fills = _content_rects(page)
+            if any(not any(reg.contains(r) for reg in regions) for r in images):
+                sp.set(result="image_outside")
+                return None, pixels
+            outside = sum(n for r, n in fills if not any(reg.contains(r) for reg in regions))
+            if outside >= MIN_VECTOR_ITEMS:
+                sp.set(result="drawings_outside")
+                return None, pixels
+
+            results = []
+            for clip in regions:
+                pix, gray = render_page_gray(page, zoom, clip=clip)
+                pixels += pix.width * pix.height
+                offset = np.array([pix.x, pix.y], dtype=np.float32)
+                dets = detect_and_decode_qr_gray(gray)
+                if not dets and (any(clip.intersects(r) for r in images)
+                                 or any(clip.intersects(r) for r, _ in fills)):
+                    # 領域に何か描かれているのに読めない（位置のずれ・別の図形など）
+                    sp.set(result="miss")
+                    return None, pixels
+                for det in dets:
+                    det["points"] = det["points"] + offset
+                    results.append(det)
+            sp.set(result="hit", qr=len(results))
+        return _merge_detections(results), pixels
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# 巨大ページ（A0 図面など）をのりしろ付きのタイルに分けて描画・復号する
+# ピークメモリはページ全体ではなくタイルの大きさ（×同時処理数）で決まる
+import math
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import fitz  # PyMuPDF
+
+from . import trace
+from .core import _merge_detections, detect_and_decode_qr_gray, render_page_gray
+
+DEFAULT_MAX_TILE_PIXELS = 40_000_000
+# タイル境界をまたぐQRもどれかのタイルに丸ごと入るよう、この大きさ（pt）まで重ねる
+DEFAULT_TILE_OVERLAP = 144.0
+
+
+def page_pixels(page: fitz.Page, zoom: float) -> int:
+    r = page.rect
+    return int(math.ceil(r.width * zoom) * math.ceil(r.height * zoom))
+
+
+def _axis_starts(start: float, length: float, side: float, step: float) -> list[float]:
+    if length <= side:
+        return [start]
+    n = math.ceil((length - side) / step) + 1
+    starts = [start + i * step for i in range(n - 1)]
+    starts.append(start + length - side)  # 最後のタイルは端に揃える
+    return starts
+
+
+def min_tile_pixels(zoom: float, overlap: float = DEFAULT_TILE_OVERLAP) -> int:
+    # のりしろを保てる max_tile_pixels の下限（タイルの一辺がのりしろの2倍を超える大きさ）
+    return int((2.0 * overlap * zoom) ** 2) + 1
+
+
+def tile_rects(rect: fitz.Rect, zoom: float, max_tile_pixels: int,
+               overlap: float = DEFAULT_TILE_OVERLAP) -> list:
+    # 1枚あたり max_tile_pixels 以下の正方タイル（ページ座標）に分割する
+    # のりしろを縮めるとそれより大きいQRが境界で欠けるため、保てない設定はエラーにする
+    if max_tile_pixels < min_tile_pixels(zoom, overlap):
+        raise ValueError(f"タイルが小さすぎます: のりしろ {overlap:g}pt を倍率 {zoom:g} で保つには "
+                         f"max_tile_pixels を {min_tile_pixels(zoom, overlap)} 以上にしてください。")
+    side = math.sqrt(max_tile_pixels) / zoom
+    step = side - overlap
+    tiles = []
+    for y in _axis_starts(rect.y0, rect.height, side, step):
+        for x in _axis_starts(rect.x0, rect.width, side, step):
+            tiles.append(fitz.Rect(x, y, min(x + side, rect.x1), min(y + side, rect.y1)))
+    return tiles
+
+
+def _decode_tile(gray: np.ndarray, origin: tuple, pno: int | None = None) -> list:
+    # origin: タイルの左上 (pix.x, pix.y)。復号スレッドへは Pixmap を渡さない（解放が MuPDF を呼ぶため）
+    # pno は計測用（別スレッドではページ番号を引き継げないため明示する）
+    offset = np.array(origin, dtype=np.float32)
+    with trace.span("tile", page=pno):
+        dets = detect_and_decode_qr_gray(gray)
+    for det in dets:
+        det["points"] = det["points"] + offset
+    return dets
+
+
+def detect_page_tiled(page: fitz.Page, zoom: float, max_tile_pixels: int = DEFAULT_MAX_TILE_PIXELS,
+                      overlap: float = DEFAULT_TILE_OVERLAP, workers: int = 1) -> tuple[list, int]:
+    # 戻り値: (detections, タイル数)。points はページ全体を zoom 倍で描画したときの画素座標
+    # 描画（MuPDF）は呼び出しスレッドで順に行い、復号だけを workers 本のスレッドに回す
+    # （zxing-cpp は復号中 GIL を解放する）。同時に保持するタイルは workers+1 枚まで
+    tiles = tile_rects(page.rect, zoom, max_tile_pixels, overlap)
+    results: list = []
+    if workers <= 1:
+        for clip in tiles:
+            pix, gray = render_page_gray(page, zoom, clip=clip)
+            results.extend(_decode_tile(gray, (pix.x, pix.y), page.number))
+        return _merge_detections(results), len(tiles)
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        # future -> pix。gray が参照する pix は復号が終わるまでこのスレッドで持ち、ここで手放す
+        pending: dict = {}
+        for clip in tiles:
+            if len(pending) >= workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    del pending[fut]
+                    results.extend(fut.result())
+            pix, gray = render_page_gray(page, zoom, clip=clip)
+            pending[ex.submit(_decode_tile, gray, (pix.x, pix.y), page.number)] = pix
+            pix = gray = None
+        for fut in list(pending):
+            del pending[fut]
+            results.extend(fut.result())
+    return _merge_detections(results), len(tiles)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# 処理段階ごとの所要時間・画素数・確保サイズの記録
+# 既定は無効。無効時の span() は共有の空オブジェクトを返すだけで、記録も確保もしない
+#   with trace.span("render", page=pidx) as sp:
+#       pix = ...
+#       sp.set(pixels=pix.width * pix.height, bytes=len(pix.samples_mv))
+import json
+import os
+import threading
+import time
+
+_tracer = None
+# 入れ子の span が外側から引き継ぐ引数（スレッドごとに保持）
+_INHERITED = ("file", "page")
+_local = threading.local()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "t0", "prev_ctx")
+
+    def __init__(self, tracer, name: str, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.prev_ctx = ctx = getattr(_local, "ctx", None) or {}
+        for key in _INHERITED:
+            if self.args.get(key) is None and key in ctx:
+                self.args[key] = ctx[key]
+        _local.ctx = {key: self.args[key] for key in _INHERITED if self.args.get(key) is not None}
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter_ns() - self.t0
+        _local.ctx = self.prev_ctx
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.t0, dur, self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class Tracer:
+    def __init__(self):
+        self.events: list[dict] = []
+        # perf_counter を壁時計へ換算する差分（ワーカープロセスと時刻軸をそろえる）
+        self._offset_ns = time.time_ns() - time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def record(self, name: str, t0_ns: int, dur_ns: int, args: dict):
+        # list.append はスレッド間でも安全（タイル復号スレッドから呼ばれる）
+        self.events.append({
+            "name": name,
+            "ts": (t0_ns + self._offset_ns) / 1000.0,  # µs（Chrome trace の単位）
+            "dur": dur_ns / 1000.0,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    def take_events(self) -> list[dict]:
+        events, self.events = self.events, []
+        return events
+
+    def extend(self, events: list[dict]):
+        self.events.extend(events)
+
+    def summary(self) -> dict:
+        # 段階ごとの集計。入れ子の段階（page の中の render など）は重複して数えられる
+        stages: dict[str, dict] = {}
+        for ev in self.events:
+            st = stages.setdefault(ev["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "pixels": 0, "bytes": 0})
+            ms = ev["dur"] / 1000.0
+            st["count"] += 1
+            st["total_ms"] += ms
+            st["max_ms"] = max(st["max_ms"], ms)
+            st["pixels"] += ev["args"].get("pixels", 0)
+            st["bytes"] += ev["args"].get("bytes", 0)
+        for st in stages.values():
+            st["mean_ms"] = round(st["total_ms"] / st["count"], 3)
+            st["total_ms"] = round(st["total_ms"], 3)
+            st["max_ms"] = round(st["max_ms"], 3)
+        return stages
+
+    def pages(self) -> list[dict]:
+        # ページごとの段階別合計 (ms): [{"file", "page", "stages": {段階: ms}}]
+        # ページ並列のワーカーで記録したイベントには file が付かない
+        rows: dict[tuple, dict[str, float]] = {}
+        for ev in self.events:
+            page = ev["args"].get("page")
+            if page is None:
+                continue
+            row = rows.setdefault((ev["args"].get("file") or "", page), {})
+            row[ev["name"]] = round(row.get(ev["name"], 0.0) + ev["dur"] / 1000.0, 3)
+        return [{"file": f or None, "page": p, "stages": st} for (f, p), st in sorted(rows.items())]
+
+    def to_dict(self) -> dict:
+        return {"summary": self.summary(), "pages": self.pages(), "events": self.events}
+
+    def to_chrome(self) -> dict:
+        # chrome://tracing / Perfetto で開ける Trace Event 形式
+        return {
+            "traceEvents": [
+                {"name": ev["name"], "cat": "pdfqrlink", "ph": "X", "ts": ev["ts"], "dur": ev["dur"],
+                 "pid": ev["pid"], "tid": ev["tid"], "args": ev["args"]}
+                for ev in self.events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def save(self, path: str, fmt: str = "json"):
+        # fmt: "json"（集計＋生イベント）/ "chrome"（Trace Event 形式）
+        data = self.to_chrome() if fmt == "chrome" else self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+
+def format_summary(tracer: Tracer, slowest: int = 3) -> list[str]:
+    # ログ欄向けの短い内訳（段階ごとの合計と、時間のかかったページ）
+    lines = []
+    stages = tracer.summary()
+    for name, st in sorted(stages.items(), key=lambda kv: -kv[1]["total_ms"]):
+        line = f"{name:<10} {st['count']:>5}回 合計 {st['total_ms']:>9.1f}ms 平均 {st['mean_ms']:>7.1f}ms 最大 {st['max_ms']:>7.1f}ms"
+        if st["pixels"]:
+            line += f" {st['pixels'] / 1e6:.1f}MP"
+        if st["bytes"]:
+            line += f" {st['bytes'] / (1024 * 1024):.1f}MB"
+        lines.append(line)
+    pages = [row for row in tracer.pages() if "page" in row["stages"]]
+    for row in sorted(pages, key=lambda r: -r["stages"]["page"])[:slowest]:
+        st = row["stages"]
+        parts = ", ".join(f"{k} {v:.0f}ms" for k, v in st.items() if k != "page")
+        where = f"{os.path.basename(row['file'])} " if row["file"] else ""
+        lines.append(f"遅いページ {where}p.{row['page'] + 1}: {st['page']:.0f}ms ({parts})")
+    return lines
+
+
+def enable(fresh: bool = False) -> Tracer:
+    # 記録を開始する（既に有効なら同じ Tracer を返す）
+    # fresh=True: fork で親から引き継いだ記録を捨てて新しく始める
+    global _tracer
+    if _tracer is None or fresh:
+        _tracer = Tracer()
+    return _tracer
+
+
+def disable() -> Tracer | None:
+    # 記録を止め、それまでの Tracer を返す
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def active() -> Tracer | None:
+    return _tracer
+
+
+def span(name: str, **args):
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, args)
+
+
+def take_events() -> list[dict]:
+    # ワーカーから親へ送るためにイベントを取り出す（無効時は空）
+    return _tracer.take_events() if _tracer is not None else []
+
+
+def add_events(events: list[dict]):
+    if _tracer is not None and events:
+        _tracer.extend(events)
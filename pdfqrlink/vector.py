@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# ベクターで描かれたQR（モジュールごとの塗り矩形）をページを描画せずに復号する
+# 暗い塗り矩形の密集を1つのQR候補とし、モジュールの格子に並べ直した 1モジュール=1画素 の画像を zxing で読む
+# 格子に乗らない・読めない・矩形以外の図形が重なる・線やシェーディングや文字で描かれた暗い内容があるなど
+# 判断のつかないページは None を返し、描画して調べる側へ回す（[] は暗い内容が塗り矩形しか無いページだけ）
+import fitz  # PyMuPDF
+import numpy as np
+import zxingcpp
+
+from . import trace
+from .core import _merge_detections, _qr_results
+from .prefilter import MIN_MODULE_PT, MIN_QR_SIDE_PT, MIN_VECTOR_ITEMS, _has_qr_sized_images
+
+# 密集とみなす矩形どうしの隙間（小さい方の矩形の短辺に対する倍率）
+CLUSTER_GAP = 1.5
+# 矩形の辺と格子線のずれの許容（モジュール幅に対する割合）
+GRID_TOLERANCE = 0.2
+# 候補にする塗り矩形の短辺の上限（pt）。これより大きい暗い塗りは背景・図版として扱う
+MAX_CELL_PT = 84.0
+# 読み取り用に周りへ足す余白（モジュール）
+QUIET_ZONE = 2
+# 暗い塗りとみなす明るさの上限 (0..1)
+DARK_LUMINANCE = 0.5
+# QR（モデル2）の一辺のモジュール数: 21, 25, ..., 177
+_QR_SIZES = range(21, 178, 4)
+# ブロック要素の文字（█ ▀ ▄ など。文字で組んだQRに使われる）
+_BLOCK_CHARS = range(0x2580, 0x25A0)
+
+
+def _luminance(color) -> float:
+    if not color:
+        return 0.0
+    if len(color) == 1:
+        return color[0]
+    if len(color) == 4:
+        c, m, y, k = color
+        return (1 - k) * (1 - (0.299 * c + 0.587 * m + 0.114 * y))
+    r, g, b = color[:3]
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def _line_rect(points: list) -> tuple | None:
+    # 線分だけのサブパスが軸に沿った矩形なら (x0, y0, x1, y1)
+    xs = sorted({round(p[0], 3) for p in points})
+    ys = sorted({round(p[1], 3) for p in points})
+    if len(xs) != 2 or len(ys) != 2:
+        return None
+    return xs[0], ys[0], xs[1], ys[1]
+
+
+def _path_rects(path: dict) -> list | None:
+    # 塗りパスを軸に沿った矩形の並びに分ける（曲線・斜めの辺を含めば None）
+    rects = []
+    points: list = []
+    for item in path["items"]:
+        kind = item[0]
+        if kind == "re":
+            x0, y0, x1, y1 = item[1]
+            rects.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        elif kind == "qu":
+            q = fitz.Quad(item[1])
+            r = _line_rect([tuple(q.ul), tuple(q.ur), tuple(q.ll), tuple(q.lr)])
+            if r is None:
+                return None
+            rects.append(r)
+        elif kind == "l":
+            p0, p1 = tuple(item[1]), tuple(item[2])
+            if points and points[-1] != p0:
+                r = _line_rect(points)
+                if r is None:
+                    return None
+                rects.append(r)
+                points = []
+            if not points:
+                points.append(p0)
+            points.append(p1)
+        else:
+            return None
+    if points:
+        r = _line_rect(points)
+        if r is None:
+            return None
+        rects.append(r)
+    return rects
+
+
+def _collect_fills(page: fitz.Page) -> tuple[list, list]:
+    # 戻り値: (描画順の塗り矩形 [(x0, y0, x1, y1, dark)], 矩形にならない暗い塗り・暗い線の [(矩形, 要素数)])
+    get = getattr(page, "get_cdrawings", None) or page.get_drawings
+    fills, others = [], []
+    for path in get():
+        color = path.get("fill")
+        opacity = path.get("fill_opacity")
+        rects = None
+        if color is not None and opacity != 0:
+            # 透明な塗り（fill_opacity 0）は見えないので数えない。半透明は格子に塗れないので矩形にしない
+            dark = _luminance(color) < DARK_LUMINANCE
+            rects = _path_rects(path) if opacity is None or opacity >= 1.0 else None
+            if rects is None:
+                if dark:
+                    others.append((fitz.Rect(path["rect"]), len(path["items"])))
+            else:
+                fills.extend((x0, y0, x1, y1, dark) for x0, y0, x1, y1 in rects if x1 > x0 and y1 > y0)
+        stroke = path.get("color")
+        if (stroke is not None and (path.get("width") or 0) >= MIN_MODULE_PT
+                and _luminance(stroke) < DARK_LUMINANCE):
+            # 線は格子に並べられない（モジュールの並びを太い線で描く生成系もある）
+            # 塗りと同じ色で縁取っただけの矩形は塗りとして扱う
+            if rects is None or stroke != color:
+                others.append((fitz.Rect(path["rect"]), len(path["items"])))
+    return fills, others
+
+
+def _has_other_marks(page: fitz.Page) -> bool:
+    # 塗り図形の外で描かれ得るQR: QRが入る大きさのシェーディング、ブロック要素の文字で組んだQR
+    for kind, bbox in page.get_bboxlog():
+        if kind == "fill-shade" and min(bbox[2] - bbox[0], bbox[3] - bbox[1]) >= MIN_QR_SIDE_PT:
+            return True
+    text = page.get_text("text")
+    return sum(1 for ch in text if ord(ch) in _BLOCK_CHARS) >= MIN_VECTOR_ITEMS
+
+
+def _split(rects: np.ndarray, idx: np.ndarray, axis: int) -> list[np.ndarray]:
+    # axis 方向（0: x, 1: y）への投影に、モジュールの CLUSTER_GAP 倍より広い隙間があれば分ける
+    lo, hi = rects[idx, axis], rects[idx, axis + 2]
+    order = np.argsort(lo, kind="stable")
+    reach = np.maximum.accumulate(hi[order])
+    sides = np.minimum(rects[idx, 2] - rects[idx, 0], rects[idx, 3] - rects[idx, 1])
+    tol = CLUSTER_GAP * float(np.median(sides))
+    breaks = np.nonzero(lo[order][1:] - reach[:-1] > tol)[0] + 1
+    return np.split(idx[order], breaks)
+
+
+def _clusters(rects: np.ndarray) -> list[np.ndarray]:
+    # x・y の投影の隙間で交互に分け、どちらでも分けられなくなった塊を候補とする（XY-cut）
+    # 隙間で分けられない並び（L字など）の塊は1つのQRとして読めず、描画へ回る
+    out = []
+    stack = [(np.arange(len(rects)), 0, 0)]
+    while stack:
+        idx, axis, tried = stack.pop()
+        groups = _split(rects, idx, axis)
+        if len(groups) > 1:
+            stack.extend((g, 1 - axis, 1) for g in groups)
+        elif tried >= 2:
+            out.append(idx)
+        else:
+            stack.append((idx, 1 - axis, tried + 1))
+    return out
+
+
+def _grid_size(members: np.ndarray, x0: float, y0: float, width: float, height: float) -> int | None:
+    # 全矩形の辺が格子線に乗るモジュール数（QRの大きさ）を探す
+    unit = float(np.min(np.minimum(members[:, 2] - members[:, 0], members[:, 3] - members[:, 1])))
+    guess = width / unit
+    for n in sorted(_QR_SIZES, key=lambda s: abs(s - guess)):
+        if abs(n - guess) > max(2.0, guess * 0.1):
+            break
+        step = width / n
+        if abs(height / step - n) > GRID_TOLERANCE:
+            continue
+        g = (members[:, :4] - [x0, y0, x0, y0]) / step
+        if np.all(np.abs(g - np.round(g)) <= GRID_TOLERANCE):
+            return n
+    return None
+
+
+def _decode_cluster(fills: np.ndarray, members: np.ndarray, others: list) -> dict | None:
+    # fills: _collect_fills の塗り矩形を (N, 5) の配列にしたもの
+    # 戻り値: {"text", "points"}（points は回転前のページ座標）。格子を組めない・読めなければ None
+    box = fills[members]
+    x0, y0 = box[:, 0].min(), box[:, 1].min()
+    x1, y1 = box[:, 2].max(), box[:, 3].max()
+    bbox = fitz.Rect(x0, y0, x1, y1)
+    if any(bbox.intersects(r) for r, _ in others):
+        return None
+    n = _grid_size(box, x0, y0, x1 - x0, y1 - y0)
+    if n is None:
+        return None
+    step = (x1 - x0) / n
+
+    # 候補の範囲にかかる塗り（明るい塗りで暗いモジュールを抜く描き方もある）が格子に乗るか調べ、描画順に塗る
+    over = fills[(fills[:, 2] > x0) & (fills[:, 0] < x1) & (fills[:, 3] > y0) & (fills[:, 1] < y1)]
+    clipped = np.clip(over[:, :4], [x0, y0, x0, y0], [x1, y1, x1, y1])
+    g = (clipped - [x0, y0, x0, y0]) / step
+    cells = np.round(g)
+    if np.any(np.abs(g - cells) > GRID_TOLERANCE):
+        return None
+    q = QUIET_ZONE
+    bitmap = np.full((n + 2 * q, n + 2 * q), 255, dtype=np.uint8)
+    for (c0, r0, c1, r1), dark in zip(cells.astype(int).tolist(), over[:, 4].tolist()):
+        bitmap[q + r0:q + r1, q + c0:q + c1] = 0 if dark else 255
+
+    dets = _qr_results(zxingcpp.read_barcodes(bitmap, formats=zxingcpp.BarcodeFormat.QRCode, is_pure=True))
+    if len(dets) != 1:
+        return None
+    # zxing の頂点はモジュールの中心寄りに出るので、近い方の外周（0 または n モジュール）へ寄せる
+    corners = np.where(dets[0]["points"] - q < n / 2.0, 0, n)
+    points = [fitz.Point(x0 + cx * step, y0 + cy * step) for cx, cy in corners]
+    return {"text": dets[0]["text"], "points": points}
+
+
+def detect_vector_qr(page: fitz.Page, zoom: float) -> list | None:
+    # ページの塗り図形だけでQRを読む。戻り値の points はページ描画時と同じ zoom 倍の画素座標
+    # 描画して調べる必要があれば None（注釈・QRになり得る画像がある、読めない密集や矩形以外の密集がある）
+    with trace.span("vector", page=page.number) as sp:
+        if page.first_annot is not None:
+            sp.set(result="annots")
+            return None
+        if _has_qr_sized_images(page):
+            sp.set(result="images")
+            return None
+        fills, others = _collect_fills(page)
+        if sum(count for _, count in others) >= MIN_VECTOR_ITEMS:
+            # 丸いモジュール・線など矩形の塗り以外で描かれたQRかもしれない
+            sp.set(result="shapes")
+            return None
+        if _has_other_marks(page):
+            sp.set(result="marks")
+            return None
+        table = np.array(fills, dtype=np.float64).reshape(-1, 5)
+        sides = np.minimum(table[:, 2] - table[:, 0], table[:, 3] - table[:, 1])
+        cand = np.nonzero((table[:, 4] > 0) & (sides <= MAX_CELL_PT))[0]
+        groups = _clusters(table[cand, :4]) if len(cand) else []
+        # 塗り図形の座標は回転前のページ座標
+        area = page.rect * page.derotation_matrix
+        mat = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+        results = []
+        for group in groups:
+            members = cand[group]
+            box = table[members, :4]
+            r = fitz.Rect(box[:, 0].min(), box[:, 1].min(), box[:, 2].max(), box[:, 3].max())
+            if not r.intersects(area):
+                continue
+            det = None
+            if min(r.width, r.height) >= MIN_QR_SIDE_PT:
+                det = _decode_cluster(table, members, others)
+            if det is None:
+                if len(members) >= MIN_VECTOR_ITEMS:
+                    sp.set(result="ambiguous", clusters=len(groups))
+                    return None
+                continue
+            pts = [p * mat for p in det["points"]]
+            results.append({"text": det["text"], "points": np.array([(p.x, p.y) for p in pts], dtype=np.float32)})
+        sp.set(result="hit", clusters=len(groups), qr=len(results))
+    return _merge_detections(results)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+# フォルダ監視デーモン（スキャナーの保存先などに置かれたPDFを順に処理する）
+# 1) 監視: 一定間隔でフォルダを走査し、サイズと更新時刻が settle 秒変わらないファイルを書き込み完了とみなす
+# 2) 待ち行列: SQLite に記録する（再起動しても未処理・処理中だったものから再開し、処理済みは飛ばす）
+# 3) 処理: batch.process_file をプロセスプールで実行し、*_annotated.pdf と結果のサイドカー (*_annotated.json) を書く
+# 待ち行列の上限（max_queue）と処理中ジョブのメモリ見積もりの上限（memory_budget_mb）で流入を抑え、
+# 大量のファイルが一度に置かれても、待ちはフォルダ側に残したまま一定の負荷で処理する
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .batch import output_path_for, process_file
+
+# A4 1ページの面積 (pt^2)。ページ数は開くまで分からないため、見積もりは A4 相当で行う
+_A4_AREA_PT = 595 * 842
+# 描画1ページあたりの作業用バッファ（グレースケール画像・二値化・変換のコピー）の画素あたりバイト数
+_BYTES_PER_PIXEL = 3
+# ワーカーの異常終了（メモリ不足・MuPDF のクラッシュ）に巻き込まれたジョブを待ちに戻す回数の上限
+# 原因のファイルは毎回ワーカーを落とすので、上限に達したら error として記録する
+MAX_ATTEMPTS = 3
+
+
+def default_db_path() -> str:
+    from .cache import default_cache_path
+
+    return os.path.join(os.path.dirname(default_cache_path()), "watch.sqlite")
+
+
+def estimate_job_mb(size_bytes: int, zoom: float, page_jobs: int = 1, decode_threads: int = 0) -> float:
+    # 処理中のメモリの粗い見積もり: 文書の読み込み（ファイルサイズの2倍）と、同時に保持するページ画像
+    pages_held = max(1, page_jobs) * (2 * decode_threads + 1 if decode_threads >= 1 else 1)
+    page_bytes = _A4_AREA_PT * zoom * zoom * _BYTES_PER_PIXEL
+    return (2 * size_bytes + pages_held * page_bytes) / (1024 * 1024)
+
+
+def sidecar_path_for(out_path: str) -> str:
+    return os.path.splitext(out_path)[0] + ".json"
+
+
+class JobQueue:
+    # 状態: queued（待ち）/ running（処理中）/ ok / error / timeout / skipped
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " path TEXT PRIMARY KEY, output TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, enqueued REAL NOT NULL,"
+            " started REAL, finished REAL, error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, enqueued)")
+        # 前回の実行で処理中のまま終わったものは待ちに戻す
+        self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        self._conn.commit()
+
+    def snapshot(self) -> dict[str, tuple[int, float]]:
+        # 登録済みのファイルの {path: (size, mtime)}（監視側が毎回 DB を引かないよう最初に読む）
+        return {p: (s, m) for p, s, m in self._conn.execute("SELECT path, size, mtime FROM jobs")}
+
+    def enqueue(self, path: str, output: str, size: int, mtime: float):
+        # 同じパスでも内容（サイズ・更新時刻）が変わっていれば処理し直す
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (path, output, size, mtime, status, attempts, enqueued)"
+            " VALUES (?, ?, ?, ?, 'queued', 0, ?)",
+            (path, output, size, mtime, time.time()),
+        )
+        self._conn.commit()
+
+    def depth(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def peek(self) -> tuple[str, str, int, float, int] | None:
+        # 最も古い待ち。戻り値: (path, output, size, enqueued, attempts)
+        return self._conn.execute(
+            "SELECT path, output, size, enqueued, attempts FROM jobs WHERE status = 'queued' ORDER BY enqueued LIMIT 1"
+        ).fetchone()
+
+    def start(self, path: str):
+        self._conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ? WHERE path = ?",
+            (time.time(), path),
+        )
+        self._conn.commit()
+
+    def retry(self, path: str, error: str) -> bool:
+        # 試行回数が MAX_ATTEMPTS 未満なら待ちに戻す（戻したら True）
+        cur = self._conn.execute(
+            "UPDATE jobs SET status = 'queued', error = ? WHERE path = ? AND attempts < ?",
+            (error, path, MAX_ATTEMPTS),
+        )
+        self._conn.commit()
+        return cur.rowcount > 0
+
+    def finish(self, path: str, status: str, error: str | None = None):
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE path = ?",
+            (status, time.time(), error, path),
+        )
+        self._conn.commit()
+
+    def counts(self) -> dict[str, int]:
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        self._conn.close()
+
+
+class Metrics:
+    # 処理件数・スループット・待ち時間（置かれてから処理が終わるまで）の集計
+    def __init__(self, window: float = 60.0):
+        self.started = time.time()
+        self.window = window
+        self.processed = 0
+        self.failed = 0
+        self.qr_codes = 0
+        self.pages = 0
+        self._recent: deque = deque()  # 直近 window 秒の完了時刻
+        self._latencies: deque = deque(maxlen=1000)
+
+    def record(self, result: dict, enqueued: float):
+        now = time.time()
+        self.processed += 1
+        if result["status"] in ("error", "timeout"):
+            self.failed += 1
+        self.qr_codes += result.get("qr_count", 0)
+        self.pages += result.get("pages", 0)
+        self._recent.append(now)
+        self._latencies.append(now - enqueued)
+
+    def snapshot(self, **gauges) -> dict:
+        now = time.time()
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+        uptime = now - self.started
+        lat = sorted(self._latencies)
+        return {
+            "uptime_sec": round(uptime, 1),
+            "processed": self.processed,
+            "failed": self.failed,
+            "pages": self.pages,
+            "qr_codes": self.qr_codes,
+            "files_per_sec": round(self.processed / uptime, 4) if uptime > 0 else 0.0,
+            "recent_files_per_min": round(len(self._recent) * 60.0 / self.window, 2),
+            "latency_mean_sec": round(sum(lat) / len(lat), 3) if lat else None,
+            "latency_p95_sec": round(lat[int(len(lat) * 0.95) if len(lat) > 1 else 0], 3) if lat else None,
+            **gauges,
+        }
+
+
+class FolderWatcher:
+    # 書き込み中のファイルを拾わないよう、サイズと更新時刻が settle 秒変わらなくなってから返す
+    def __init__(self, dirs: list[str], out_dir: str | None, settle: float, known: dict):
+        self.dirs = [os.path.abspath(d) for d in dirs]
+        self.out_dir = os.path.abspath(out_dir) if out_dir else None
+        self.settle = settle
+        self.known = known
+        self._pending: dict[str, tuple[int, float, float]] = {}  # path -> (size, mtime, 変化が止まった時刻)
+
+    def output_for(self, root: str, path: str) -> str:
+        if self.out_dir:
+            return output_path_for(os.path.relpath(path, root), self.out_dir)
+        return output_path_for(os.path.basename(path), os.path.dirname(path))
+
+    def _walk(self, root: str):
+        stack = [root]
+        while stack:
+            d = stack.pop()
+            try:
+                entries = list(os.scandir(d))
+            except OSError:
+                continue
+            for e in entries:
+                if e.is_dir(follow_symlinks=False):
+                    if self.out_dir is None or os.path.abspath(e.path) != self.out_dir:
+                        stack.append(e.path)
+                elif e.name.lower().endswith(".pdf") and not e.name.lower().endswith("_annotated.pdf"):
+                    yield e
+
+    def poll(self) -> list[tuple[str, str, int, float]]:
+        # 書き込みが終わった新規・更新ファイル: [(path, output, size, mtime)]
+        now = time.time()
+        ready = []
+        seen = set()
+        for root in self.dirs:
+            for e in self._walk(root):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                path = os.path.abspath(e.path)
+                seen.add(path)
+                sig = (st.st_size, st.st_mtime)
+                if self.known.get(path) == sig:
+                    continue
+                prev = self._pending.get(path)
+                if prev is None or prev[:2] != sig:
+                    self._pending[path] = (*sig, now)
+                elif now - prev[2] >= self.settle and st.st_size > 0:
+                    ready.append((path, self.output_for(root, path), *sig))
+        # 消えたファイルは忘れる
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+        return ready
+
+    def accepted(self, path: str, size: int, mtime: float):
+        self.known[path] = (size, mtime)
+        self._pending.pop(path, None)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._pending)
+
+
+def _write_json(path: str, data: dict):
+    tmp = path + ".part"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _process_job(path: str, out_path: str, opts: dict) -> dict:
+    # ワーカープロセスで実行する。結果は出力PDFの隣にサイドカーとしても書く
+    result = process_file(path, out_path, **opts)
+    result["finished"] = time.time()
+    try:
+        _write_json(sidecar_path_for(out_path), result)
+    except OSError as e:
+        result["sidecar_error"] = str(e)
+    return result
+
+
+def run_watch(dirs: list[str], out_dir: str | None = None, db_path: str | None = None, jobs: int = 1,
+              zoom: float = 3.0, page_sel: str = "all", timeout: float | None = None, page_jobs: int = 1,
+              scan_opts: dict | None = None, incremental: bool = False, decode_threads: int = 0,
+              overlay: bool = False, settle: float = 2.0, poll: float = 1.0, max_queue: int = 1000, memory_budget_mb: float = 2048,
+              metrics_path: str | None = None, metrics_every: float = 30.0,
+              on_result=None, on_metrics=None, should_stop=None, once: bool = False) -> dict:
+    # should_stop() が真になると新しいジョブの投入を止め、処理中のものを待って終わる（待ちは DB に残る）
+    # once=True: 置かれているファイルを処理し終えたら終わる
+    # on_result(result), on_metrics(snapshot) は呼び出しスレッドで呼ばれる
+    opts = {
+        "zoom": zoom, "page_sel": page_sel, "timeout": timeout, "page_jobs": page_jobs,
+        "scan_opts": scan_opts, "incremental": incremental, "decode_threads": decode_threads,
+        "overlay": overlay,
+    }
+    queue = JobQueue(db_path or default_db_path())
+    watcher = FolderWatcher(dirs, out_dir, settle, queue.snapshot())
+    metrics = Metrics()
+    in_flight: dict = {}  # future -> (path, 見積もりMB, enqueued)
+    last_report = time.time()
+    deferred = 0
+    restarts = 0
+    isolated = False  # 処理中のジョブが単独で流しているものか
+
+    def _gauges() -> dict:
+        return {
+            "queue_depth": queue.depth(),
+            "in_flight": len(in_flight),
+            "in_flight_mb": round(sum(c for _, c, _ in in_flight.values()), 1),
+            "waiting_to_settle": watcher.waiting,
+            "deferred": deferred,
+            "pool_restarts": restarts,
+        }
+
+    def _report():
+        snap = metrics.snapshot(**_gauges())
+        if metrics_path:
+            _write_json(metrics_path, snap)
+        if on_metrics is not None:
+            on_metrics(snap)
+        return snap
+
+    ex = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        while True:
+            stopping = should_stop is not None and should_stop()
+            if not stopping:
+                # 監視: 待ち行列が上限に達している間は登録せず、フォルダに残しておく
+                ready = watcher.poll()
+                room = max(0, max_queue - queue.depth())
+                for path, output, size, mtime in ready[:room]:
+                    queue.enqueue(path, output, size, mtime)
+                    watcher.accepted(path, size, mtime)
+                deferred = max(0, len(ready) - room)
+
+                # 投入: ワーカー数とメモリ見積もりの範囲で（1件も処理中でなければ大きくても通す）
+                while len(in_flight) < jobs:
+                    used = sum(c for _, c, _ in in_flight.values())
+                    job = queue.peek()
+                    if job is None:
+                        break
+                    path, output, size, enqueued, attempts = job
+                    cost = estimate_job_mb(size, zoom, page_jobs, decode_threads)
+                    if in_flight and used + cost > memory_budget_mb:
+                        break
+                    # 異常終了に巻き込まれたことのあるジョブは単独で流し、原因のファイルだけが上限に達するようにする
+                    if in_flight and (attempts or isolated):
+                        break
+                    isolated = attempts > 0
+                    try:
+                        fut = ex.submit(_process_job, path, output, opts)
+                    except BrokenProcessPool:
+                        # 前のワーカーが異常終了してプールが使えなくなっている。作り直して投入し直す
+                        ex.shutdown(wait=False, cancel_futures=True)
+                        ex = ProcessPoolExecutor(max_workers=jobs)
+                        restarts += 1
+                        continue
+                    queue.start(path)
+                    in_flight[fut] = (path, cost, enqueued)
+
+            if in_flight:
+                done, _ = wait(list(in_flight), timeout=poll, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    path, _, enqueued = in_flight.pop(fut)
+                    try:
+                        res = fut.result()
+                    except BrokenProcessPool as e:
+                        # 異常終了したプールで処理中だったジョブはすべてこの例外になり、どれが原因かは分からない
+                        # 上限までは待ちに戻し（プールは次の投入で作り直す）、超えたら失敗として記録する
+                        error = f"{type(e).__name__}: {e}"
+                        if queue.retry(path, error):
+                            continue
+                        res = {"file": path, "output": None, "status": "error", "pages": 0, "qr_count": 0,
+                               "seconds": 0.0, "error": error, "stats": {}}
+                    except Exception as e:
+                        # 結果を送り返せなかったなど
+                        res = {"file": path, "output": None, "status": "error", "pages": 0, "qr_count": 0,
+                               "seconds": 0.0, "error": f"{type(e).__name__}: {e}", "stats": {}}
+                    queue.finish(path, res["status"], res["error"])
+                    metrics.record(res, enqueued)
+                    if on_result is not None:
+                        on_result(res)
+            elif stopping or (once and not watcher.waiting and queue.depth() == 0):
+                break
+            else:
+                time.sleep(poll)
+
+            if time.time() - last_report >= metrics_every:
+                last_report = time.time()
+                _report()
+        return _report()
+    finally:
+        ex.shutdown(wait=True)
+        queue.close()